@@ -4,7 +4,7 @@ from django.db import models
 from django.db.models import Count, Avg
 from .models import (
     GradeType, LessonColumn, StudentGrade,
-    QuarterlyGrade, YearlyGrade, Attendance, Homework
+    QuarterlyGrade, YearlyGrade, Attendance, Homework, MarkChangeLog, JournalSnapshot
 )
 
 
@@ -44,8 +44,7 @@ class LessonColumnAdmin(admin.ModelAdmin):
 class StudentGradeAdmin(admin.ModelAdmin):
     list_display = ('id', 'student', 'value', 'grade_type_display', 'lesson_display',
                     'teacher_display', 'created_at', 'updated_at')
-    list_filter = ('value', 'lesson_column__lesson__quarter',
-                   'lesson_column__lesson__subject')
+    list_filter = ('value', 'quarter', 'subject')
     search_fields = ('student__user__last_name', 'student__user__first_name',
                      'teacher__user__last_name', 'comment')
     raw_id_fields = ('student', 'lesson_column', 'teacher')
@@ -180,6 +179,56 @@ class AttendanceAdmin(admin.ModelAdmin):
         )
 
 
+@admin.register(MarkChangeLog)
+class MarkChangeLogAdmin(admin.ModelAdmin):
+    """История изменений оценок - только просмотр"""
+    list_display = ('created_at', 'student_display', 'subject', 'old_value', 'new_value', 'changed_by', 'source')
+    list_filter = ('source', 'subject')
+    search_fields = ('student__user__last_name', 'student__user__first_name')
+    raw_id_fields = ('student', 'lesson_column', 'teacher', 'changed_by')
+    date_hierarchy = 'created_at'
+
+    def student_display(self, obj):
+        return obj.student.user.get_full_name()
+
+    student_display.short_description = 'Ученик'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('student__user', 'subject', 'changed_by')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(JournalSnapshot)
+class JournalSnapshotAdmin(admin.ModelAdmin):
+    """Снимки сеток журнала создает команда snapshot_journals - только просмотр и удаление"""
+    list_display = ('taken_at', 'class_group', 'subject', 'quarter', 'cells_count')
+    list_filter = ('quarter', 'subject')
+    date_hierarchy = 'taken_at'
+    exclude = ('cells',)
+
+    def cells_count(self, obj):
+        return len(obj.cells)
+
+    cells_count.short_description = 'Оценок'
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('class_group', 'subject', 'quarter')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Homework)
 class HomeworkAdmin(admin.ModelAdmin):
     list_display = ('id', 'lesson_display', 'deadline', 'created_at', 'has_attachments')
@@ -0,0 +1,23 @@
+from rest_framework.routers import DefaultRouter
+from .view import (
+    StudentMarkViewSet,
+    StudentGradeViewSet,
+    AttendanceViewSet,
+    HomeworkViewSet,
+    QuarterlyGradeViewSet,
+    YearlyGradeViewSet,
+    MarkChangeLogViewSet,
+    DeletedGradeViewSet,
+)
+
+router = DefaultRouter()
+router.register('marks', StudentMarkViewSet, basename='mark')
+router.register('grades', StudentGradeViewSet, basename='grade')
+router.register('attendance', AttendanceViewSet, basename='attendance')
+router.register('homework', HomeworkViewSet, basename='homework')
+router.register('quarterly-grades', QuarterlyGradeViewSet, basename='quarterly-grade')
+router.register('yearly-grades', YearlyGradeViewSet, basename='yearly-grade')
+router.register('mark-history', MarkChangeLogViewSet, basename='mark-history')
+router.register('deleted-grades', DeletedGradeViewSet, basename='deleted-grade')
+
+urlpatterns = router.urls
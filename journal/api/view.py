@@ -0,0 +1,258 @@
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAuthenticated
+from django_filters import rest_framework as filters
+from django_filters.rest_framework import DjangoFilterBackend
+
+from school_structure.models import ClassGroup
+from ..archive import archived_year_id
+from ..models import (
+    ArchivedAttendance, ArchivedStudentGrade, StudentGrade, Attendance, Homework, QuarterlyGrade, YearlyGrade, MarkChangeLog
+)
+from ..serializers import (
+    StudentMarkSerializer,
+    StudentGradeSerializer,
+    AttendanceSerializer,
+    HomeworkSerializer,
+    QuarterlyGradeSerializer,
+    YearlyGradeSerializer,
+    MarkChangeLogSerializer,
+    DeletedGradeSerializer,
+)
+
+
+class UpdatedCursorPagination(CursorPagination):
+    """Курсор по (updated_at, id): стабильные страницы для инкрементальной синхронизации"""
+    ordering = ('updated_at', 'id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class HistoryCursorPagination(UpdatedCursorPagination):
+    """История: новые изменения первыми, курсор по индексу (student, -created_at)"""
+    ordering = ('-created_at', '-id')
+
+
+class DeletedCursorPagination(UpdatedCursorPagination):
+    """Удаления в порядке времени удаления - для инкрементальной синхронизации"""
+    ordering = ('created_at', 'id')
+
+
+class JournalReadViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Базовый read-only ViewSet журнала:
+    - ?fields=id,value,... - разреженный набор полей, отображается в .only();
+    - ?updated_since=<ISO datetime> - только записи, измененные после указанного момента
+      (время без часового пояса - в текущем часовом поясе сервера);
+    - курсорная пагинация по (updated_at, id);
+    - ?academic_year=<id> / ?quarter=<id> - для моделей с архивом (archive_model) записи
+      архивного года читаются из архива; без этих параметров отдаются только года вне архива.
+
+    ?updated_since не показывает удаленные записи: удаления оценок отдает deleted-grades/,
+    для остальных эндпоинтов удаления видны только при полной синхронизации.
+
+    Видимость записей зависит от роли: ученик видит свои записи, родитель - записи детей,
+    учитель - записи своих уроков, администратор - все.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = UpdatedCursorPagination
+    filter_backends = [DjangoFilterBackend]
+
+    # Путь к ученику, к классу и к учителю урока (None - фильтр по роли не применяется)
+    student_lookup = 'student'
+    class_group_lookup = None
+    teacher_lookup = None
+
+    # Архивная копия модели (journal.archive) и путь к четверти в обеих моделях
+    archive_model = None
+    quarter_lookup = None
+
+    # Поле времени изменения для ?updated_since
+    updated_field = 'updated_at'
+    # Поля, которые всегда загружаются (нужны для курсора)
+    required_fields = ('id', 'updated_at')
+    # Поля сериализатора, которые называются иначе, чем поля модели
+    field_sources = {}
+
+    def get_sparse_fields(self):
+        fields = self.request.query_params.get('fields')
+        if not fields:
+            return None
+
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+        allowed = self.get_serializer_class().Meta.fields
+        unknown = [name for name in fields if name not in allowed]
+        if unknown:
+            raise ValidationError({'fields': f'Неизвестные поля: {", ".join(unknown)}'})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = self.scope_by_role(self.get_source_queryset(), self.request.user)
+
+        updated_since = self.request.query_params.get('updated_since')
+        if updated_since:
+            moment = parse_datetime(updated_since)
+            if moment is None:
+                raise ValidationError({'updated_since': 'Ожидается дата и время в формате ISO 8601'})
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            queryset = queryset.filter(**{f'{self.updated_field}__gt': moment})
+
+        fields = self.get_sparse_fields()
+        if fields:
+            fields = {self.field_sources.get(name, name) for name in fields}
+            queryset = queryset.only(*fields | set(self.required_fields))
+        return queryset
+
+    def get_source_queryset(self):
+        """Рабочая таблица или архив года из ?academic_year= / ?quarter="""
+        if self.archive_model is None:
+            return self.queryset.all()
+
+        params = {}
+        for name in ('academic_year', 'quarter'):
+            value = self.request.query_params.get(name)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({name: 'Ожидается id'})
+                params[name] = int(value)
+
+        year_id = archived_year_id(params.get('academic_year'), params.get('quarter'))
+        if year_id is not None:
+            queryset = self.archive_model.objects.filter(academic_year_id=year_id)
+        else:
+            # Строки перенесенного года остаются в рабочей таблице до очистки - их не отдаем
+            queryset = self.queryset.filter(
+                **{f'{self.quarter_lookup}__academic_year__archived_at__isnull': True}
+            )
+            if 'academic_year' in params:
+                queryset = queryset.filter(
+                    **{f'{self.quarter_lookup}__academic_year_id': params['academic_year']}
+                )
+        if 'quarter' in params:
+            queryset = queryset.filter(**{f'{self.quarter_lookup}_id': params['quarter']})
+        return queryset
+
+    def scope_by_role(self, queryset, user):
+        if user.role == 'ADMIN' or user.is_staff:
+            return queryset
+
+        if user.role == 'STUDENT' and hasattr(user, 'student_profile'):
+            student = user.student_profile
+            if self.student_lookup:
+                return queryset.filter(**{self.student_lookup: student})
+            return queryset.filter(**{self.class_group_lookup: student.class_group_id})
+
+        if user.role == 'PARENT' and hasattr(user, 'parent_profile'):
+            children = user.parent_profile.children.all()
+            if self.student_lookup:
+                return queryset.filter(**{f'{self.student_lookup}__in': children})
+            return queryset.filter(**{
+                f'{self.class_group_lookup}__in': children.values('class_group')
+            })
+
+        if user.role == 'TEACHER' and hasattr(user, 'teacher_profile'):
+            teacher = user.teacher_profile
+            if self.teacher_lookup:
+                return queryset.filter(**{self.teacher_lookup: teacher})
+            # Итоговые оценки: ученики классов, в которых учитель ведет уроки
+            return queryset.filter(
+                student__class_group__in=ClassGroup.objects.filter(lessons__teacher=teacher)
+            )
+
+        return queryset.none()
+
+
+class StudentMarkFilter(filters.FilterSet):
+    lesson_grade_column = filters.NumberFilter(field_name='lesson_column')
+
+    class Meta:
+        model = StudentGrade
+        fields = ['student', 'lesson_grade_column', 'teacher']
+
+
+class StudentMarkViewSet(JournalReadViewSet):
+    """
+    Устаревший эндпоинт marks/: на время перехода отдает оценки основного хранилища
+    (StudentGrade) в прежнем формате. Архив не читает - новым клиентам grades/.
+    """
+    queryset = StudentGrade.objects.all()
+    serializer_class = StudentMarkSerializer
+    teacher_lookup = 'lesson_column__lesson__teacher'
+    filterset_class = StudentMarkFilter
+    field_sources = {'lesson_grade_column': 'lesson_column'}
+
+
+class StudentGradeViewSet(JournalReadViewSet):
+    queryset = StudentGrade.objects.all()
+    serializer_class = StudentGradeSerializer
+    archive_model = ArchivedStudentGrade
+    quarter_lookup = 'quarter'
+    teacher_lookup = 'lesson_column__lesson__teacher'
+    filterset_fields = ['student', 'lesson_column', 'teacher']
+
+
+class AttendanceViewSet(JournalReadViewSet):
+    queryset = Attendance.objects.all()
+    serializer_class = AttendanceSerializer
+    archive_model = ArchivedAttendance
+    quarter_lookup = 'lesson__quarter'
+    teacher_lookup = 'lesson__teacher'
+    filterset_fields = ['student', 'lesson', 'status']
+
+
+class HomeworkViewSet(JournalReadViewSet):
+    queryset = Homework.objects.all()
+    serializer_class = HomeworkSerializer
+    student_lookup = None
+    class_group_lookup = 'lesson__class_group'
+    teacher_lookup = 'lesson__teacher'
+    filterset_fields = ['lesson']
+
+
+class QuarterlyGradeViewSet(JournalReadViewSet):
+    queryset = QuarterlyGrade.objects.all()
+    serializer_class = QuarterlyGradeSerializer
+    filterset_fields = ['student', 'subject', 'quarter', 'is_finalized']
+
+
+class YearlyGradeViewSet(JournalReadViewSet):
+    queryset = YearlyGrade.objects.all()
+    serializer_class = YearlyGradeSerializer
+    filterset_fields = ['student', 'subject', 'academic_year', 'is_finalized']
+
+
+class MarkChangeLogViewSet(JournalReadViewSet):
+    """
+    История изменений оценок (?student=<id>): было/стало, кто и через какой эндпоинт изменил.
+    Учитель видит историю учеников классов, в которых ведет уроки.
+    """
+    queryset = MarkChangeLog.objects.all()
+    serializer_class = MarkChangeLogSerializer
+    pagination_class = HistoryCursorPagination
+    updated_field = 'created_at'
+    required_fields = ('id', 'created_at')
+    filterset_fields = ['student', 'class_group', 'subject', 'quarter']
+
+
+class DeletedGradeViewSet(JournalReadViewSet):
+    """
+    Удаленные оценки для инкрементальной синхронизации grades/ (?updated_since - по времени удаления).
+    Оценка, выставленная в ячейку заново, вернется в grades/ с updated_at позже времени удаления.
+    Журнал изменений пишется пачками с задержкой до MARK_AUDIT_FLUSH_SECONDS: запрашивайте
+    удаления с запасом на этот интервал. Очистка архивированного года удалением не считается.
+    """
+    queryset = MarkChangeLog.objects.filter(new_value__isnull=True, lesson_column__isnull=False)
+    serializer_class = DeletedGradeSerializer
+    pagination_class = DeletedCursorPagination
+    updated_field = 'created_at'
+    required_fields = ('id', 'created_at')
+    filterset_fields = ['student', 'lesson_column']
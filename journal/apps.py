@@ -1,6 +1,40 @@
 from django.apps import AppConfig
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_migrate
+
+
+def backfill_denormalized_marks(sender, apps, using, verbosity=1, **kwargs):
+    """
+    После migrate: заполнить денормализованные поля оценок, созданных до их появления.
+    Файлы миграций в репозитории не хранятся, поэтому вместо миграции данных - этот обработчик;
+    пока поля не заполнены, такие оценки не попадают в выборки по предмету и четверти.
+    Каждая модель проверяется отдельно; команда заполнения работает с основной БД.
+    """
+    from django.core.management import call_command
+    from .models import DENORMALIZED_MARK_FIELDS, unfilled_denormalized_q
+
+    if using != DEFAULT_DB_ALIAS:
+        return
+
+    models = []
+    for name in ('StudentMark', 'StudentGrade'):
+        try:
+            model = apps.get_model('journal', name)
+        except LookupError:
+            continue
+        # Миграции откатили до появления полей - заполнять нечего
+        if not {field.name for field in model._meta.get_fields()} >= set(DENORMALIZED_MARK_FIELDS):
+            continue
+        if model.objects.using(using).filter(unfilled_denormalized_q()).exists():
+            models.append(name)
+    if models:
+        call_command('backfill_mark_denorm', models=models, verbosity=verbosity)
 
 
 class JournalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'journal'
+
+    def ready(self):
+        import journal.signals
+        post_migrate.connect(backfill_denormalized_marks, sender=self)
@@ -0,0 +1,275 @@
+# journal/archive.py
+"""
+Архив закрытых учебных лет.
+
+Оценки (StudentGrade) и посещаемость (Attendance) закрытого года переносятся в таблицы
+ArchivedStudentGrade и ArchivedAttendance, чтобы рабочие таблицы и их индексы не росли
+из года в год. Перенос (команда archive_year) идет в три этапа, каждый пачками по id
+и с повторным запуском с места остановки:
+1. копирование строк года в архив (курсор - наибольший id года в архиве);
+2. сверка и переключение: AcademicYear.archived_at, с этого момента чтение идет из архива;
+3. удаление перенесенных строк из рабочих таблиц.
+
+Чтение оценок четверти - через grade_queryset(quarter_id): для архивного года это
+ArchivedStudentGrade с теми же полями и связями. Выборки без четверти складываются из обеих
+таблиц: grade_querysets() и attendance_querysets(), списки - merged_grades(), итоги -
+grade_totals() и sum_aggregates(). API журнала читает архив, если ?academic_year= или ?quarter=
+указывают на архивный год (archived_year_id).
+
+Счетчики за сегодня и за текущий месяц читают только рабочие таблицы: в архив переносятся
+только закончившиеся годы.
+"""
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from school_structure.models import AcademicYear, Quarter
+from .models import (
+    StudentGrade, ArchivedStudentGrade, Attendance, ArchivedAttendance,
+    StudentMark, YearlyGrade,
+)
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class ArchiveError(Exception):
+    """Год нельзя перенести в архив"""
+
+
+def is_archived_quarter(quarter_id):
+    return Quarter.objects.filter(id=quarter_id, academic_year__archived_at__isnull=False).exists()
+
+
+def grade_queryset(quarter_id=None):
+    """Оценки четверти: рабочая таблица или архив, если год четверти перенесен в архив"""
+    if quarter_id and is_archived_quarter(quarter_id):
+        return ArchivedStudentGrade.objects.all()
+    return StudentGrade.objects.all()
+
+
+def archived_year_id(academic_year_id=None, quarter_id=None):
+    """id учебного года, если он (или год четверти) перенесен в архив, иначе None"""
+    if quarter_id:
+        return Quarter.objects.filter(
+            id=quarter_id, academic_year__archived_at__isnull=False
+        ).values_list('academic_year_id', flat=True).first()
+    if academic_year_id:
+        return AcademicYear.objects.filter(
+            id=academic_year_id, archived_at__isnull=False
+        ).values_list('id', flat=True).first()
+    return None
+
+
+def grade_querysets(quarter_id=None):
+    """
+    Таблицы, из которых читаются оценки: для четверти - одна (grade_queryset), без четверти -
+    рабочая по годам вне архива и архив перенесенных лет (строки года между копированием
+    и удалением есть в обеих, но читаются только из одной)
+    """
+    if quarter_id:
+        return [grade_queryset(quarter_id)]
+    return [
+        StudentGrade.objects.filter(quarter__academic_year__archived_at__isnull=True),
+        ArchivedStudentGrade.objects.filter(academic_year__archived_at__isnull=False),
+    ]
+
+
+def attendance_querysets():
+    """Посещаемость всех лет: рабочая таблица по годам вне архива и архив перенесенных лет"""
+    return [
+        Attendance.objects.filter(lesson__quarter__academic_year__archived_at__isnull=True),
+        ArchivedAttendance.objects.filter(academic_year__archived_at__isnull=False),
+    ]
+
+
+def merged_grades(querysets, offset=0, limit=None):
+    """
+    Строки выборок, упорядоченных по -created_at, одним списком в том же порядке.
+    offset и limit - срез общего порядка: из каждой выборки читается не больше offset + limit строк.
+    """
+    if limit is not None:
+        querysets = [queryset[:offset + limit] for queryset in querysets]
+    merged = heapq.merge(*querysets, key=attrgetter('created_at'), reverse=True)
+    return list(islice(merged, offset, None if limit is None else offset + limit))
+
+
+def sum_aggregates(querysets, **aggregates):
+    """Суммы аддитивных агрегатов (Count, Sum) по выборкам - агрегатом в БД на каждую"""
+    totals = dict.fromkeys(aggregates, 0)
+    for queryset in querysets:
+        for name, value in queryset.aggregate(**aggregates).items():
+            totals[name] += value or 0
+    return totals
+
+
+def grade_totals(querysets):
+    """Число оценок и сумма баллов по выборкам"""
+    totals = sum_aggregates(querysets, count=Count('id'), total=Sum('value'))
+    return totals['count'], totals['total']
+
+
+def grade_totals_by_subject(querysets):
+    """
+    {subject_id: {'count', 'total', 'last'}} по выборкам - сгруппированным запросом на каждую;
+    last - последняя по created_at оценка предмета среди всех выборок
+    """
+    totals = {}
+    for queryset in querysets:
+        latest = queryset.filter(subject_id=OuterRef('subject_id')).order_by('-created_at', '-id')
+        rows = queryset.filter(subject__isnull=False).order_by().values('subject_id').annotate(
+            count=Count('id'),
+            total=Sum('value'),
+            last_at=Max('created_at'),
+            last=Subquery(latest.values('value')[:1]),
+        )
+        for row in rows:
+            entry = totals.setdefault(row['subject_id'], {'count': 0, 'total': 0, 'last': None, 'last_at': None})
+            entry['count'] += row['count']
+            entry['total'] += row['total']
+            if entry['last_at'] is None or row['last_at'] > entry['last_at']:
+                entry['last'], entry['last_at'] = row['last'], row['last_at']
+    return totals
+
+
+def _grade_rows(academic_year):
+    # Предмет, четверть и класс берутся из урока, незаполненный вес - из типа оценки:
+    # в архиве денормализованные поля всегда заполнены
+    return StudentGrade.objects.filter(
+        lesson_column__lesson__quarter__academic_year=academic_year
+    ).values_list(
+        'id', 'student_id', 'lesson_column_id', 'value', 'comment', 'created_at', 'updated_at',
+        'teacher_id', 'lesson_column__lesson__subject_id', 'lesson_column__lesson__quarter_id',
+        'lesson_column__lesson__class_group_id', Coalesce('weight', 'lesson_column__grade_type__weight'),
+    )
+
+
+def _archived_grade(academic_year, row):
+    (grade_id, student_id, lesson_column_id, value, comment, created_at, updated_at,
+     teacher_id, subject_id, quarter_id, class_group_id, weight) = row
+    return ArchivedStudentGrade(
+        id=grade_id, academic_year=academic_year, student_id=student_id, lesson_column_id=lesson_column_id,
+        value=value, comment=comment, created_at=created_at, updated_at=updated_at, teacher_id=teacher_id,
+        subject_id=subject_id, quarter_id=quarter_id, class_group_id=class_group_id, weight=weight,
+    )
+
+
+def _attendance_rows(academic_year):
+    return Attendance.objects.filter(
+        lesson__quarter__academic_year=academic_year
+    ).values_list('id', 'student_id', 'lesson_id', 'status', 'note', 'updated_at')
+
+
+def _archived_attendance(academic_year, row):
+    attendance_id, student_id, lesson_id, status, note, updated_at = row
+    return ArchivedAttendance(
+        id=attendance_id, academic_year=academic_year, student_id=student_id, lesson_id=lesson_id,
+        status=status, note=note, updated_at=updated_at,
+    )
+
+
+class YearArchive:
+    """Перенос одного учебного года в архив; каждый этап можно повторять"""
+
+    # (название, рабочие строки года, архивная модель, построение архивной строки)
+    TABLES = (
+        ('оценки', _grade_rows, ArchivedStudentGrade, _archived_grade),
+        ('посещаемость', _attendance_rows, ArchivedAttendance, _archived_attendance),
+    )
+
+    def __init__(self, academic_year, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+        self.academic_year = academic_year
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+
+    def problems(self, require_finalized=True):
+        """Причины, по которым год нельзя переносить (пустой список - можно)"""
+        year = self.academic_year
+        problems = []
+        if year.is_current:
+            problems.append('год отмечен как текущий')
+        if year.end_date >= timezone.now().date():
+            problems.append('год еще не закончился')
+        if StudentMark.objects.filter(lesson_grade_column__lesson__quarter__academic_year=year).exists():
+            problems.append('есть оценки устаревшей схемы - сначала выполните migrate_student_marks')
+        if require_finalized and YearlyGrade.objects.filter(academic_year=year, is_finalized=False).exists():
+            problems.append('есть неутвержденные годовые оценки')
+        return problems
+
+    def pending(self):
+        """Строк года в рабочих таблицах и в архиве"""
+        return {
+            title: (rows(self.academic_year).count(), target.objects.filter(academic_year=self.academic_year).count())
+            for title, rows, target, _ in self.TABLES
+        }
+
+    def copy(self):
+        """Этап 1: скопировать строки года в архив пачками; повторный запуск продолжает с курсора"""
+        for title, rows, target, build in self.TABLES:
+            cursor = target.objects.filter(academic_year=self.academic_year).aggregate(Max('id'))['id__max'] or 0
+            copied = 0
+            while True:
+                batch = list(rows(self.academic_year).filter(id__gt=cursor).order_by('id')[:self.batch_size])
+                if not batch:
+                    break
+                target.objects.bulk_create(
+                    [build(self.academic_year, row) for row in batch], ignore_conflicts=True
+                )
+                cursor = batch[-1][0]
+                copied += len(batch)
+                self.progress(f'{title}: скопировано {copied}')
+
+    def switch(self):
+        """
+        Этап 2: сверить архив с рабочими таблицами и переключить чтение на архив.
+        Строки, добавленные или измененные (по updated_at) после копирования, переносятся
+        заново; удаленные из рабочих таблиц удаляются и из архива.
+        """
+        with transaction.atomic():
+            for title, rows, target, build in self.TABLES:
+                archived = target.objects.filter(academic_year=self.academic_year)
+                stale = list(rows(self.academic_year).exclude(
+                    Exists(archived.filter(id=OuterRef('id'), updated_at=OuterRef('updated_at')))
+                ))
+                if stale:
+                    target.objects.bulk_create(
+                        [build(self.academic_year, row) for row in stale],
+                        batch_size=self.batch_size,
+                        update_conflicts=True,
+                        unique_fields=['id'],
+                        update_fields=[field.name for field in target._meta.concrete_fields if not field.primary_key],
+                    )
+                removed, _ = archived.exclude(id__in=rows(self.academic_year).values('id')).delete()
+                if stale or removed:
+                    self.progress(f'{title}: досверено {len(stale)}, удалено из архива {removed}')
+
+            self.academic_year.archived_at = timezone.now()
+            self.academic_year.save(update_fields=['archived_at'])
+        self.progress('чтение переключено на архив')
+
+    def purge(self):
+        """Этап 3: удалить перенесенные строки из рабочих таблиц пачками"""
+        if not self.academic_year.is_archived:
+            raise ArchiveError('год еще не переключен на архив')
+        for title, rows, target, _ in self.TABLES:
+            model = rows(self.academic_year).model
+            deleted = 0
+            while True:
+                ids = list(rows(self.academic_year).values_list('id', flat=True).order_by('id')[:self.batch_size])
+                if not ids:
+                    break
+                # Без загрузки объектов и сигналов post_delete: перенос в архив - не удаление
+                # оценки, в журнал изменений и в поток событий журнала он не попадает
+                with transaction.atomic():
+                    deleted += model.objects.filter(id__in=ids)._raw_delete(model.objects.db)
+                self.progress(f'{title}: удалено из рабочей таблицы {deleted}')
+
+    def run(self):
+        if not self.academic_year.is_archived:
+            self.copy()
+            self.switch()
+        self.purge()
@@ -0,0 +1,200 @@
+# journal/audit.py
+"""
+Буферизованная запись журнала изменений оценок (MarkChangeLog).
+
+Изменение оценки не добавляет INSERT в транзакцию запроса: после фиксации транзакции
+запись попадает в буфер процесса, а в БД буфер пишется одним bulk_create - когда наберется
+MARK_AUDIT_FLUSH_SIZE записей, по таймеру раз в MARK_AUDIT_FLUSH_SECONDS, в конце запроса
+(если интервал уже истек) и при штатном завершении процесса (atexit).
+"""
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, transaction, DatabaseError, InterfaceError, OperationalError
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MAX_LENGTH = 100
+
+_current_request = ContextVar('mark_audit_request', default=None)
+_current_source = ContextVar('mark_audit_source', default=None)
+
+
+@contextmanager
+def audit_request(request):
+    """Изменения внутри блока подписываются маршрутом и пользователем запроса"""
+    token = _current_request.set(request)
+    try:
+        yield
+    finally:
+        _current_request.reset(token)
+
+
+@contextmanager
+def audit_source(source, user=None):
+    """Источник изменений вне HTTP-запроса: команды управления, фоновые задачи"""
+    token = _current_source.set((source, getattr(user, 'pk', user)))
+    try:
+        yield
+    finally:
+        _current_source.reset(token)
+
+
+def _source_and_user():
+    explicit = _current_source.get()
+    if explicit is not None:
+        return explicit
+
+    request = _current_request.get()
+    if request is None:
+        return 'system', None
+    match = getattr(request, 'resolver_match', None)
+    user = getattr(request, 'user', None)
+    return (
+        match.view_name if match else request.path,
+        user.pk if user is not None and user.is_authenticated else None,
+    )
+
+
+class MarkChangeBuffer:
+    """Потокобезопасный буфер записей журнала с записью пачками"""
+
+    def __init__(self, flush_size, flush_seconds):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self._entries = []
+        self._lock = threading.Lock()
+        # Пачки пишутся по одной, чтобы записи попадали в БД в порядке изменений
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entries):
+        with self._lock:
+            self._entries.extend(entries)
+            full = len(self._entries) >= self.flush_size
+            if self._timer is None or not self._timer.is_alive():
+                self._timer = threading.Thread(target=self._run_timer, name='mark-audit-flush', daemon=True)
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            finally:
+                # Соединения потока таймера не держим между пачками
+                connections.close_all()
+
+    def flush_if_due(self):
+        with self._lock:
+            due = bool(self._entries) and (
+                len(self._entries) >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_seconds
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Записать накопленные записи. При недоступности БД пачка возвращается в буфер;
+        строки, которые не записываются и по одной, отбрасываются с записью в лог,
+        чтобы не блокировать все следующие пачки.
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries, self._entries = self._entries, []
+                self._last_flush = time.monotonic()
+            if not entries:
+                return 0
+            try:
+                entries = self._without_deleted_students(entries)
+                rejected = self._write(entries)
+            except (OperationalError, InterfaceError):
+                logger.exception('БД недоступна, журнал изменений оценок будет записан позже (%s записей)',
+                                 len(entries))
+                with self._lock:
+                    self._entries[:0] = entries
+                return 0
+        for entry in rejected:
+            logger.error('Запись журнала изменений оценок отброшена: ученик %s, столбец %s, %s -> %s (%s)',
+                         entry.student_id, entry.lesson_column_id, entry.old_value, entry.new_value, entry.source)
+        return len(entries) - len(rejected)
+
+    @staticmethod
+    def _without_deleted_students(entries):
+        """История удаленного ученика удаляется вместе с ним (CASCADE) - его записи не пишем"""
+        from users.models import StudentProfile
+
+        existing = set(StudentProfile.objects.filter(
+            id__in={entry.student_id for entry in entries}
+        ).values_list('id', flat=True))
+        return [entry for entry in entries if entry.student_id in existing]
+
+    def _write(self, entries):
+        """Записать пачку; при ошибке данных - половинами. Возвращает строки, которые не записались"""
+        from .models import MarkChangeLog
+
+        if not entries:
+            return []
+        try:
+            with transaction.atomic():
+                MarkChangeLog.objects.bulk_create(entries, batch_size=500)
+            return []
+        except (OperationalError, InterfaceError):
+            raise
+        except DatabaseError:
+            # Пачка откатилась целиком - id, выданные ее части, недействительны
+            for entry in entries:
+                entry.pk = None
+            if len(entries) == 1:
+                return entries
+            middle = len(entries) // 2
+            return self._write(entries[:middle]) + self._write(entries[middle:])
+
+
+mark_change_buffer = MarkChangeBuffer(settings.MARK_AUDIT_FLUSH_SIZE, settings.MARK_AUDIT_FLUSH_SECONDS)
+# Штатное завершение процесса (в т.ч. воркера gunicorn по SIGTERM) не теряет накопленное
+atexit.register(mark_change_buffer.flush)
+
+
+def mark_change(grade, old_value, new_value):
+    """Изменение ячейки для record_mark_changes по объекту StudentGrade"""
+    return {
+        'student_id': grade.student_id,
+        'lesson_column_id': grade.lesson_column_id,
+        'class_group_id': grade.class_group_id,
+        'subject_id': grade.subject_id,
+        'quarter_id': grade.quarter_id,
+        'teacher_id': grade.teacher_id,
+        'old_value': old_value,
+        'new_value': new_value,
+    }
+
+
+def record_mark_changes(changes):
+    """
+    Добавить изменения в журнал после фиксации текущей транзакции (откаченные не попадают).
+    changes - словари mark_change(); изменения без смены значения пропускаются.
+    """
+    from .models import MarkChangeLog
+
+    source, user_id = _source_and_user()
+    now = timezone.now()
+    entries = [
+        MarkChangeLog(**change, source=source[:SOURCE_MAX_LENGTH], changed_by_id=user_id, created_at=now)
+        for change in changes if change['old_value'] != change['new_value']
+    ]
+    if entries:
+        transaction.on_commit(lambda: mark_change_buffer.add(entries))
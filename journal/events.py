@@ -0,0 +1,100 @@
+# journal/events.py
+"""
+Публикация изменений журнала для открытых сеток оценок.
+
+Канал - тройка (класс, предмет, четверть). Сигналы моделей публикуют компактные события,
+асинхронное SSE-представление подписывается на канал и отдает их браузеру.
+
+Брокер по умолчанию работает внутри одного процесса. Для нескольких воркеров
+в настройке JOURNAL_EVENTS_BACKEND указывается путь к классу с тем же интерфейсом
+(subscribe / unsubscribe / publish), например поверх Redis pub/sub.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.module_loading import import_string
+
+DEFAULT_BACKEND = 'journal.events.InProcessBroker'
+
+# Сколько событий держим для медленного клиента, прежде чем отбрасывать старые
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+def live_events_enabled(request):
+    """
+    SSE-поток включен настройкой JOURNAL_LIVE_EVENTS и только для запросов через ASGI:
+    под WSGI StreamingHttpResponse дочитывает асинхронный поток до конца, а он бесконечен.
+    """
+    return settings.JOURNAL_LIVE_EVENTS and isinstance(request, ASGIRequest)
+
+
+def channel_name(class_id, subject_id, quarter_id):
+    return f'journal:{class_id}:{subject_id}:{quarter_id}'
+
+
+class Subscription:
+    """Очередь событий одного подписчика, привязанная к его event loop"""
+
+    def __init__(self, channel, loop, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.channel = channel
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        # Вызывается только в потоке event loop подписчика
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """
+    Брокер внутри процесса: публикация возможна из любого потока
+    (сигналы срабатывают в синхронном коде), доставка - через call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # Event loop подписчика уже закрыт
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    backend = getattr(settings, 'JOURNAL_EVENTS_BACKEND', DEFAULT_BACKEND)
+    return import_string(backend)()
+
+
+def publish(class_id, subject_id, quarter_id, event):
+    return get_broker().publish(channel_name(class_id, subject_id, quarter_id), event)
@@ -0,0 +1,339 @@
+# journal/integrity.py
+"""
+Проверки целостности данных журнала для команды check_grades.
+
+Каждая проверка - один-два запроса к БД над всем набором данных, а не цикл по объектам;
+исправления выполняются массовыми delete/bulk_create/bulk_update. Проверки независимы
+и только читают данные, поэтому могут выполняться параллельно в потоках.
+Набор данных можно ограничить одним уроком или одним учеником (lesson_id, student_id).
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
+
+from school_structure.models import Lesson
+from .models import (
+    GradeType, LessonColumn, LessonGradeColumn, StudentGrade, StudentMark,
+    QuarterlyGrade, DENORMALIZED_MARK_FIELDS
+)
+from .utils import recalculate_quarterly_grades
+
+# Допустимое расхождение расчетного балла (хранится округленным до сотых)
+CALCULATED_GRADE_TOLERANCE = 0.005
+
+
+class IntegrityCheck:
+    """Проверка: problems() - QuerySet проблемных строк, fix() - исправление (None, если не исправляется)"""
+    name = ''
+    title = ''
+    fixable = False
+    # Пути к уроку и к ученику от проверяемой модели - для ограничения по lesson_id/student_id
+    lesson_lookup = 'lesson_column__lesson'
+    student_lookup = 'student'
+
+    def __init__(self, lesson_id=None, student_id=None):
+        self.lesson_id = lesson_id
+        self.student_id = student_id
+
+    def scoped(self, queryset):
+        """Ограничить выборку проверяемой модели уроком и учеником"""
+        if self.lesson_id is not None:
+            queryset = queryset.filter(**{self.lesson_lookup: self.lesson_id})
+        if self.student_id is not None:
+            queryset = queryset.filter(**{self.student_lookup: self.student_id})
+        return queryset
+
+    def problems(self):
+        raise NotImplementedError
+
+    def find(self, samples):
+        problems = self.problems()
+        return problems.count(), list(problems[:samples])
+
+    def fix(self):
+        return None
+
+
+class DuplicateGrades(IntegrityCheck):
+    name = 'duplicate_grades'
+    title = 'Дубликаты оценок (StudentGrade)'
+    fixable = True
+    model = StudentGrade
+    column_field = 'lesson_column'
+
+    def problems(self):
+        return self.scoped(self.model.objects.all()).values('student_id', self.column_field).annotate(
+            count=Count('id')
+        ).filter(count__gt=1).order_by('student_id', self.column_field)
+
+    def fix(self):
+        # В каждой ячейке остается последняя добавленная запись
+        newer = self.model.objects.filter(
+            student=OuterRef('student'),
+            **{self.column_field: OuterRef(self.column_field)},
+            id__gt=OuterRef('id'),
+        )
+        deleted, _ = self.scoped(self.model.objects.filter(Exists(newer))).delete()
+        return deleted
+
+
+class DuplicateMarks(DuplicateGrades):
+    name = 'duplicate_marks'
+    title = 'Дубликаты оценок устаревшей схемы (StudentMark)'
+    model = StudentMark
+    column_field = 'lesson_grade_column'
+    lesson_lookup = 'lesson_grade_column__lesson'
+
+
+class LessonsWithoutColumns(IntegrityCheck):
+    name = 'lessons_without_columns'
+    title = 'Уроки без столбцов оценок'
+    fixable = True
+    lesson_lookup = 'id'
+    student_lookup = 'class_group__students'
+
+    def problems(self):
+        return self.scoped(Lesson.objects.filter(columns__isnull=True)).values(
+            'id', 'date', 'class_group_id', 'subject_id'
+        ).order_by('id')
+
+    def fix(self):
+        default_grade_type = GradeType.objects.filter(is_default=True).first()
+        if default_grade_type is None:
+            return 0
+        created = LessonColumn.objects.bulk_create([
+            LessonColumn(lesson_id=lesson_id, grade_type=default_grade_type,
+                         title=default_grade_type.title, order=10)
+            for lesson_id in self.problems().values_list('id', flat=True)
+        ], batch_size=1000, ignore_conflicts=True)
+        return len(created)
+
+
+class OrphanLegacyColumns(IntegrityCheck):
+    name = 'orphan_legacy_columns'
+    title = 'Пустые столбцы устаревшей схемы, уже перенесенные в LessonColumn'
+    fixable = True
+    lesson_lookup = 'lesson'
+    student_lookup = 'lesson__class_group__students'
+
+    def problems(self):
+        return self.scoped(LessonGradeColumn.objects.all()).filter(
+            ~Exists(StudentMark.objects.filter(lesson_grade_column=OuterRef('pk'))),
+            Exists(LessonColumn.objects.filter(
+                lesson=OuterRef('lesson'), grade_type__title=OuterRef('grade_column__title')
+            )),
+        ).values('id', 'lesson_id', 'grade_column_id').order_by('id')
+
+    def fix(self):
+        deleted, _ = LessonGradeColumn.objects.filter(
+            id__in=self.problems().values('id')
+        ).delete()
+        return deleted
+
+
+class LessonsOutsideQuarter(IntegrityCheck):
+    name = 'lessons_outside_quarter'
+    title = 'Уроки с датой вне границ своей четверти'
+    lesson_lookup = 'id'
+    student_lookup = 'class_group__students'
+
+    def problems(self):
+        return self.scoped(Lesson.objects.all()).filter(
+            Q(date__lt=F('quarter__start_date')) | Q(date__gt=F('quarter__end_date'))
+        ).values('id', 'date', 'quarter_id', 'quarter__start_date', 'quarter__end_date').order_by('id')
+
+
+class StaleDenormalizedGrades(IntegrityCheck):
+    name = 'stale_denormalized_grades'
+    title = 'Оценки с устаревшими денормализованными полями (предмет, четверть, класс, вес)'
+    fixable = True
+    batch_size = 2000
+
+    def problems(self):
+        stale = Q()
+        for field, source in (
+            ('subject', 'lesson_column__lesson__subject'),
+            ('quarter', 'lesson_column__lesson__quarter'),
+            ('class_group', 'lesson_column__lesson__class_group'),
+            ('weight', 'lesson_column__grade_type__weight'),
+        ):
+            stale |= Q(**{f'{field}__isnull': True}) | ~Q(**{field: F(source)})
+        return self.scoped(StudentGrade.objects.filter(stale)).values(
+            'id', 'student_id', 'lesson_column_id'
+        ).order_by('id')
+
+    def fix(self):
+        fixed = 0
+        last_id = 0
+        while True:
+            batch = list(StudentGrade.objects.filter(
+                id__in=self.problems().filter(id__gt=last_id).values('id')[:self.batch_size]
+            ).select_related('lesson_column__lesson', 'lesson_column__grade_type').order_by('id'))
+            if not batch:
+                return fixed
+            for grade in batch:
+                grade.fill_denormalized()
+            StudentGrade.objects.bulk_update(batch, DENORMALIZED_MARK_FIELDS)
+            fixed += len(batch)
+            last_id = batch[-1].id
+
+
+class StaleQuarterlyGrades(IntegrityCheck):
+    name = 'stale_quarterly_grades'
+    title = 'Четвертные оценки с устаревшим расчетным баллом'
+    fixable = True
+
+    def scoped(self, queryset):
+        """
+        Оценки и четвертные оценки по тройкам (ученик, предмет, четверть), которых касается
+        урок или ученик: для урока - все оценки его предмета и четверти у учеников класса
+        """
+        if self.lesson_id is not None:
+            lesson = Lesson.objects.filter(id=self.lesson_id).values(
+                'subject_id', 'quarter_id', 'class_group_id'
+            ).first()
+            if lesson is None:
+                return queryset.none()
+            queryset = queryset.filter(
+                subject_id=lesson['subject_id'],
+                quarter_id=lesson['quarter_id'],
+                student__class_group_id=lesson['class_group_id'],
+            )
+        if self.student_id is not None:
+            queryset = queryset.filter(student_id=self.student_id)
+        return queryset
+
+    def stale_keys(self):
+        """(student_id, subject_id, quarter_id) с расхождением: два сгруппированных запроса"""
+        expected = {}
+        # Вес как в StudentGrade.effective_weight: сохраненный или текущий вес типа оценки
+        weight = Coalesce('weight', 'lesson_column__grade_type__weight')
+        # Оценки с незаполненными денормализованными полями относятся к проверке stale_denormalized_grades,
+        # строки архивных лет, ожидающие очистки, - к архиву
+        for row in self.scoped(StudentGrade.objects.all()).filter(
+            subject__isnull=False, quarter__isnull=False,
+            quarter__academic_year__archived_at__isnull=True,
+        ).values('student_id', 'subject_id', 'quarter_id').annotate(
+            weighted=Sum(F('value') * weight), total=Sum(weight)
+        ).order_by():
+            key = (row['student_id'], row['subject_id'], row['quarter_id'])
+            expected[key] = round(row['weighted'] / row['total'], 2) if row['total'] else None
+
+        stale = []
+        stored_keys = set()
+        # Оценки архивных лет перенесены из StudentGrade - их четвертные оценки не сверяются
+        for student_id, subject_id, quarter_id, calculated in self.scoped(QuarterlyGrade.objects.all()).filter(
+            quarter__academic_year__archived_at__isnull=True
+        ).values_list(
+            'student_id', 'subject_id', 'quarter_id', 'calculated_grade'
+        ):
+            key = (student_id, subject_id, quarter_id)
+            stored_keys.add(key)
+            value = expected.get(key)
+            if (value is None) != (calculated is None) or (
+                value is not None and abs(value - calculated) > CALCULATED_GRADE_TOLERANCE
+            ):
+                stale.append({'key': key, 'stored': calculated, 'expected': value})
+        # Оценки есть, а четвертной записи нет
+        stale.extend(
+            {'key': key, 'stored': None, 'expected': value}
+            for key, value in expected.items() if key not in stored_keys and value is not None
+        )
+        return stale
+
+    def find(self, samples):
+        stale = self.stale_keys()
+        return len(stale), stale[:samples]
+
+    def fix(self):
+        return len(recalculate_quarterly_grades(row['key'] for row in self.stale_keys()))
+
+
+class MarksOnFinalizedQuarters(IntegrityCheck):
+    name = 'marks_on_finalized_quarters'
+    title = 'Оценки, измененные после утверждения четвертной оценки'
+
+    def problems(self):
+        return self.scoped(StudentGrade.objects.all()).filter(Exists(QuarterlyGrade.objects.filter(
+            student=OuterRef('student'),
+            subject=OuterRef('subject'),
+            quarter=OuterRef('quarter'),
+            is_finalized=True,
+            finalized_at__lt=OuterRef('updated_at'),
+        ))).values('id', 'student_id', 'subject_id', 'quarter_id', 'updated_at').order_by('id')
+
+
+# Порядок важен для исправлений: четвертные оценки пересчитываются после
+# удаления дубликатов и заполнения денормализованных полей
+CHECKS = [
+    DuplicateGrades,
+    DuplicateMarks,
+    LessonsWithoutColumns,
+    OrphanLegacyColumns,
+    LessonsOutsideQuarter,
+    StaleDenormalizedGrades,
+    StaleQuarterlyGrades,
+    MarksOnFinalizedQuarters,
+]
+CHECK_NAMES = [check.name for check in CHECKS]
+
+
+def _find(check, samples):
+    started = time.perf_counter()
+    count, found = check.find(samples)
+    return {
+        'name': check.name,
+        'title': check.title,
+        'count': count,
+        'samples': found,
+        'fixable': check.fixable,
+        'fixed': None,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _find_in_thread(check, samples):
+    try:
+        return _find(check, samples)
+    finally:
+        # Соединение рабочего потока закрываем сразу, иначе оно останется открытым
+        connections.close_all()
+
+
+def run_checks(names=None, samples=5, jobs=1, fix=False, lesson_id=None, student_id=None):
+    """
+    Выполнить проверки и вернуть отчет {'ok': bool, 'checks': [...]}.
+    jobs > 1 - проверки выполняются параллельно в потоках (каждый со своим соединением);
+    исправления всегда выполняются последовательно в порядке CHECKS.
+    lesson_id/student_id ограничивают проверки и исправления одним уроком или учеником.
+    """
+    checks = [
+        check(lesson_id=lesson_id, student_id=student_id)
+        for check in CHECKS if names is None or check.name in names
+    ]
+
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            # Контекст копируется, чтобы в потоках действовал use_replica() вызывающего кода
+            futures = [
+                executor.submit(contextvars.copy_context().run, _find_in_thread, check, samples)
+                for check in checks
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [_find(check, samples) for check in checks]
+
+    if fix:
+        for check, result in zip(checks, results):
+            if result['count'] and check.fixable:
+                with transaction.atomic():
+                    result['fixed'] = check.fix()
+
+    return {
+        'ok': not any(result['count'] for result in results),
+        'checks': results,
+    }
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.archive import YearArchive, DEFAULT_BATCH_SIZE
+from school_structure.models import AcademicYear
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос оценок и посещаемости закрытого учебного года в архивные таблицы. '
+        'Работает пачками; прерванный перенос продолжается повторным запуском. '
+        'Страницы оценок четвертей архивного года читают данные из архива'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', help='Учебный год (например, 2023-2024) или его id')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Строк в пачке')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить год и посчитать строки')
+        parser.add_argument('--skip-finalized-check', action='store_true',
+                            help='Переносить год, даже если не все годовые оценки утверждены')
+
+    def handle(self, *args, **options):
+        year = options['year']
+        lookup = {'id': int(year)} if year.isdigit() else {'year': year}
+        try:
+            academic_year = AcademicYear.objects.get(**lookup)
+        except AcademicYear.DoesNotExist:
+            raise CommandError(f'Учебный год {year} не найден')
+
+        archive = YearArchive(
+            academic_year,
+            batch_size=max(options['batch_size'], 1),
+            progress=lambda message: self.stdout.write(f'  {message}'),
+        )
+        # Переключенный на архив год только дочищается - проверки уже пройдены
+        if not academic_year.is_archived:
+            problems = archive.problems(require_finalized=not options['skip_finalized_check'])
+            if problems:
+                raise CommandError(f'Год {academic_year} нельзя перенести в архив: {"; ".join(problems)}')
+
+        for title, (hot, archived) in archive.pending().items():
+            self.stdout.write(f'{title}: в рабочей таблице {hot}, в архиве {archived}')
+        if options['dry_run']:
+            return
+
+        archive.run()
+        self.stdout.write(self.style.SUCCESS(f'Учебный год {academic_year} перенесен в архив'))
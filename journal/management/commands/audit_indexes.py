@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from journal.models import StudentGrade, Homework, Attendance
+from school_structure.benchmark import build_demo_school, add_demo_journal, BenchmarkRollback
+from school_structure.models import Lesson
+
+# Индексы, добавленные по результатам аудита
+AUDITED_INDEXES = [
+    (StudentGrade, 'studentgrade_teacher_created'),
+    (Lesson, 'lesson_class_subject_quarter'),
+]
+
+# Удаленные индексы: дублировали индексы ограничений unique_together
+REMOVED_INDEXES = [
+    (Attendance, models.Index(fields=['student', 'lesson'], name='audit_attendance_student')),
+    (StudentGrade, models.Index(fields=['student', 'lesson_column'], name='audit_grade_student_column')),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Аудит индексов: план выполнения (EXPLAIN) и время горячих запросов журнала '
+        'на синтетической школе с текущими индексами и без изменений аудита (данные откатываются)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=50, help='Количество учителей')
+        parser.add_argument('--students-per-class', type=int, default=20, help='Учеников в классе')
+        parser.add_argument('--repeat', type=int, default=50, help='Повторов каждого запроса')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                school = build_demo_school(
+                    teachers=options['teachers'],
+                    students_per_class=options['students_per_class'],
+                    with_lessons=True,
+                )
+                add_demo_journal(school, homework=True, attendance=True)
+                queries = self.hot_queries(school)
+
+                after = self.run(queries, options['repeat'], explain=True)
+                # DDL выполняется напрямую: редактор схемы SQLite нельзя открыть внутри транзакции
+                quote = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    for model, name in AUDITED_INDEXES:
+                        cursor.execute(f'DROP INDEX {quote(name)}')
+                    for model, index in REMOVED_INDEXES:
+                        columns = ', '.join(quote(model._meta.get_field(field).column) for field in index.fields)
+                        cursor.execute(f'CREATE INDEX {quote(index.name)} ON {quote(model._meta.db_table)} ({columns})')
+                before = self.run(queries, options['repeat'], explain=options['verbosity'] > 1)
+
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+
+        self.stdout.write(f"\n{'Запрос':<42} {'до, мс':>10} {'после, мс':>10}")
+        for label in after:
+            self.stdout.write(f'{label:<42} {before[label]:>10.3f} {after[label]:>10.3f}')
+
+    def hot_queries(self, school):
+        lesson = school['lessons'][0]
+        student = next(s for s in school['students'] if s.class_group_id == lesson.class_group_id)
+        now = timezone.now()
+        return [
+            ('Последние оценки учителя', lambda: StudentGrade.objects.filter(
+                teacher=lesson.teacher
+            ).order_by('-created_at')[:5]),
+            ('Оценки учителя за период', lambda: StudentGrade.objects.filter(
+                teacher=lesson.teacher, created_at__gte=now - timedelta(days=30)
+            )),
+            ('Оценки ученика по предмету', lambda: StudentGrade.objects.filter(
+                student=student, subject=lesson.subject_id
+            )),
+            ('Уроки журнала (класс, предмет, четверть)', lambda: Lesson.objects.filter(
+                class_group=lesson.class_group_id, subject=lesson.subject_id, quarter=lesson.quarter_id
+            ).order_by('date', 'lesson_number')),
+            ('Оценки журнала (StudentGrade)', lambda: StudentGrade.objects.filter(
+                class_group=lesson.class_group_id, subject=lesson.subject_id, quarter=lesson.quarter_id,
+            )),
+            ('Ближайшие ДЗ класса', lambda: Homework.objects.filter(
+                lesson__class_group=lesson.class_group_id, deadline__gt=now
+            ).order_by('deadline')[:5]),
+            ('ДЗ учителя к проверке', lambda: Homework.objects.filter(
+                lesson__teacher=lesson.teacher, deadline__lt=now
+            ).order_by('deadline')[:5]),
+            ('Посещаемость ученика за месяц', lambda: Attendance.objects.filter(
+                student=student, lesson__date__range=[lesson.date, lesson.date + timedelta(days=31)]
+            ).values('status').annotate(count=models.Count('id'))),
+        ]
+
+    def run(self, queries, repeat, explain=False):
+        timings = {}
+        for label, make_queryset in queries:
+            if explain:
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(make_queryset().explain())
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(make_queryset())
+            timings[label] = (time.perf_counter() - started) / repeat * 1000
+        return timings
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from journal.models import StudentMark, StudentGrade, DENORMALIZED_MARK_FIELDS, unfilled_denormalized_q
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнение денормализованных полей оценок (предмет, четверть, класс, вес) '
+        'для StudentMark и StudentGrade. Работает пачками, повторный запуск продолжает с места остановки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Строк в пачке')
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все строки, а не только незаполненные (например, после изменения весов)'
+        )
+        parser.add_argument(
+            '--model', action='append', choices=['StudentMark', 'StudentGrade'], dest='models',
+            help='Заполнить только указанную модель (можно повторять)'
+        )
+
+    def handle(self, *args, **options):
+        targets = [
+            (StudentMark, 'lesson_grade_column', ('lesson_grade_column__lesson', 'lesson_grade_column__grade_column')),
+            (StudentGrade, 'lesson_column', ('lesson_column__lesson', 'lesson_column__grade_type')),
+        ]
+        for model, column_field, related in targets:
+            if options['models'] and model.__name__ not in options['models']:
+                continue
+            queryset = model.objects.select_related(*related).order_by('id')
+            if not options['all']:
+                queryset = queryset.filter(unfilled_denormalized_q())
+
+            updated = 0
+            last_id = 0
+            while True:
+                batch = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+                if not batch:
+                    break
+                for row in batch:
+                    row.fill_denormalized(getattr(row, column_field))
+                # Каждая пачка фиксируется отдельно: прерванный запуск не теряет сделанного
+                with transaction.atomic():
+                    model.objects.bulk_update(batch, DENORMALIZED_MARK_FIELDS)
+                updated += len(batch)
+                last_id = batch[-1].id
+
+            self.stdout.write(self.style.SUCCESS(f'{model.__name__}: обновлено строк {updated}'))
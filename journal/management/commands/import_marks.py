@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from journal.audit import audit_source
+from journal.mark_import import MarkImport, COLUMN_ALIASES
+from main.tabular import iter_table_rows, TableError
+from school_structure.models import ClassGroup, Subject, Quarter
+from users.models import TeacherProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт оценок журнала из CSV/XLSX. Колонки: student (ФИО), student_id или email; '
+        'lesson_column_id или date + column (тип оценки) и при необходимости lesson_number; '
+        'value, comment; допускаются русские заголовки. При ошибках в файле ничего не записывается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--teacher', required=True, help='Email учителя, от имени которого ставятся оценки')
+        parser.add_argument('--class', dest='class_id', type=int, required=True, help='ID класса')
+        parser.add_argument('--subject', type=int, required=True, help='ID предмета')
+        parser.add_argument('--quarter', type=int, help='ID четверти (по умолчанию все четверти журнала)')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не записывать')
+
+    def handle(self, *args, **options):
+        try:
+            teacher = TeacherProfile.objects.get(user__email=options['teacher'])
+            class_group = ClassGroup.objects.get(id=options['class_id'])
+            subject = Subject.objects.get(id=options['subject'])
+            quarter = Quarter.objects.get(id=options['quarter']) if options.get('quarter') else None
+        except (TeacherProfile.DoesNotExist, ClassGroup.DoesNotExist,
+                Subject.DoesNotExist, Quarter.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        mark_import = MarkImport(teacher, class_group, subject, quarter, dry_run=options['dry_run'])
+        try:
+            with open(options['path'], 'rb') as file, audit_source('import_marks', teacher.user_id):
+                result = mark_import.run(iter_table_rows(file, options['path'], COLUMN_ALIASES))
+        except (OSError, TableError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result['errors']:
+            self.stderr.write(f'  строка {line}: {message}')
+        if result['errors']:
+            raise CommandError(f"Ошибок в файле: {len(result['errors'])}, оценки не импортированы")
+
+        verb = 'Будет импортировано' if options['dry_run'] else 'Импортировано'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} оценок: {result['imported']} ({result['students']} учеников); "
+            f"пустых строк пропущено: {result['skipped']}"
+        ))
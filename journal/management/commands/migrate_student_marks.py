@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from journal.models import (
+    GradeType, GradeColumn, LessonColumn, LessonGradeColumn, StudentGrade, StudentMark
+)
+from journal.utils import recalculate_quarterly_grades
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """Не перезаписывать created_at/updated_at при вставке: переносим даты исходных оценок"""
+    fields = [model._meta.get_field('created_at'), model._meta.get_field('updated_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Перенос оценок устаревшей схемы (GradeColumn/LessonGradeColumn/StudentMark) '
+        'в основную (GradeType/LessonColumn/StudentGrade). Работает пачками по id оценки; '
+        'каждая пачка фиксируется отдельно, повторный запуск безопасен'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Оценок в пачке')
+        parser.add_argument('--after-id', type=int, default=0,
+                            help='Продолжить с оценки StudentMark, следующей за указанным id')
+        parser.add_argument('--delete-source', action='store_true',
+                            help='Удалять перенесенные строки StudentMark')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать строки, которые будут перенесены')
+
+    def handle(self, *args, **options):
+        marks = StudentMark.objects.filter(id__gt=options['after_id']).order_by('id')
+        if options['dry_run']:
+            self.stdout.write(f'К переносу оценок: {marks.count()}')
+            return
+
+        grade_types = self.map_grade_types()
+        moved = skipped = 0
+        last_id = options['after_id']
+        while True:
+            batch = list(marks.filter(id__gt=last_id).select_related('lesson_grade_column')[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                batch_moved, batch_skipped = self.move_batch(batch, grade_types, options['delete_source'])
+            moved += batch_moved
+            skipped += batch_skipped
+            last_id = batch[-1].id
+            self.stdout.write(f'  до id {last_id}: перенесено {batch_moved}, уже были {batch_skipped}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено оценок: {moved}, пропущено (ячейка уже заполнена в основной схеме): {skipped}'
+        ))
+
+    def map_grade_types(self):
+        """Каждому GradeColumn - тип оценки GradeType с тем же названием (создается при отсутствии)"""
+        existing = {grade_type.title: grade_type for grade_type in GradeType.objects.all()}
+        mapping = {}
+        for column in GradeColumn.objects.all():
+            grade_type = existing.get(column.title)
+            if grade_type is None:
+                grade_type = existing[column.title] = GradeType.objects.create(
+                    title=column.title,
+                    short_title=column.short_title,
+                    description=column.description,
+                    weight=column.weight,
+                    order=column.order,
+                )
+            mapping[column.id] = grade_type
+        return mapping
+
+    def map_lesson_columns(self, legacy_columns, grade_types):
+        """Столбцы уроков основной схемы для столбцов устаревшей: {id LessonGradeColumn: LessonColumn}"""
+        LessonColumn.objects.bulk_create([
+            LessonColumn(
+                lesson_id=column.lesson_id,
+                grade_type=grade_types[column.grade_column_id],
+                title=grade_types[column.grade_column_id].title,
+                order=column.order,
+            )
+            for column in legacy_columns
+        ], ignore_conflicts=True)
+
+        columns = {
+            (column.lesson_id, column.grade_type_id): column
+            for column in LessonColumn.objects.filter(
+                lesson_id__in={column.lesson_id for column in legacy_columns},
+                grade_type__in={grade_types[column.grade_column_id] for column in legacy_columns},
+            ).select_related('lesson', 'grade_type')
+        }
+        return {
+            column.id: columns[(column.lesson_id, grade_types[column.grade_column_id].id)]
+            for column in legacy_columns
+        }
+
+    def move_batch(self, batch, grade_types, delete_source):
+        legacy_columns = {mark.lesson_grade_column_id: mark.lesson_grade_column for mark in batch}
+        columns = self.map_lesson_columns(list(legacy_columns.values()), grade_types)
+
+        # Ячейки, уже заполненные в основной схеме, не перезаписываются
+        occupied = set(StudentGrade.objects.filter(
+            student_id__in={mark.student_id for mark in batch},
+            lesson_column__in={column.id for column in columns.values()},
+        ).values_list('student_id', 'lesson_column_id'))
+
+        grades = []
+        for mark in batch:
+            column = columns[mark.lesson_grade_column_id]
+            if (mark.student_id, column.id) in occupied:
+                continue
+            occupied.add((mark.student_id, column.id))
+            grades.append(StudentGrade(
+                student_id=mark.student_id,
+                lesson_column=column,
+                value=mark.value,
+                comment=mark.comment,
+                teacher_id=mark.teacher_id,
+                created_at=mark.created_at,
+                updated_at=mark.updated_at,
+            ).fill_denormalized(column))
+
+        with preserve_timestamps(StudentGrade):
+            StudentGrade.objects.bulk_create(grades, ignore_conflicts=True)
+
+        recalculate_quarterly_grades(
+            (grade.student_id, grade.subject_id, grade.quarter_id) for grade in grades
+        )
+        if delete_source:
+            StudentMark.objects.filter(id__in=[mark.id for mark in batch]).delete()
+        return len(grades), len(batch) - len(grades)
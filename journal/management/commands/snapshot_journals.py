@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from journal.snapshots import stale_grids, take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Снимки сеток журнала для восстановления журнала на прошлую дату. Снимаются сетки '
+        'с оценками без снимков и сетки, изменившиеся после последнего снимка. Запускать по расписанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-events', type=int, default=1,
+                            help='Снимать сетку, если после последнего снимка накопилось столько изменений')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать число сеток для снимка')
+
+    def handle(self, *args, **options):
+        grids = stale_grids(min_events=max(options['min_events'], 1))
+        if options['dry_run']:
+            self.stdout.write(f'Сеток для снимка: {len(grids)}')
+            return
+
+        count = take_snapshots(grids)
+        self.stdout.write(self.style.SUCCESS(f'Снимков создано: {count}'))
@@ -0,0 +1,110 @@
+import datetime
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+
+from journal.models import GradeType, LessonColumn, StudentGrade
+from journal.views import update_student_grade
+from school_structure.benchmark import build_demo_school, drop_demo_school
+from school_structure.models import Quarter
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест одновременного выставления оценок через update_student_grade. '
+        'Данные создаются с фиксацией и удаляются после теста'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=50, help='Одновременных писателей')
+        parser.add_argument('--writes', type=int, default=20, help='Оценок на писателя')
+        parser.add_argument('--columns', type=int, default=5, help='Столбцов оценок в тестовом классе')
+
+    def handle(self, *args, **options):
+        school = build_demo_school(teachers=5, classes_per_year=1, students_per_class=25,
+                                   with_lessons=True, lesson_weeks=2)
+        # Четверти синтетической школы давно закончились - открываем первую для записи
+        Quarter.objects.filter(id=school['quarters'][0].id).update(end_date=datetime.date(2100, 1, 1))
+        grade_type = GradeType.objects.create(title='Нагрузочный тест', short_title='НТ')
+        try:
+            lesson = school['lessons'][0]
+            lessons = [
+                other for other in school['lessons']
+                if other.teacher_id == lesson.teacher_id and other.class_group_id == lesson.class_group_id
+            ][:options['columns']]
+            columns = LessonColumn.objects.bulk_create([
+                LessonColumn(lesson=other, grade_type=grade_type, title=grade_type.title)
+                for other in lessons
+            ])
+            students = [s for s in school['students'] if s.class_group_id == lesson.class_group_id]
+            cells = [(student.id, column.id) for student in students for column in columns]
+
+            result = self.run(lesson.teacher.user, cells, options['writers'], options['writes'])
+            stored = StudentGrade.objects.filter(lesson_column__in=columns).count()
+        finally:
+            drop_demo_school(school)
+            grade_type.delete()
+
+        errors = result['errors']
+        self.stdout.write(
+            f"{options['writers']} писателей, {result['writes']} записей за {result['seconds']:.2f} с "
+            f"({result['writes'] / result['seconds']:.0f} записей/с), "
+            f"задержка p95 {result['p95'] * 1000:.1f} мс, ячеек в БД {stored}"
+        )
+        if errors:
+            for error in sorted(set(errors))[:10]:
+                self.stderr.write(f'  {error}')
+            raise CommandError(f'Ошибок записи: {len(errors)}')
+        self.stdout.write(self.style.SUCCESS('Ошибок блокировки нет'))
+
+    def run(self, user, cells, writers, writes):
+        factory = RequestFactory()
+        errors = []
+        latencies = []
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(writers)
+
+        def writer(seed):
+            rng = random.Random(seed)
+            try:
+                start_barrier.wait()
+                for _ in range(writes):
+                    student_id, column_id = rng.choice(cells)
+                    request = factory.post(
+                        '/journal/ajax/update_student_grade/',
+                        data=json.dumps({
+                            'student_id': student_id,
+                            'lesson_column_id': column_id,
+                            'value': rng.choice([2, 3, 4, 5, None]),
+                        }),
+                        content_type='application/json'
+                    )
+                    request.user = user
+                    started = time.perf_counter()
+                    response = json.loads(update_student_grade(request).content)
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        if not response['success']:
+                            errors.append(response['error'])
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=writers) as executor:
+            list(executor.map(writer, range(writers)))
+        seconds = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'writes': len(latencies),
+            'seconds': seconds,
+            'p95': latencies[max(0, int(len(latencies) * 0.95) - 1)] if latencies else 0,
+            'errors': errors,
+        }
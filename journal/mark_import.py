@@ -0,0 +1,193 @@
+# journal/mark_import.py
+"""
+Массовый импорт оценок из CSV/XLSX (результаты контрольных, внешние системы тестирования).
+
+Импорт выполняется в рамках журнала учителя (класс, предмет, при необходимости четверть).
+Ученики и столбцы уроков загружаются заранее в словари поиска, все строки проверяются
+в памяти; если ошибок нет, оценки записываются одним upsert через sync.write_cells,
+а четвертные оценки пересчитываются один раз на ученика.
+"""
+import datetime
+
+from django.utils import timezone
+
+from users.models import StudentProfile
+from .models import LessonColumn
+from .sync import write_cells, _parse_value
+
+# Русские заголовки колонок файла
+COLUMN_ALIASES = {
+    'ученик': 'student',
+    'фио': 'student',
+    'id ученика': 'student_id',
+    'почта': 'email',
+    'id столбца': 'lesson_column_id',
+    'дата': 'date',
+    'урок': 'lesson_number',
+    'номер урока': 'lesson_number',
+    'столбец': 'column',
+    'тип оценки': 'column',
+    'оценка': 'value',
+    'комментарий': 'comment',
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d.%m.%y')
+
+# Значение словаря поиска, найденное у нескольких объектов
+AMBIGUOUS = object()
+
+
+def _parse_date(value):
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _add_lookup(lookup, key, value):
+    if lookup.get(key, value) != value:
+        value = AMBIGUOUS
+    lookup[key] = value
+
+
+class MarkImport:
+    """
+    Импорт одного файла оценок. Использование:
+        result = MarkImport(teacher, class_group, subject, quarter).run(rows)
+    rows - словари строк (main.tabular.iter_table_rows с COLUMN_ALIASES).
+    Ученик ищется по id, email или ФИО; столбец - по id или по дате урока
+    (и номеру урока, если в этот день их несколько) и названию типа оценки.
+    """
+
+    def __init__(self, teacher, class_group, subject, quarter=None, dry_run=False):
+        self.teacher = teacher
+        self.dry_run = dry_run
+
+        self.students = {}
+        for student_id, email, last_name, first_name, patronymic in StudentProfile.objects.filter(
+            class_group=class_group
+        ).values_list('id', 'user__email', 'user__last_name', 'user__first_name', 'user__patronymic'):
+            _add_lookup(self.students, str(student_id), student_id)
+            _add_lookup(self.students, email.lower(), student_id)
+            _add_lookup(self.students, f'{last_name} {first_name}'.lower(), student_id)
+            if patronymic:
+                _add_lookup(self.students, f'{last_name} {first_name} {patronymic}'.lower(), student_id)
+
+        columns = LessonColumn.objects.filter(
+            lesson__teacher=teacher,
+            lesson__class_group=class_group,
+            lesson__subject=subject,
+        ).select_related('lesson__quarter', 'grade_type')
+        if quarter is not None:
+            columns = columns.filter(lesson__quarter=quarter)
+
+        self.columns = {}
+        # (дата, название) и (дата, номер урока, название) -> столбец
+        self.column_lookup = {}
+        for column in columns:
+            self.columns[column.id] = column
+            lesson = column.lesson
+            for name in {column.title, column.grade_type.title, column.grade_type.short_title}:
+                name = name.lower()
+                _add_lookup(self.column_lookup, (lesson.date, name), column.id)
+                _add_lookup(self.column_lookup, (lesson.date, lesson.lesson_number, name), column.id)
+
+        self.result = {
+            'rows': 0,
+            'imported': 0,
+            'skipped': 0,
+            'students': 0,
+            'errors': [],
+        }
+
+    def run(self, rows):
+        today = timezone.now().date()
+        cells = {}
+        lines = {}
+        for row in rows:
+            self.result['rows'] += 1
+            cell = self.validate(row, today)
+            if cell is None:
+                continue
+            key, value, comment = cell
+            if key in lines:
+                self.error(row, f'Оценка за эту ячейку уже указана в строке {lines[key]}')
+                continue
+            lines[key] = row.get('_line')
+            cells[key] = [('', value, comment)]
+
+        # Файл применяется целиком: при любой ошибке ничего не записывается
+        if not self.result['errors']:
+            if not self.dry_run:
+                write_cells(self.teacher, cells, self.columns)
+            self.result['imported'] = len(cells)
+            self.result['students'] = len({student_id for student_id, _ in cells})
+        return self.result
+
+    def error(self, row, message):
+        self.result['errors'].append((row.get('_line'), message))
+
+    def find_student(self, row):
+        for field in ('student_id', 'email', 'student'):
+            key = ' '.join(row.get(field, '').lower().split())
+            if key:
+                return self.students.get(key), row[field]
+        return None, '(не указан)'
+
+    def find_column(self, row):
+        if row.get('lesson_column_id'):
+            try:
+                return self.columns.get(int(row['lesson_column_id'])), row['lesson_column_id']
+            except ValueError:
+                return None, row['lesson_column_id']
+
+        date = _parse_date(row.get('date', ''))
+        name = row.get('column', '').lower()
+        if date is None or not name:
+            return None, 'нужны id столбца или дата урока и тип оценки'
+        key = (date, name)
+        if row.get('lesson_number'):
+            try:
+                key = (date, int(row['lesson_number']), name)
+            except ValueError:
+                return None, f"некорректный номер урока {row['lesson_number']}"
+        column_id = self.column_lookup.get(key)
+        label = f"{row['date']} {row['column']}"
+        if column_id is None or column_id is AMBIGUOUS:
+            return column_id, label
+        return self.columns[column_id], label
+
+    def validate(self, row, today):
+        """((student_id, column_id), оценка, комментарий) или None (пропуск или ошибка)"""
+        try:
+            value = _parse_value(row.get('value'))
+        except ValueError as e:
+            self.error(row, str(e))
+            return None
+        if value is None:
+            # Пустая ячейка - ученик не писал работу
+            self.result['skipped'] += 1
+            return None
+
+        student_id, student_label = self.find_student(row)
+        if student_id is AMBIGUOUS:
+            self.error(row, f'Несколько учеников класса подходят под «{student_label}», укажите email или id')
+            return None
+        if student_id is None:
+            self.error(row, f'Ученик «{student_label}» не найден в классе')
+            return None
+
+        column, column_label = self.find_column(row)
+        if column is AMBIGUOUS:
+            self.error(row, f'Столбец «{column_label}» определен неоднозначно, укажите номер урока или id столбца')
+            return None
+        if column is None:
+            self.error(row, f'Столбец не найден в журнале: {column_label}')
+            return None
+        if column.lesson.quarter.end_date < today:
+            self.error(row, 'Четверть завершена, редактирование невозможно')
+            return None
+
+        return (student_id, column.id), value, row.get('comment', '')
@@ -8,6 +8,18 @@ from users.models import StudentProfile
 from school_structure.models import Lesson, AcademicYear, Subject, Quarter
 
 
+# Поля урока и веса, продублированные в строках оценок (StudentMark, StudentGrade)
+DENORMALIZED_MARK_FIELDS = ('subject', 'quarter', 'class_group', 'weight')
+
+
+def unfilled_denormalized_q():
+    """Строки оценок, в которых не заполнено хотя бы одно денормализованное поле"""
+    condition = models.Q()
+    for field in DENORMALIZED_MARK_FIELDS:
+        condition |= models.Q(**{f'{field}__isnull': True})
+    return condition
+
+
 class Attendance(models.Model):
     class Status(models.TextChoices):
         PRESENT = 'PRESENT', 'Присутствовал'
@@ -34,14 +46,52 @@ class Attendance(models.Model):
         verbose_name='Статус'
     )
     note = models.TextField(blank=True, verbose_name='Примечание')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Посещаемость'
         verbose_name_plural = 'Посещаемость'
         unique_together = ['student', 'lesson']
         indexes = [
-            models.Index(fields=['student', 'lesson']),  # Уже есть unique_together, но индекс тоже создастся
             models.Index(fields=['lesson', 'status']),  # Для быстрого подсчета отсутствующих на уроке
+            models.Index(fields=['updated_at', 'id']),  # Для инкрементальной синхронизации (API)
+        ]
+
+    def __str__(self):
+        return f'{self.student} - {self.lesson}: {self.get_status_display()}'
+
+
+class ArchivedAttendance(models.Model):
+    """Отметка посещаемости закрытого учебного года, перенесенная из Attendance командой archive_year"""
+    id = models.BigIntegerField(primary_key=True)
+    academic_year = models.ForeignKey(
+        AcademicYear,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Учебный год'
+    )
+    student = models.ForeignKey(
+        StudentProfile,
+        on_delete=models.CASCADE,
+        related_name='archived_attendances',
+        verbose_name='Ученик'
+    )
+    lesson = models.ForeignKey(
+        Lesson,
+        on_delete=models.PROTECT,
+        related_name='archived_attendances',
+        verbose_name='Урок'
+    )
+    status = models.CharField(max_length=10, choices=Attendance.Status, verbose_name='Статус')
+    note = models.TextField(blank=True, verbose_name='Примечание')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+
+    class Meta:
+        verbose_name = 'Архивная посещаемость'
+        verbose_name_plural = 'Архивная посещаемость'
+        indexes = [
+            models.Index(fields=['student', 'lesson'], name='archattendance_student_lesson'),
+            models.Index(fields=['academic_year', 'id'], name='archattendance_year_id'),
         ]
 
     def __str__(self):
@@ -64,6 +114,7 @@ class Homework(models.Model):
     )
     deadline = models.DateTimeField(verbose_name='Срок выполнения')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Домашнее задание'
@@ -111,7 +162,10 @@ class GradeType(models.Model):
 
 
 class GradeColumn(models.Model):
-    """Тип оценки (столбец в журнале) - например: Устный ответ, Домашняя работа и т.д."""
+    """
+    Тип оценки (столбец в журнале) - например: Устный ответ, Домашняя работа и т.д.
+    Устаревшая схема: переносится в GradeType командой migrate_student_marks.
+    """
     title = models.CharField(max_length=100, verbose_name='Название столбца')
     short_title = models.CharField(max_length=20, verbose_name='Короткое название')
     description = models.TextField(blank=True, verbose_name='Описание')
@@ -133,7 +187,10 @@ class GradeColumn(models.Model):
 
 
 class LessonGradeColumn(models.Model):
-    """Связь урока с типом оценки (какие столбцы есть в этом уроке)"""
+    """
+    Связь урока с типом оценки (какие столбцы есть в этом уроке).
+    Устаревшая схема: переносится в LessonColumn командой migrate_student_marks.
+    """
     lesson = models.ForeignKey(
         Lesson,
         on_delete=models.CASCADE,
@@ -162,7 +219,11 @@ class LessonGradeColumn(models.Model):
 
 
 class StudentMark(models.Model):
-    """Оценка ученика в конкретном столбце урока"""
+    """
+    Оценка ученика в конкретном столбце урока.
+    Устаревшая схема: основное хранилище оценок - StudentGrade, строки переносятся
+    командой migrate_student_marks. Новые оценки сюда не записываются.
+    """
     student = models.ForeignKey(
         StudentProfile,
         on_delete=models.CASCADE,
@@ -188,6 +249,30 @@ class StudentMark(models.Model):
         null=True,
         verbose_name='Учитель'
     )
+    # Денормализованные поля урока и веса (заполняются в save/fill_denormalized),
+    # чтобы агрегаты по предмету и четверти считались по одной таблице
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Предмет'
+    )
+    quarter = models.ForeignKey(
+        Quarter,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Четверть'
+    )
+    class_group = models.ForeignKey(
+        'school_structure.ClassGroup',
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Класс'
+    )
+    weight = models.FloatField(null=True, verbose_name='Вес (на момент выставления)')
 
     class Meta:
         verbose_name = 'Оценка ученика'
@@ -196,6 +281,12 @@ class StudentMark(models.Model):
         ordering = ['created_at']
         indexes = [
             models.Index(fields=['student', 'created_at']),
+            models.Index(fields=['updated_at', 'id']),
+            # Последние оценки учителя (дашборды, TeacherGradesView)
+            models.Index(fields=['teacher', '-created_at'], name='studentmark_teacher_created'),
+            # Средние ученика по предмету за четверть и сводки класса
+            models.Index(fields=['student', 'subject', 'quarter'], name='studentmark_student_subj_q'),
+            models.Index(fields=['class_group', 'subject', 'quarter'], name='studentmark_class_subj_q'),
         ]
 
     def __str__(self):
@@ -209,9 +300,24 @@ class StudentMark(models.Model):
     def grade_column(self):
         return self.lesson_grade_column.grade_column
 
-    @property
-    def weight(self):
-        return self.grade_column.weight
+    def save(self, *args, **kwargs):
+        self.fill_denormalized()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *DENORMALIZED_MARK_FIELDS}
+        super().save(*args, **kwargs)
+
+    def fill_denormalized(self, lesson_grade_column=None):
+        """
+        Скопировать предмет, четверть, класс и вес столбца в строку оценки.
+        Для массовых операций передайте столбец с загруженными lesson и grade_column.
+        """
+        column = lesson_grade_column or self.lesson_grade_column
+        self.subject_id = column.lesson.subject_id
+        self.quarter_id = column.lesson.quarter_id
+        self.class_group_id = column.lesson.class_group_id
+        self.weight = column.grade_column.weight
+        return self
 
 
 class LessonColumn(models.Model):
@@ -250,7 +356,7 @@ class LessonColumn(models.Model):
 
 
 class StudentGrade(models.Model):
-    """Оценка ученика в столбце урока"""
+    """Оценка ученика в столбце урока (основное хранилище оценок)"""
     student = models.ForeignKey(
         StudentProfile,
         on_delete=models.CASCADE,
@@ -276,6 +382,30 @@ class StudentGrade(models.Model):
         null=True,
         verbose_name='Учитель'
     )
+    # Денормализованные поля урока и веса (заполняются в save/fill_denormalized),
+    # чтобы агрегаты по предмету и четверти считались по одной таблице
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Предмет'
+    )
+    quarter = models.ForeignKey(
+        Quarter,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Четверть'
+    )
+    class_group = models.ForeignKey(
+        'school_structure.ClassGroup',
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Класс'
+    )
+    weight = models.FloatField(null=True, verbose_name='Вес (на момент выставления)')
 
     class Meta:
         verbose_name = 'Оценка ученика'
@@ -283,13 +413,26 @@ class StudentGrade(models.Model):
         unique_together = ['student', 'lesson_column']
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['student', 'lesson_column']),
             models.Index(fields=['lesson_column', 'student']),
+            models.Index(fields=['updated_at', 'id']),
+            # Последние оценки учителя (дашборды, TeacherGradesView)
+            models.Index(fields=['teacher', '-created_at'], name='studentgrade_teacher_created'),
+            # Расчет четвертной оценки и средние по журналу класса
+            models.Index(fields=['student', 'subject', 'quarter'], name='studentgrade_student_subj_q'),
+            models.Index(fields=['class_group', 'subject', 'quarter'], name='studentgrade_class_subj_q'),
         ]
 
     def __str__(self):
         return f'{self.student} - {self.value}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Оценка на момент загрузки: старое значение для журнала изменений (MarkChangeLog)
+        if 'value' in field_names:
+            instance._loaded_value = instance.value
+        return instance
+
     @property
     def lesson(self):
         return self.lesson_column.lesson
@@ -299,8 +442,266 @@ class StudentGrade(models.Model):
         return self.lesson_column.grade_type
 
     @property
-    def weight(self):
-        return self.grade_type.weight
+    def effective_weight(self):
+        """Вес оценки; для строки с незаполненным весом - вес типа оценки столбца"""
+        return self.weight if self.weight is not None else self.grade_type.weight
+
+    def save(self, *args, **kwargs):
+        self.fill_denormalized()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *DENORMALIZED_MARK_FIELDS}
+        super().save(*args, **kwargs)
+
+    def fill_denormalized(self, lesson_column=None):
+        """
+        Скопировать предмет, четверть, класс и вес типа оценки в строку оценки.
+        Для массовых операций передайте столбец с загруженными lesson и grade_type.
+        """
+        column = lesson_column or self.lesson_column
+        self.subject_id = column.lesson.subject_id
+        self.quarter_id = column.lesson.quarter_id
+        self.class_group_id = column.lesson.class_group_id
+        self.weight = column.grade_type.weight
+        return self
+
+
+class ArchivedStudentGrade(models.Model):
+    """
+    Оценка закрытого учебного года, перенесенная из StudentGrade командой archive_year.
+    id и поля совпадают с исходной строкой; чтение по четверти - journal.archive.grade_queryset.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    academic_year = models.ForeignKey(
+        AcademicYear,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Учебный год'
+    )
+    student = models.ForeignKey(
+        StudentProfile,
+        on_delete=models.CASCADE,
+        related_name='archived_grades',
+        verbose_name='Ученик'
+    )
+    lesson_column = models.ForeignKey(
+        LessonColumn,
+        on_delete=models.CASCADE,
+        related_name='archived_grades',
+        verbose_name='Столбец урока'
+    )
+    value = models.PositiveIntegerField(verbose_name='Оценка')
+    comment = models.TextField(blank=True, verbose_name='Комментарий')
+    created_at = models.DateTimeField(verbose_name='Дата выставления')
+    updated_at = models.DateTimeField(verbose_name='Дата обновления')
+    teacher = models.ForeignKey(
+        'users.TeacherProfile',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+        verbose_name='Учитель'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, null=True, related_name='+', verbose_name='Предмет')
+    quarter = models.ForeignKey(Quarter, on_delete=models.CASCADE, null=True, related_name='+', verbose_name='Четверть')
+    class_group = models.ForeignKey(
+        'school_structure.ClassGroup',
+        on_delete=models.CASCADE,
+        null=True,
+        related_name='+',
+        verbose_name='Класс'
+    )
+    weight = models.FloatField(null=True, verbose_name='Вес (на момент выставления)')
+
+    class Meta:
+        verbose_name = 'Архивная оценка'
+        verbose_name_plural = 'Архивные оценки'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['student', 'subject', 'quarter'], name='archgrade_student_subj_q'),
+            models.Index(fields=['class_group', 'subject', 'quarter'], name='archgrade_class_subj_q'),
+            models.Index(fields=['academic_year', 'id'], name='archgrade_year_id'),
+        ]
+
+    def __str__(self):
+        return f'{self.student} - {self.value}'
+
+    @property
+    def lesson(self):
+        return self.lesson_column.lesson
+
+    @property
+    def grade_type(self):
+        return self.lesson_column.grade_type
+
+    @property
+    def effective_weight(self):
+        """Вес оценки; для строки с незаполненным весом - вес типа оценки столбца"""
+        return self.weight if self.weight is not None else self.grade_type.weight
+
+
+class GradeSyncLog(models.Model):
+    """
+    Журнал изменений оценок для синхронизации клиентов учителя.
+    Версия сервера - id записи журнала; value=None означает удаление оценки.
+    client_id - идентификатор изменения на клиенте, повторно присланные изменения пропускаются.
+    """
+    teacher = models.ForeignKey(
+        'users.TeacherProfile',
+        on_delete=models.CASCADE,
+        related_name='grade_sync_log',
+        verbose_name='Учитель'
+    )
+    client_id = models.CharField(max_length=64, blank=True, verbose_name='ID изменения на клиенте')
+    student = models.ForeignKey(
+        StudentProfile,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ученик'
+    )
+    lesson_column = models.ForeignKey(
+        'LessonColumn',
+        on_delete=models.CASCADE,
+        related_name='sync_log',
+        verbose_name='Столбец урока'
+    )
+    value = models.PositiveIntegerField(null=True, blank=True, verbose_name='Оценка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Изменение оценки (синхронизация)'
+        verbose_name_plural = 'Изменения оценок (синхронизация)'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['teacher', 'client_id'],
+                condition=~models.Q(client_id=''),
+                name='unique_grade_sync_client_id'
+            ),
+        ]
+        indexes = [
+            # Повторная выдача окна перед версией клиента (journal.sync.SYNC_RESCAN_SECONDS)
+            models.Index(fields=['created_at'], name='gradesynclog_created'),
+        ]
+
+    def __str__(self):
+        return f'#{self.id} {self.student_id}/{self.lesson_column_id}: {self.value}'
+
+
+class MarkChangeLog(models.Model):
+    """
+    Журнал изменений оценок для разбора спорных ситуаций: только добавление записей.
+    Записи копятся в памяти процесса и пишутся пачками (journal.audit), поэтому внешние ключи
+    без ограничений в БД: ученик, учитель или класс могут быть удалены раньше, чем пачка записана.
+    old_value=None - оценка выставлена, new_value=None - оценка удалена.
+    """
+    student = models.ForeignKey(
+        StudentProfile,
+        on_delete=models.CASCADE,
+        db_constraint=False,
+        related_name='mark_changes',
+        verbose_name='Ученик'
+    )
+    # После удаления столбца id остается в истории: восстановленные на прошлую дату
+    # сетки (journal.snapshots) сохраняют ячейки
+    lesson_column = models.ForeignKey(
+        'LessonColumn',
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Столбец урока'
+    )
+    # Сетка журнала (класс, предмет, четверть) - для восстановления журнала на дату
+    class_group = models.ForeignKey(
+        'school_structure.ClassGroup',
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Класс'
+    )
+    subject = models.ForeignKey(
+        Subject,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Предмет'
+    )
+    quarter = models.ForeignKey(
+        Quarter,
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Четверть'
+    )
+    old_value = models.PositiveIntegerField(null=True, blank=True, verbose_name='Было')
+    new_value = models.PositiveIntegerField(null=True, blank=True, verbose_name='Стало')
+    teacher = models.ForeignKey(
+        'users.TeacherProfile',
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Учитель'
+    )
+    changed_by = models.ForeignKey(
+        'users.CustomUser',
+        on_delete=models.SET_NULL,
+        db_constraint=False,
+        null=True,
+        related_name='+',
+        verbose_name='Кто изменил'
+    )
+    source = models.CharField(max_length=100, verbose_name='Источник',
+                              help_text='Эндпоинт или команда, через которые изменена оценка')
+    # Момент изменения, а не записи пачки в БД
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='Дата изменения')
+
+    class Meta:
+        verbose_name = 'Изменение оценки'
+        verbose_name_plural = 'История изменений оценок'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # История ученика в обратном хронологическом порядке
+            models.Index(fields=['student', '-created_at', '-id'], name='markchange_student_created'),
+            # События сетки журнала после снимка
+            models.Index(fields=['class_group', 'subject', 'quarter', 'created_at'], name='markchange_grid_created'),
+        ]
+
+    def __str__(self):
+        return f'{self.student_id}: {self.old_value} -> {self.new_value} ({self.source})'
+
+
+class JournalSnapshot(models.Model):
+    """
+    Снимок сетки журнала (класс, предмет, четверть) на момент taken_at.
+    Журнал на прошлую дату восстанавливается от ближайшего снимка и событий MarkChangeLog
+    после него (journal.snapshots), поэтому стоимость зависит от числа событий после снимка,
+    а не от всей истории. Снимки создает команда snapshot_journals.
+    """
+    class_group = models.ForeignKey(
+        'school_structure.ClassGroup',
+        on_delete=models.CASCADE,
+        related_name='journal_snapshots',
+        verbose_name='Класс'
+    )
+    subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='+', verbose_name='Предмет')
+    quarter = models.ForeignKey(Quarter, on_delete=models.CASCADE, related_name='+', verbose_name='Четверть')
+    taken_at = models.DateTimeField(verbose_name='Момент снимка')
+    # {"<student_id>:<lesson_column_id>": оценка}
+    cells = models.JSONField(default=dict, verbose_name='Оценки')
+
+    class Meta:
+        verbose_name = 'Снимок журнала'
+        verbose_name_plural = 'Снимки журнала'
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['class_group', 'subject', 'quarter', 'taken_at'], name='journalsnapshot_grid_taken'),
+        ]
+
+    def __str__(self):
+        return f'{self.class_group_id}/{self.subject_id}/{self.quarter_id} @ {self.taken_at}'
 
 
 # Обновляем модели четвертных и годовых оценок
@@ -352,6 +753,7 @@ class QuarterlyGrade(models.Model):
     )
     finalized_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата утверждения')
     comment = models.TextField(blank=True, verbose_name='Комментарий')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Четвертная оценка'
@@ -364,12 +766,13 @@ class QuarterlyGrade(models.Model):
     def calculate_grade(self):
         """Рассчитывает четвертную оценку на основе всех оценок за четверть"""
         from django.db.models import Avg, Sum, Count
+        from .archive import grade_queryset
 
-        # Получаем все оценки студента по этому предмету в этой четверти
-        grades = StudentGrade.objects.filter(
-            student=self.student,
-            lesson_column__lesson__subject=self.subject,
-            lesson_column__lesson__quarter=self.quarter
+        # Получаем все оценки студента по этому предмету в этой четверти (для архивного года - из архива)
+        grades = grade_queryset(self.quarter_id).filter(
+            student_id=self.student_id,
+            subject_id=self.subject_id,
+            quarter_id=self.quarter_id
         ).select_related('lesson_column__grade_type')
 
         if not grades.exists():
@@ -383,7 +786,7 @@ class QuarterlyGrade(models.Model):
         grades_by_type = {}
 
         for grade in grades:
-            weight = grade.weight
+            weight = grade.effective_weight
             total_weighted += grade.value * weight
             total_weight += weight
 
@@ -484,6 +887,7 @@ class YearlyGrade(models.Model):
     )
     finalized_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата утверждения')
     comment = models.TextField(blank=True, verbose_name='Комментарий')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
 
     class Meta:
         verbose_name = 'Годовая оценка'
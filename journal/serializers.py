@@ -0,0 +1,80 @@
+# journal/serializers.py
+from rest_framework import serializers
+from .models import (
+    StudentGrade, Attendance, Homework, QuarterlyGrade, YearlyGrade, MarkChangeLog
+)
+
+
+class SparseFieldsSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор с разреженным набором полей: fields=['id', 'value', ...].
+    Поля - колонки модели, поэтому набор полей переводится в .only()
+    (переименованные поля - через field_sources представления).
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class StudentMarkSerializer(SparseFieldsSerializer):
+    """
+    Совместимость с эндпоинтом marks/ на время перехода: оценки основной схемы (StudentGrade)
+    в полях устаревшей StudentMark. lesson_grade_column - id столбца LessonColumn.
+    """
+    lesson_grade_column = serializers.PrimaryKeyRelatedField(source='lesson_column', read_only=True)
+
+    class Meta:
+        model = StudentGrade
+        fields = ['id', 'student', 'lesson_grade_column', 'value', 'comment',
+                  'teacher', 'created_at', 'updated_at']
+
+
+class StudentGradeSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = StudentGrade
+        fields = ['id', 'student', 'lesson_column', 'value', 'comment',
+                  'teacher', 'created_at', 'updated_at']
+
+
+class AttendanceSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = Attendance
+        fields = ['id', 'student', 'lesson', 'status', 'note', 'updated_at']
+
+
+class HomeworkSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = Homework
+        fields = ['id', 'lesson', 'content', 'attachments', 'deadline', 'created_at', 'updated_at']
+
+
+class QuarterlyGradeSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = QuarterlyGrade
+        fields = ['id', 'student', 'subject', 'quarter', 'grade', 'calculated_grade',
+                  'is_finalized', 'finalized_at', 'comment', 'updated_at']
+
+
+class YearlyGradeSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = YearlyGrade
+        fields = ['id', 'student', 'subject', 'academic_year', 'grade', 'calculated_grade',
+                  'calculation_method', 'is_finalized', 'finalized_at', 'comment', 'updated_at']
+
+
+class MarkChangeLogSerializer(SparseFieldsSerializer):
+    class Meta:
+        model = MarkChangeLog
+        fields = ['id', 'student', 'lesson_column', 'class_group', 'subject', 'quarter', 'old_value', 'new_value',
+                  'teacher', 'changed_by', 'source', 'created_at']
+
+
+class DeletedGradeSerializer(SparseFieldsSerializer):
+    """Удаленная оценка: ячейка (ученик, столбец) и момент удаления"""
+    class Meta:
+        model = MarkChangeLog
+        fields = ['id', 'student', 'lesson_column', 'created_at']
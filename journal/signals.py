@@ -0,0 +1,61 @@
+# journal/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from school_structure.models import Lesson
+from .audit import mark_change, record_mark_changes
+from .events import publish
+from .models import StudentGrade
+
+
+def grade_event(grade_id, student_id, lesson_column_id, value):
+    """Компактное событие изменения ячейки сетки StudentGrade (value=None - оценка удалена)"""
+    return {
+        'type': 'grade',
+        'id': grade_id,
+        'student_id': student_id,
+        'lesson_column_id': lesson_column_id,
+        'value': value,
+        'deleted': value is None,
+    }
+
+
+def publish_on_commit(lesson_key, event):
+    """Отправить событие после фиксации транзакции, чтобы клиенты не увидели откаченных оценок"""
+    class_id, subject_id, quarter_id = lesson_key
+    transaction.on_commit(lambda: publish(class_id, subject_id, quarter_id, event))
+
+
+def _lesson_key(**lookup):
+    return Lesson.objects.filter(**lookup).values_list(
+        'class_group_id', 'subject_id', 'quarter_id'
+    ).first()
+
+
+@receiver(post_save, sender=StudentGrade)
+@receiver(post_delete, sender=StudentGrade)
+def student_grade_changed(sender, instance, **kwargs):
+    # Сетка берется из денормализованных полей; запрос к уроку - только для незаполненных строк
+    lesson_key = (instance.class_group_id, instance.subject_id, instance.quarter_id)
+    if None in lesson_key:
+        lesson_key = _lesson_key(columns__id=instance.lesson_column_id)
+    if lesson_key is None:
+        return
+    deleted = kwargs.get('signal') is post_delete
+    publish_on_commit(lesson_key, grade_event(
+        instance.id, instance.student_id, instance.lesson_column_id,
+        None if deleted else instance.value
+    ))
+
+
+@receiver(post_save, sender=StudentGrade)
+def log_grade_saved(sender, instance, created, **kwargs):
+    old_value = None if created else getattr(instance, '_loaded_value', None)
+    record_mark_changes([mark_change(instance, old_value, instance.value)])
+    instance._loaded_value = instance.value
+
+
+@receiver(post_delete, sender=StudentGrade)
+def log_grade_deleted(sender, instance, **kwargs):
+    record_mark_changes([mark_change(instance, instance.value, None)])
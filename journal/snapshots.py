@@ -0,0 +1,205 @@
+# journal/snapshots.py
+"""
+Журнал на прошлую дату: сетка (класс, предмет, четверть) восстанавливается от ближайшего
+по времени снимка (JournalSnapshot) и событий журнала изменений (MarkChangeLog) между
+снимком и нужным моментом. Стоимость восстановления ограничена числом событий после
+снимка, а не всей историей; снимки периодически создает команда snapshot_journals.
+
+Опорное состояние выбирается так:
+- снимок не позже момента - события после снимка применяются вперед (new_value);
+- снимок позже момента - события отменяются назад (old_value), так восстанавливаются и даты
+  до первого снимка (оценки, выставленные до появления журнала изменений, попадают в снимок).
+
+События пишутся в БД из буфера процесса (journal.audit) с задержкой до MARK_AUDIT_FLUSH_SECONDS,
+поэтому назад можно идти только от снимка старше этой задержки: в более свежем снимке и в текущих
+оценках уже есть изменения, событий которых еще нет, и они не были бы отменены. Текущие оценки
+служат опорой, только если подходящего снимка нет (перед этим записывается буфер своего процесса).
+При движении вперед изменения последних MARK_AUDIT_FLUSH_SECONDS видны не сразу.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .archive import grade_queryset
+from .audit import mark_change_buffer
+from .models import StudentGrade, MarkChangeLog, JournalSnapshot
+
+# Событие получает created_at до фиксации транзакции, а снимок читает только зафиксированные
+# оценки. При движении вперед события этого окна перед снимком применяются повторно:
+# повторное применение изменений по порядку дает то же состояние.
+SNAPSHOT_OVERLAP = timedelta(seconds=60)
+
+
+def settle_delay():
+    """Через сколько после изменения его событие гарантированно есть в MarkChangeLog"""
+    return SNAPSHOT_OVERLAP + timedelta(seconds=settings.MARK_AUDIT_FLUSH_SECONDS)
+
+
+def cell_key(student_id, lesson_column_id):
+    """Ключ ячейки в JournalSnapshot.cells"""
+    return f'{student_id}:{lesson_column_id}'
+
+
+def _parse_cell_key(key):
+    student_id, lesson_column_id = key.split(':')
+    return int(student_id), int(lesson_column_id)
+
+
+def _grid_filter(class_group_id, subject_id, quarter_id):
+    return {'class_group_id': class_group_id, 'subject_id': subject_id, 'quarter_id': quarter_id}
+
+
+def current_cells(class_group_id, subject_id, quarter_id):
+    """Текущие оценки сетки: {(student_id, lesson_column_id): value}"""
+    return {
+        (student_id, column_id): value
+        for student_id, column_id, value in grade_queryset(quarter_id).filter(
+            **_grid_filter(class_group_id, subject_id, quarter_id)
+        ).values_list('student_id', 'lesson_column_id', 'value')
+    }
+
+
+def _replay(cells, events, field):
+    """Применить события к ячейкам; возвращает число событий"""
+    count = 0
+    for student_id, column_id, value in events.values_list('student_id', 'lesson_column_id', field):
+        if value is None:
+            cells.pop((student_id, column_id), None)
+        else:
+            cells[(student_id, column_id)] = value
+        count += 1
+    return count
+
+
+def journal_as_of(class_group_id, subject_id, quarter_id, moment):
+    """
+    Оценки сетки на момент moment.
+    Возвращает {'cells': {(student_id, lesson_column_id): value}, 'base': 'snapshot' | 'current',
+    'base_at': время опорного состояния, 'events': число примененных событий}.
+    """
+    grid = _grid_filter(class_group_id, subject_id, quarter_id)
+    now = timezone.now()
+    moment = min(moment, now)
+    snapshots = JournalSnapshot.objects.filter(**grid).only('id', 'taken_at')
+    before = snapshots.filter(taken_at__lte=moment).order_by('-taken_at').first()
+    # Назад - только от снимка, все события до которого уже записаны из буферов
+    after = snapshots.filter(
+        taken_at__gt=moment, taken_at__lte=now - settle_delay()
+    ).order_by('taken_at').first()
+
+    # Ближайший по времени снимок: событий между ним и моментом меньше
+    candidates = [(moment - before.taken_at, before)] if before else []
+    if after:
+        candidates.append((after.taken_at - moment, after))
+    if candidates:
+        _, base = min(candidates, key=lambda candidate: candidate[0])
+    else:
+        # Снимков нет: опора - текущие оценки. Свой буфер записываем сейчас; изменения
+        # из буферов других процессов за последние MARK_AUDIT_FLUSH_SECONDS отменить нечем
+        mark_change_buffer.flush()
+        base = None
+
+    events = MarkChangeLog.objects.filter(**grid)
+    if base is None:
+        base_at = now
+        cells = current_cells(class_group_id, subject_id, quarter_id)
+    else:
+        base_at = base.taken_at
+        cells = {
+            _parse_cell_key(key): value
+            for key, value in JournalSnapshot.objects.values_list('cells', flat=True).get(id=base.id).items()
+        }
+
+    if base_at <= moment:
+        events = events.filter(
+            created_at__gt=base_at - SNAPSHOT_OVERLAP, created_at__lte=moment
+        ).order_by('created_at', 'id')
+        applied = _replay(cells, events, 'new_value')
+    else:
+        events = events.filter(
+            created_at__gt=moment, created_at__lte=base_at
+        ).order_by('-created_at', '-id')
+        applied = _replay(cells, events, 'old_value')
+
+    return {
+        'cells': cells,
+        'base': 'current' if base is None else 'snapshot',
+        'base_at': base_at,
+        'events': applied,
+    }
+
+
+def stale_grids(min_events=1):
+    """
+    Сетки, которым нужен новый снимок: с оценками, но без снимков, и сетки, где после
+    последнего снимка накопилось не меньше min_events событий.
+    """
+    last_snapshots = {
+        (row['class_group_id'], row['subject_id'], row['quarter_id']): row['last']
+        for row in JournalSnapshot.objects.values(
+            'class_group_id', 'subject_id', 'quarter_id'
+        ).annotate(last=Max('taken_at')).order_by()
+    }
+
+    grids = {
+        grid for grid in StudentGrade.objects.values_list(
+            'class_group_id', 'subject_id', 'quarter_id'
+        ).distinct().order_by()
+        if grid not in last_snapshots
+    }
+
+    events = MarkChangeLog.objects.filter(
+        class_group__isnull=False, subject__isnull=False, quarter__isnull=False
+    )
+    if last_snapshots:
+        # События до самого старого из последних снимков не просматриваются: сетки со снимками
+        # их уже свернули, а сетки без снимков и без оценок восстанавливаются от текущего состояния
+        events = events.filter(created_at__gt=min(last_snapshots.values()))
+    last_snapshot = JournalSnapshot.objects.filter(
+        class_group_id=OuterRef('class_group_id'),
+        subject_id=OuterRef('subject_id'),
+        quarter_id=OuterRef('quarter_id'),
+    ).order_by('-taken_at').values('taken_at')[:1]
+    counts = events.annotate(
+        snapshot_at=Subquery(last_snapshot)
+    ).filter(
+        Q(snapshot_at__isnull=True) | Q(created_at__gt=F('snapshot_at'))
+    ).values('class_group_id', 'subject_id', 'quarter_id').annotate(events=Count('id')).order_by()
+    grids.update(
+        (row['class_group_id'], row['subject_id'], row['quarter_id'])
+        for row in counts if row['events'] >= min_events
+    )
+    return grids
+
+
+def take_snapshots(grids):
+    """Снимки текущих оценок сеток (класс, предмет, четверть); возвращает число снимков"""
+    grids = set(grids)
+    if not grids:
+        return 0
+
+    taken_at = timezone.now()
+    cells = {grid: {} for grid in grids}
+    rows = StudentGrade.objects.filter(
+        class_group_id__in={grid[0] for grid in grids},
+        subject_id__in={grid[1] for grid in grids},
+        quarter_id__in={grid[2] for grid in grids},
+    ).values_list('class_group_id', 'subject_id', 'quarter_id', 'student_id', 'lesson_column_id', 'value')
+    for class_group_id, subject_id, quarter_id, student_id, column_id, value in rows.iterator(chunk_size=5000):
+        grid_cells = cells.get((class_group_id, subject_id, quarter_id))
+        if grid_cells is not None:
+            grid_cells[cell_key(student_id, column_id)] = value
+
+    JournalSnapshot.objects.bulk_create([
+        JournalSnapshot(
+            class_group_id=class_group_id,
+            subject_id=subject_id,
+            quarter_id=quarter_id,
+            taken_at=taken_at,
+            cells=grid_cells,
+        )
+        for (class_group_id, subject_id, quarter_id), grid_cells in cells.items()
+    ], batch_size=500)
+    return len(cells)
@@ -0,0 +1,284 @@
+# journal/sync.py
+"""
+Синхронизация журнала с офлайн-клиентами учителя.
+
+Клиент присылает пакет изменений с client_id и последнюю известную версию сервера.
+Сервер применяет изменения идемпотентно (повторно присланные client_id пропускаются),
+разрешает конфликты по уникальности (student, lesson_column) - побеждает последняя запись -
+и возвращает ячейки, изменившиеся после присланной версии (с коротким окном перед ней,
+см. SYNC_RESCAN_SECONDS).
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from users.models import StudentProfile
+from .models import LessonColumn, StudentGrade, GradeSyncLog, DENORMALIZED_MARK_FIELDS
+from .audit import mark_change, record_mark_changes
+from .signals import grade_event, publish_on_commit
+from .utils import recalculate_quarterly_grades
+
+MAX_BATCH_SIZE = 500
+
+# Версия - id записи GradeSyncLog, а id выдается до фиксации транзакции: запись с меньшим id
+# может стать видимой позже, чем клиенту выдана большая версия. Такая запись вставлена не раньше
+# чем за время транзакции до выдачи версии, поэтому записи этого окна перед версией клиента
+# отдаются повторно (ячейки передаются целиком, повтор безопасен). Окно - с запасом
+# на самую долгую транзакцию записи оценок.
+SYNC_RESCAN_SECONDS = 60
+
+
+class SyncError(ValueError):
+    """Некорректный пакет синхронизации"""
+
+
+def _parse_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_value(value):
+    """None - удаление оценки, иначе целое от 1 до 5"""
+    if value is None or value == '' or value == 'null':
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('Некорректное значение оценки')
+    if not (1 <= value <= 5):
+        raise ValueError('Оценка должна быть от 1 до 5')
+    return value
+
+
+def apply_sync_batch(teacher, mutations, last_version=0):
+    """
+    Применить пакет изменений учителя.
+
+    mutations: [{'client_id', 'student_id', 'lesson_column_id', 'value', 'comment'}, ...]
+    Возвращает словарь с принятыми, повторными и отклоненными client_id,
+    новой версией сервера и изменениями после last_version.
+    """
+    if len(mutations) > MAX_BATCH_SIZE:
+        raise SyncError(f'Слишком большой пакет: максимум {MAX_BATCH_SIZE} изменений')
+
+    try:
+        last_version = int(last_version or 0)
+    except (TypeError, ValueError):
+        raise SyncError('Некорректная версия')
+
+    client_ids = [str(m.get('client_id') or '') for m in mutations]
+    if not all(client_ids):
+        raise SyncError('У каждого изменения должен быть client_id')
+
+    for attempt in range(2):
+        duplicates, rejected, cells, columns = _prepare_cells(teacher, client_ids, mutations)
+        try:
+            write_cells(teacher, cells, columns)
+            break
+        except IntegrityError:
+            # Тот же пакет параллельно применяет другой запрос: после его фиксации
+            # повторная проверка увидит client_id в журнале и отнесет их к повторам
+            if attempt:
+                raise SyncError('Пакет уже применяется другим запросом, повторите синхронизацию')
+
+    applied = [client_id for changes in cells.values() for client_id, _, _ in changes]
+
+    changes, version = changes_since(teacher, last_version)
+    return {
+        'applied': applied,
+        'duplicates': sorted(duplicates),
+        'rejected': rejected,
+        'version': version,
+        'changes': changes,
+    }
+
+
+def _prepare_cells(teacher, client_ids, mutations):
+    """
+    Проверить изменения пакета. Возвращает повторные client_id, отклоненные изменения,
+    ячейки для write_cells и загруженные столбцы.
+    """
+    # Изменения, которые уже применялись (повтор пакета после обрыва связи)
+    duplicates = set(GradeSyncLog.objects.filter(
+        teacher=teacher,
+        client_id__in=client_ids
+    ).values_list('client_id', flat=True))
+    # client_id, повторенный внутри пакета, применяется один раз
+    seen = set(duplicates)
+    unique = []
+    for client_id, mutation in zip(client_ids, mutations):
+        if client_id in seen:
+            duplicates.add(client_id)
+        else:
+            seen.add(client_id)
+            unique.append((client_id, mutation))
+
+    pending = [
+        (cid, _parse_id(m.get('student_id')), _parse_id(m.get('lesson_column_id')), m)
+        for cid, m in unique
+    ]
+
+    # Предзагрузка столбцов и учеников одним запросом на модель
+    columns = LessonColumn.objects.select_related('lesson__quarter', 'grade_type').in_bulk(
+        {column_id for _, _, column_id, _ in pending if column_id}
+    )
+    students = dict(StudentProfile.objects.filter(
+        id__in={student_id for _, student_id, _, _ in pending if student_id}
+    ).values_list('id', 'class_group_id'))
+
+    today = timezone.now().date()
+    rejected = []
+    # Последнее изменение ячейки в пакете побеждает
+    cells = {}
+    for client_id, student_id, column_id, mutation in pending:
+        column = columns.get(column_id)
+
+        if column is None or student_id not in students:
+            error = 'Ученик или столбец не найден'
+        elif column.lesson.teacher_id != teacher.id:
+            error = 'У вас нет прав для редактирования этого урока'
+        elif students[student_id] != column.lesson.class_group_id:
+            error = 'Ученик не учится в классе этого урока'
+        elif column.lesson.quarter.end_date < today:
+            error = 'Четверть завершена, редактирование невозможно'
+        else:
+            try:
+                value = _parse_value(mutation.get('value'))
+                error = None
+            except ValueError as e:
+                error = str(e)
+
+        if error:
+            rejected.append({'client_id': client_id, 'error': error})
+            continue
+
+        cells.setdefault((student_id, column.id), []).append(
+            (client_id, value, mutation.get('comment') or '')
+        )
+
+    return duplicates, rejected, cells, columns
+
+
+def write_cells(teacher, cells, columns):
+    """
+    Записать ячейки журнала одной транзакцией.
+
+    cells: {(student_id, lesson_column_id): [(client_id, value, comment), ...]} - последнее
+    изменение ячейки побеждает, value=None удаляет оценку; columns: {id: LessonColumn}
+    с загруженными lesson и grade_type. Каждое изменение попадает в GradeSyncLog, четвертные
+    оценки пересчитываются один раз на (ученик, предмет, четверть).
+    """
+    if not cells:
+        return
+    with transaction.atomic():
+        # Прежние значения ячеек - для журнала изменений (удаления записывает сигнал post_delete)
+        previous = {
+            (student_id, column_id): value
+            for student_id, column_id, value in StudentGrade.objects.filter(
+                student_id__in={student_id for student_id, _ in cells},
+                lesson_column_id__in={column_id for _, column_id in cells},
+            ).values_list('student_id', 'lesson_column_id', 'value')
+        }
+
+        upserts = []
+        deletes = []
+        log_entries = []
+        for (student_id, column_id), changes in cells.items():
+            _, value, comment = changes[-1]
+            if value is None:
+                deletes.append((student_id, column_id))
+            else:
+                upserts.append(StudentGrade(
+                    student_id=student_id,
+                    lesson_column_id=column_id,
+                    value=value,
+                    comment=comment,
+                    teacher=teacher,
+                ).fill_denormalized(columns[column_id]))
+            for client_id, change_value, _ in changes:
+                log_entries.append(GradeSyncLog(
+                    teacher=teacher,
+                    client_id=client_id,
+                    student_id=student_id,
+                    lesson_column_id=column_id,
+                    value=change_value,
+                ))
+
+        if upserts:
+            StudentGrade.objects.bulk_create(
+                upserts,
+                update_conflicts=True,
+                unique_fields=['student', 'lesson_column'],
+                update_fields=['value', 'comment', 'teacher', 'updated_at', *DENORMALIZED_MARK_FIELDS],
+            )
+            record_mark_changes(
+                mark_change(grade, previous.get((grade.student_id, grade.lesson_column_id)), grade.value)
+                for grade in upserts
+            )
+        if deletes:
+            cells_filter = Q()
+            for student_id, column_id in deletes:
+                cells_filter |= Q(student_id=student_id, lesson_column_id=column_id)
+            StudentGrade.objects.filter(cells_filter).delete()
+        GradeSyncLog.objects.bulk_create(log_entries)
+
+        recalculate_quarterly_grades(
+            (student_id, columns[column_id].lesson.subject_id, columns[column_id].lesson.quarter_id)
+            for student_id, column_id in cells
+        )
+
+        # bulk_create не вызывает post_save - публикуем события сами (удаления идут через сигнал)
+        for grade in upserts:
+            lesson = columns[grade.lesson_column_id].lesson
+            publish_on_commit(
+                (lesson.class_group_id, lesson.subject_id, lesson.quarter_id),
+                grade_event(grade.id, grade.student_id, grade.lesson_column_id, grade.value)
+            )
+
+
+def changes_since(teacher, version):
+    """Ячейки уроков учителя, изменившиеся после указанной версии, и новая версия"""
+    # Сначала фиксируем текущую версию, чтобы не пропустить записи, появившиеся во время выборки
+    current = GradeSyncLog.objects.aggregate(version=Max('id'))['version'] or 0
+
+    # Записи после версии клиента и окно перед ней (см. SYNC_RESCAN_SECONDS)
+    unseen = Q(id__gt=version)
+    version_at = GradeSyncLog.objects.filter(id__lte=version).order_by('-id').values_list(
+        'created_at', flat=True
+    ).first() if version else None
+    if version_at is not None:
+        unseen |= Q(created_at__gte=version_at - timedelta(seconds=SYNC_RESCAN_SECONDS))
+
+    latest = GradeSyncLog.objects.filter(
+        unseen,
+        id__lte=current,
+        lesson_column__lesson__teacher=teacher
+    ).values('student_id', 'lesson_column_id').annotate(version=Max('id'))
+    cells = {(row['student_id'], row['lesson_column_id']): row['version'] for row in latest}
+    if not cells:
+        return [], max(version, current)
+
+    grades = {
+        (grade['student_id'], grade['lesson_column_id']): grade
+        for grade in StudentGrade.objects.filter(
+            student_id__in={key[0] for key in cells},
+            lesson_column_id__in={key[1] for key in cells},
+        ).values('student_id', 'lesson_column_id', 'value', 'comment')
+    }
+
+    changes = []
+    for (student_id, column_id), cell_version in sorted(cells.items(), key=lambda item: item[1]):
+        grade = grades.get((student_id, column_id))
+        changes.append({
+            'student_id': student_id,
+            'lesson_column_id': column_id,
+            'value': grade['value'] if grade else None,
+            'comment': grade['comment'] if grade else '',
+            'deleted': grade is None,
+            'version': cell_version,
+        })
+    return changes, max(version, current)
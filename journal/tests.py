@@ -1,3 +1,609 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import warnings
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.management import CommandError, call_command
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from school_structure.benchmark import build_demo_school, add_demo_journal
+from main.middleware import MarkChangeAuditMiddleware
+from school_structure.models import AcademicYear, Lesson, Quarter
+from users.models import CustomUser
+from users.views import AdminDashboardView, ParentDashboardView
+from .apps import backfill_denormalized_marks
+from .archive import ArchiveError, YearArchive, grade_queryset
+from .audit import MarkChangeBuffer, mark_change_buffer
+from .snapshots import current_cells, journal_as_of, take_snapshots
+from .integrity import StaleQuarterlyGrades, run_checks
+from .sync import apply_sync_batch
+from .models import ArchivedAttendance, ArchivedStudentGrade, GradeSyncLog, GradeType, JournalSnapshot, LessonColumn, QuarterlyGrade, YearlyGrade, MarkChangeLog, StudentGrade, Attendance
+from .utils import recalculate_quarterly_grades
+
+
+class JournalApiQueriesTests(TestCase):
+    """Число запросов read-only API журнала не зависит от числа строк на странице"""
+
+    ENDPOINTS = ('marks', 'grades', 'attendance', 'homework', 'quarterly-grades', 'yearly-grades', 'mark-history')
+
+    @classmethod
+    def setUpTestData(cls):
+        school = build_demo_school(teachers=2, classes_per_year=1, students_per_class=3,
+                                   with_lessons=True, lesson_weeks=1)
+        add_demo_journal(school, homework=True, attendance=True)
+        quarter = school['quarters'][0]
+        pairs = [(student, subject) for student in school['students'] for subject in school['subjects']]
+        QuarterlyGrade.objects.bulk_create([
+            QuarterlyGrade(student=student, subject=subject, quarter=quarter, grade=4)
+            for student, subject in pairs
+        ])
+        YearlyGrade.objects.bulk_create([
+            YearlyGrade(student=student, subject=subject, academic_year=school['academic_year'], grade=4)
+            for student, subject in pairs
+        ])
+        lesson = school['lessons'][0]
+        MarkChangeLog.objects.bulk_create([
+            MarkChangeLog(student=student, class_group_id=lesson.class_group_id, subject_id=lesson.subject_id,
+                          quarter=quarter, old_value=None, new_value=5, teacher=lesson.teacher,
+                          source='tests')
+            for student in school['students']
+        ])
+        cls.admin = CustomUser.objects.create(username='api_admin', email='api_admin@example.com',
+                                              role=CustomUser.Role.ADMIN)
+        cls.teacher_user = school['teachers'][0].user
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def authenticate(self, user):
+        # Заново из БД: профиль роли не должен оставаться в кеше объекта между запросами
+        self.client.force_authenticate(CustomUser.objects.get(pk=user.pk))
+
+    def test_list_and_retrieve(self):
+        for endpoint in self.ENDPOINTS:
+            with self.subTest(endpoint=endpoint):
+                self.authenticate(self.admin)
+                # Курсорная пагинация: без count, одна выборка страницы
+                with self.assertNumQueries(1):
+                    response = self.client.get(f'/api/journal/{endpoint}/', {'page_size': 50})
+                self.assertEqual(response.status_code, 200)
+                results = response.data['results']
+                self.assertGreater(len(results), 1)
+
+                with self.assertNumQueries(1):
+                    response = self.client.get(f'/api/journal/{endpoint}/{results[0]["id"]}/')
+                self.assertEqual(response.status_code, 200)
+
+    def test_list_with_sparse_fields(self):
+        self.authenticate(self.admin)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/journal/grades/', {'fields': 'id,value', 'page_size': 50})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'value'})
+
+    def test_list_as_teacher(self):
+        for endpoint in self.ENDPOINTS:
+            with self.subTest(endpoint=endpoint):
+                self.authenticate(self.teacher_user)
+                # Профиль учителя и выборка страницы
+                with self.assertNumQueries(2):
+                    response = self.client.get(f'/api/journal/{endpoint}/', {'page_size': 50})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.data['results'])
+
+
+class ArchiveReadTests(TestCase):
+    """API и дашборды читают перенесенный в архив год"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=2, classes_per_year=1, students_per_class=1,
+                                       with_lessons=True, lesson_weeks=1)
+        add_demo_journal(cls.school, attendance=True)
+        cls.admin = CustomUser.objects.create(username='api_admin', email='api_admin@example.com',
+                                              role=CustomUser.Role.ADMIN)
+        cls.parent = CustomUser.objects.create(username='api_parent', email='api_parent@example.com',
+                                               role=CustomUser.Role.PARENT)
+        cls.child = cls.school['students'][0]
+        cls.parent.parent_profile.children.add(cls.child)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.year = self.school['academic_year']
+        self.marks = StudentGrade.objects.count()
+        self.attendance = Attendance.objects.count()
+
+    def archive(self, purge=True):
+        archive = YearArchive(self.year)
+        archive.copy()
+        archive.switch()
+        if purge:
+            archive.purge()
+
+    def list_ids(self, endpoint, **params):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(f'/api/journal/{endpoint}/', {'page_size': 500, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def dashboard_context(self, view_class, user):
+        view = view_class()
+        request = RequestFactory().get('/')
+        request.user = user
+        view.setup(request)
+        return view.get_context_data()
+
+    def dashboard_stats(self):
+        admin = self.dashboard_context(AdminDashboardView, self.admin)
+        child = self.dashboard_context(ParentDashboardView, self.parent)['children_data'][0]
+        return admin['stats']['total_marks'], admin['stats']['avg_grade'], child['avg_grade']
+
+    def test_api_reads_archived_year(self):
+        quarter = self.school['quarters'][0]
+        grade_ids = sorted(StudentGrade.objects.values_list('id', flat=True))
+        attendance_ids = sorted(Attendance.objects.values_list('id', flat=True))
+        self.archive()
+        self.assertEqual(StudentGrade.objects.count(), 0)
+
+        for endpoint, ids in (('grades', grade_ids), ('attendance', attendance_ids)):
+            with self.subTest(endpoint=endpoint):
+                # Без года - только года вне архива
+                self.assertEqual(self.list_ids(endpoint), [])
+                self.assertEqual(sorted(self.list_ids(endpoint, academic_year=self.year.id)), ids)
+                self.assertEqual(sorted(self.list_ids(endpoint, quarter=quarter.id)), ids)
+
+    def test_api_hides_copied_rows_before_purge(self):
+        self.archive(purge=False)
+        self.assertEqual(StudentGrade.objects.count(), self.marks)
+        self.assertEqual(self.list_ids('grades'), [])
+        self.assertEqual(len(self.list_ids('grades', academic_year=self.year.id)), self.marks)
+        self.assertEqual(len(self.list_ids('attendance', academic_year=self.year.id)), self.attendance)
+
+    def test_api_rejects_bad_year(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/journal/grades/', {'academic_year': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def class_marks(self):
+        class_stats = self.dashboard_context(AdminDashboardView, self.admin)['class_stats']
+        return {class_group.id: class_group.mark_count for class_group in class_stats}
+
+    def test_dashboards_include_archive(self):
+        before = self.dashboard_stats()
+        self.assertEqual(before[0], self.marks)
+        class_marks = self.class_marks()
+        self.assertTrue(all(class_marks.values()))
+
+        self.archive()
+        self.assertEqual(self.dashboard_stats(), before)
+        self.assertEqual(self.class_marks(), class_marks)
+        child = self.dashboard_context(ParentDashboardView, self.parent)['children_data'][0]
+        self.assertEqual(len(child['recent_marks']), 5)
+
+
+class StaleQuarterlyGradesTests(TestCase):
+    """Сверка расчетного балла четвертных оценок с оценками за четверть"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=2, classes_per_year=1, students_per_class=1,
+                                       with_lessons=True, lesson_weeks=1)
+        add_demo_journal(cls.school)
+        Quarter.objects.update(end_date=datetime.date(2100, 1, 1))
+
+    def recalculate_all(self):
+        recalculate_quarterly_grades(
+            StudentGrade.objects.values_list('student_id', 'subject_id', 'quarter_id').distinct()
+        )
+
+    def test_unfilled_weight_uses_grade_type_weight(self):
+        grade_type = self.school['grade_type']
+        grade_type.weight = 2
+        grade_type.save()
+        StudentGrade.objects.filter(id__in=StudentGrade.objects.values('id')[:10]).update(weight=None)
+        self.recalculate_all()
+        self.assertEqual(StaleQuarterlyGrades().stale_keys(), [])
+
+    def test_update_student_grade_recalculates(self):
+        self.recalculate_all()
+        grade = StudentGrade.objects.select_related('lesson_column__lesson__teacher__user').first()
+        client = Client()
+        client.force_login(grade.lesson_column.lesson.teacher.user)
+        response = client.post('/journal/ajax/update_student_grade/', json.dumps({
+            'student_id': grade.student_id,
+            'lesson_column_id': grade.lesson_column_id,
+            'value': 1 if grade.value > 1 else 5,
+        }), content_type='application/json')
+        self.assertTrue(response.json()['success'], response.json())
+
+        quarterly = QuarterlyGrade.objects.get(student=grade.student, subject=grade.subject, quarter=grade.quarter)
+        self.assertEqual(response.json()['average_grade'], quarterly.calculated_grade)
+        self.assertEqual(StaleQuarterlyGrades().stale_keys(), [])
+
+
+class IntegrityScopeTests(TestCase):
+    """check_grades --lesson/--student ограничивают проверки и исправления"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=2, classes_per_year=1, students_per_class=1,
+                                       with_lessons=True, lesson_weeks=1)
+        GradeType.objects.create(title='Ответ', short_title='О', is_default=True)
+        cls.student = cls.school['students'][0]
+        cls.lesson = Lesson.objects.filter(class_group=cls.student.class_group).first()
+
+    def count(self, **scope):
+        report = run_checks(names=['lessons_without_columns'], **scope)
+        return report['checks'][0]['count']
+
+    def test_checks_are_scoped(self):
+        class_lessons = Lesson.objects.filter(class_group=self.student.class_group).count()
+        self.assertGreater(Lesson.objects.count(), class_lessons)
+        self.assertEqual(self.count(), Lesson.objects.count())
+        self.assertEqual(self.count(student_id=self.student.id), class_lessons)
+        self.assertEqual(self.count(lesson_id=self.lesson.id), 1)
+
+    def test_fix_is_scoped(self):
+        run_checks(names=['lessons_without_columns'], fix=True, lesson_id=self.lesson.id)
+        self.assertEqual(list(LessonColumn.objects.values_list('lesson_id', flat=True)), [self.lesson.id])
+
+    def test_command_options(self):
+        call_command('check_grades', lesson=self.lesson.id, student=self.student.id, stdout=io.StringIO())
+        with self.assertRaises(CommandError):
+            call_command('check_grades', student=0, stdout=io.StringIO())
+
+
+class BackfillOnMigrateTests(TestCase):
+    """post_migrate заполняет денормализованные поля оценок"""
+
+    class WithoutLegacyMarks:
+        """Реестр моделей на состоянии миграций, где StudentMark уже удалена"""
+
+        def get_model(self, app_label, name):
+            if name == 'StudentMark':
+                raise LookupError(name)
+            return django_apps.get_model(app_label, name)
+
+    @classmethod
+    def setUpTestData(cls):
+        school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=1,
+                                   with_lessons=True, lesson_weeks=1)
+        add_demo_journal(school)
+
+    def setUp(self):
+        StudentGrade.objects.update(subject=None, weight=None)
+
+    def test_each_model_is_checked(self):
+        backfill_denormalized_marks(sender=None, apps=self.WithoutLegacyMarks(), using='default', verbosity=0)
+        self.assertFalse(StudentGrade.objects.filter(subject__isnull=True).exists())
+        self.assertFalse(StudentGrade.objects.filter(weight__isnull=True).exists())
+
+    def test_other_database_is_skipped(self):
+        with self.assertNumQueries(0):
+            backfill_denormalized_marks(sender=None, apps=django_apps, using='replica', verbosity=0)
+        self.assertTrue(StudentGrade.objects.filter(subject__isnull=True).exists())
+
+
+class IncrementalSyncApiTests(TestCase):
+    """?updated_since и удаленные оценки для инкрементальной синхронизации"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=1,
+                                   with_lessons=True, lesson_weeks=1)
+        add_demo_journal(school)
+        cls.admin = CustomUser.objects.create(username='api_admin', email='api_admin@example.com',
+                                              role=CustomUser.Role.ADMIN)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def ids(self, endpoint, **params):
+        response = self.client.get(f'/api/journal/{endpoint}/', {'page_size': 500, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_naive_updated_since_uses_current_timezone(self):
+        grade = StudentGrade.objects.order_by('id').first()
+        StudentGrade.objects.exclude(id=grade.id).update(updated_at=grade.updated_at - datetime.timedelta(hours=1))
+        since = timezone.localtime(grade.updated_at - datetime.timedelta(minutes=1)).replace(tzinfo=None)
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', RuntimeWarning)
+            self.assertEqual(self.ids('grades', updated_since=since.isoformat()), [grade.id])
+
+    def test_deleted_grades(self):
+        since = timezone.now().isoformat()
+        grade = StudentGrade.objects.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            grade.delete()
+        mark_change_buffer.flush()
+
+        response = self.client.get('/api/journal/deleted-grades/', {'updated_since': since})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['student'], row['lesson_column']) for row in response.data['results']],
+            [(grade.student_id, grade.lesson_column_id)],
+        )
+        self.assertNotIn(grade.id, self.ids('grades'))
+
+
+class SyncIdempotencyTests(TestCase):
+    """Повторно присланные изменения офлайн-клиента записываются один раз"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=2,
+                                       with_lessons=True, lesson_weeks=1)
+        add_demo_journal(cls.school)
+        Quarter.objects.update(end_date=datetime.date(2100, 1, 1))
+        cls.teacher = cls.school['teachers'][0]
+        cls.grades = list(StudentGrade.objects.filter(teacher=cls.teacher).order_by('id')[:3])
+
+    def mutation(self, client_id, grade, value):
+        return {'client_id': client_id, 'student_id': grade.student_id,
+                'lesson_column_id': grade.lesson_column_id, 'value': value}
+
+    def apply(self, mutations):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = apply_sync_batch(self.teacher, mutations)
+        mark_change_buffer.flush()
+        return result
+
+    def assert_written_once(self, grade, value):
+        cell = {'student_id': grade.student_id, 'lesson_column_id': grade.lesson_column_id}
+        self.assertEqual(list(StudentGrade.objects.filter(**cell).values_list('value', flat=True)), [value])
+        self.assertEqual(MarkChangeLog.objects.filter(**cell).count(), 1)
+
+    def test_replayed_batch(self):
+        mutations = [
+            self.mutation(f'c{number}', grade, 1 if grade.value > 1 else 5)
+            for number, grade in enumerate(self.grades)
+        ]
+        first = self.apply(mutations)
+        self.assertEqual(first['applied'], ['c0', 'c1', 'c2'])
+        updated_at = dict(StudentGrade.objects.filter(id__in=[g.id for g in self.grades]).values_list('id', 'updated_at'))
+
+        second = self.apply(mutations)
+        self.assertEqual(second['applied'], [])
+        self.assertEqual(second['duplicates'], ['c0', 'c1', 'c2'])
+        self.assertEqual(GradeSyncLog.objects.count(), 3)
+        self.assertEqual(
+            dict(StudentGrade.objects.filter(id__in=updated_at).values_list('id', 'updated_at')), updated_at
+        )
+        for grade, mutation in zip(self.grades, mutations):
+            self.assert_written_once(grade, mutation['value'])
+
+    def test_duplicate_client_id_in_batch(self):
+        grade = self.grades[0]
+        value = 1 if grade.value > 1 else 5
+        result = self.apply([
+            self.mutation('same', grade, value),
+            self.mutation('same', grade, 3 if value != 3 else 4),
+        ])
+        self.assertEqual(result['applied'], ['same'])
+        self.assertEqual(result['duplicates'], ['same'])
+        self.assertEqual(GradeSyncLog.objects.filter(client_id='same').count(), 1)
+        self.assert_written_once(grade, value)
+
+
+class MarkChangeBufferTests(TestCase):
+    """Буфер журнала изменений: пачки по размеру и по времени, повтор при недоступной БД"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=1)
+        cls.student = cls.school['students'][0]
+
+    def entries(self, count, **fields):
+        values = {'student': self.student, 'old_value': None, 'new_value': 5, 'source': 'tests', **fields}
+        return [MarkChangeLog(created_at=timezone.now(), **values) for _ in range(count)]
+
+    def test_flush_on_size(self):
+        buffer = MarkChangeBuffer(flush_size=3, flush_seconds=3600)
+        buffer.add(self.entries(2))
+        self.assertEqual(MarkChangeLog.objects.count(), 0)
+        buffer.add(self.entries(1))
+        self.assertEqual(MarkChangeLog.objects.count(), 3)
+        self.assertEqual(len(buffer), 0)
+
+    def test_flush_at_request_end(self):
+        middleware = MarkChangeAuditMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/')
+
+        buffer = MarkChangeBuffer(flush_size=100, flush_seconds=3600)
+        buffer.add(self.entries(2))
+        with mock.patch('main.middleware.mark_change_buffer', buffer):
+            middleware(request)
+        # Интервал не истек и пачка не набралась - записи ждут
+        self.assertEqual(len(buffer), 2)
+
+        buffer.flush_seconds = 0
+        with mock.patch('main.middleware.mark_change_buffer', buffer):
+            middleware(request)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(MarkChangeLog.objects.count(), 2)
+
+    def test_requeue_when_database_unavailable(self):
+        buffer = MarkChangeBuffer(flush_size=100, flush_seconds=3600)
+        buffer.add(self.entries(3))
+        with mock.patch.object(MarkChangeLog.objects, 'bulk_create', side_effect=OperationalError), \
+                self.assertLogs('journal.audit', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 3)
+
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(MarkChangeLog.objects.count(), 3)
+
+    def test_bad_rows_are_split_out(self):
+        buffer = MarkChangeBuffer(flush_size=100, flush_seconds=3600)
+        # Отрицательное значение нарушает ограничение PositiveIntegerField
+        entries = self.entries(3) + self.entries(1, old_value=-1) + self.entries(4)
+        buffer.add(entries)
+        bulk_create = MarkChangeLog.objects.bulk_create
+        with mock.patch.object(MarkChangeLog.objects, 'bulk_create', side_effect=bulk_create) as calls, \
+                self.assertLogs('journal.audit', 'ERROR') as logs:
+            self.assertEqual(buffer.flush(), 7)
+        self.assertEqual(MarkChangeLog.objects.count(), 7)
+        self.assertEqual(len(logs.records), 1)
+        # 8 -> 4 + 4 -> 2 + 2 -> 1 + 1: вставок меньше, чем строк
+        self.assertLess(calls.call_count, len(entries))
+
+
+class JournalAsOfTests(TestCase):
+    """Сетка журнала на прошлую дату от снимка вперед и назад совпадает с фактической"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=3,
+                                   with_lessons=True, lesson_weeks=1)
+        add_demo_journal(school)
+        first = StudentGrade.objects.order_by('id').first()
+        cls.grid = (first.class_group_id, first.subject_id, first.quarter_id)
+        cls.grade_ids = list(StudentGrade.objects.filter(
+            class_group_id=first.class_group_id, subject_id=first.subject_id, quarter_id=first.quarter_id
+        ).order_by('id').values_list('id', flat=True)[:3])
+
+    def setUp(self):
+        self.start = timezone.now() - datetime.timedelta(hours=3)
+        # Фактическое состояние сетки по минутам от start
+        self.states = {}
+
+    def at(self, minute):
+        return mock.patch('django.utils.timezone.now',
+                          return_value=self.start + datetime.timedelta(minutes=minute))
+
+    def edit(self, minute, change):
+        with self.at(minute):
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            mark_change_buffer.flush()
+        self.states[minute] = current_cells(*self.grid)
+
+    def set_value(self, grade_id, value):
+        grade = StudentGrade.objects.get(id=grade_id)
+        grade.value = value
+        grade.save()
+
+    def build_history(self):
+        # Демо-журнал ставит оценки от 2 до 5: единица всегда меняет значение ячейки
+        first, second, third = self.grade_ids
+        original = StudentGrade.objects.get(id=first).value
+        self.states[0] = current_cells(*self.grid)
+        self.edit(10, lambda: self.set_value(first, 1))
+        deleted = StudentGrade.objects.get(id=second)
+        self.edit(20, deleted.delete)
+        with self.at(30):
+            take_snapshots([self.grid])
+        self.edit(40, lambda: StudentGrade.objects.create(
+            student_id=deleted.student_id, lesson_column_id=deleted.lesson_column_id,
+            value=1, teacher_id=deleted.teacher_id,
+        ))
+        self.edit(50, lambda: self.set_value(third, 1))
+        self.edit(55, lambda: self.set_value(first, 3 if original != 3 else 2))
+
+    def expected(self, minute):
+        return self.states[max(edit for edit in self.states if edit <= minute)]
+
+    def as_of(self, minute):
+        with self.at(120):
+            return journal_as_of(*self.grid, self.start + datetime.timedelta(minutes=minute))
+
+    def test_replay_from_snapshot(self):
+        self.build_history()
+        self.assertEqual(len(set(map(frozenset, (state.items() for state in self.states.values())))), 6)
+        # До снимка - назад от снимка, после - вперед от него
+        for minute, events in ((5, 2), (15, 1), (25, 0), (35, 0), (45, 1), (52, 2), (60, 3)):
+            with self.subTest(minute=minute):
+                result = self.as_of(minute)
+                self.assertEqual(result['base'], 'snapshot')
+                self.assertEqual(result['cells'], self.expected(minute))
+                self.assertEqual(result['events'], events)
+
+    def test_replay_from_current_without_snapshot(self):
+        self.build_history()
+        JournalSnapshot.objects.all().delete()
+        for minute in (5, 25, 45):
+            with self.subTest(minute=minute):
+                result = self.as_of(minute)
+                self.assertEqual(result['base'], 'current')
+                self.assertEqual(result['cells'], self.expected(minute))
+
+
+class YearArchiveTests(TestCase):
+    """Перенос учебного года в архив: досверка перед переключением, очистка, чтение четверти"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=1,
+                                       with_lessons=True, lesson_weeks=1)
+        add_demo_journal(cls.school, attendance=True)
+        cls.year = cls.school['academic_year']
+
+        # Следующий (текущий) год с одним уроком, оценкой и отметкой посещаемости
+        next_year = AcademicYear.objects.create(year='2001-2002', start_date=datetime.date(2001, 9, 1),
+                                                end_date=datetime.date(2100, 5, 31), is_current=True)
+        cls.next_quarter = Quarter.objects.create(academic_year=next_year, number=1, name='1-я четверть',
+                                                  start_date=datetime.date(2001, 9, 1),
+                                                  end_date=datetime.date(2100, 1, 1))
+        old = cls.school['lessons'][0]
+        lesson = Lesson.objects.create(subject_id=old.subject_id, teacher_id=old.teacher_id,
+                                       class_group_id=old.class_group_id, quarter=cls.next_quarter,
+                                       classroom=old.classroom, date=datetime.date(2001, 9, 3),
+                                       lesson_number=1, start_time=old.start_time, end_time=old.end_time)
+        column = LessonColumn.objects.create(lesson=lesson, grade_type=cls.school['grade_type'])
+        student = cls.school['students'][0]
+        cls.next_grade = StudentGrade.objects.create(student=student, lesson_column=column, value=4,
+                                                     teacher_id=old.teacher_id)
+        cls.next_attendance = Attendance.objects.create(student=student, lesson=lesson, status='PRESENT')
+
+    def year_grades(self):
+        return StudentGrade.objects.filter(quarter__academic_year=self.year)
+
+    def test_rows_changed_after_copy_are_resynced(self):
+        archive = YearArchive(self.year)
+        archive.copy()
+        edited, deleted = self.year_grades().order_by('id')[:2]
+        edited.value = 1
+        edited.save()
+        deleted.delete()
+        added = StudentGrade.objects.create(student=deleted.student, lesson_column=deleted.lesson_column,
+                                            value=2, teacher=deleted.teacher)
+
+        archive.switch()
+        archived = dict(ArchivedStudentGrade.objects.filter(academic_year=self.year).values_list('id', 'value'))
+        self.assertEqual(archived, dict(self.year_grades().values_list('id', 'value')))
+        self.assertEqual(archived[edited.id], 1)
+        self.assertNotIn(deleted.id, archived)
+        self.assertEqual(archived[added.id], 2)
+
+    def test_purge_removes_only_archived_year(self):
+        with self.assertRaises(ArchiveError):
+            YearArchive(self.year).purge()
+
+        grades = self.year_grades().count()
+        attendance = Attendance.objects.filter(lesson__quarter__academic_year=self.year).count()
+        YearArchive(self.year).run()
+
+        self.assertFalse(self.year_grades().exists())
+        self.assertFalse(Attendance.objects.filter(lesson__quarter__academic_year=self.year).exists())
+        self.assertEqual(ArchivedStudentGrade.objects.count(), grades)
+        self.assertEqual(ArchivedAttendance.objects.count(), attendance)
+        self.assertEqual(list(StudentGrade.objects.values_list('id', flat=True)), [self.next_grade.id])
+        self.assertEqual(list(Attendance.objects.values_list('id', flat=True)), [self.next_attendance.id])
+
+    def test_grade_queryset_falls_through_to_archive(self):
+        quarter = self.school['quarters'][0]
+        before = set(grade_queryset(quarter.id).filter(quarter=quarter).values_list('id', 'value'))
+        self.assertIs(grade_queryset(quarter.id).model, StudentGrade)
+
+        YearArchive(self.year).run()
+        self.assertIs(grade_queryset(quarter.id).model, ArchivedStudentGrade)
+        self.assertEqual(set(grade_queryset(quarter.id).filter(quarter=quarter).values_list('id', 'value')), before)
+        self.assertIs(grade_queryset(self.next_quarter.id).model, StudentGrade)
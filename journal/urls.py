@@ -17,6 +17,13 @@ urlpatterns = [
     path('ajax/update_student_grade/', views.update_student_grade, name='update_student_grade'),
     path('ajax/manage_lesson_column/', views.manage_lesson_column, name='manage_lesson_column'),
     path('ajax/column/<int:column_id>/stats/', views.get_column_stats, name='get_column_stats'),
+    path('ajax/sync/', views.sync_journal, name='sync_journal'),
+    path('ajax/class/<int:class_id>/subject/<int:subject_id>/import-marks/',
+         views.import_marks, name='import_marks'),
+    path('ajax/class/<int:class_id>/subject/<int:subject_id>/quarter/<int:quarter_id>/history/',
+         views.journal_history, name='journal_history'),
+    path('events/class/<int:class_id>/subject/<int:subject_id>/quarter/<int:quarter_id>/',
+         views.journal_events, name='journal_events'),
 
     # Четвертные и годовые оценки
     path('quarterly/class/<int:class_id>/subject/<int:subject_id>/quarter/<int:quarter_id>/columns/',
@@ -0,0 +1,31 @@
+# journal/utils.py
+from .models import QuarterlyGrade
+
+
+def recalculate_quarterly_grades(keys):
+    """
+    Пересчитать четвертные оценки один раз на каждую тройку (student_id, subject_id, quarter_id).
+    Используется массовыми операциями, чтобы не пересчитывать оценку после каждой ячейки.
+    """
+    keys = set(keys)
+    if not keys:
+        return []
+
+    existing = {
+        (q.student_id, q.subject_id, q.quarter_id): q
+        for q in QuarterlyGrade.objects.filter(
+            student_id__in={key[0] for key in keys},
+            subject_id__in={key[1] for key in keys},
+            quarter_id__in={key[2] for key in keys},
+        )
+    }
+
+    recalculated = []
+    for student_id, subject_id, quarter_id in keys:
+        quarterly_grade = existing.get((student_id, subject_id, quarter_id)) or QuarterlyGrade(
+            student_id=student_id, subject_id=subject_id, quarter_id=quarter_id
+        )
+        quarterly_grade.calculate_grade()
+        quarterly_grade.save()
+        recalculated.append(quarterly_grade)
+    return recalculated
@@ -1,29 +1,38 @@
 # journal/views.py
-from django.db import models
+from django.db import models, transaction
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.db.models import Q, Count, Avg, Sum
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.core.exceptions import PermissionDenied
+import asyncio
 import json
 
+from main.tabular import iter_table_rows, TableError
 from users.decorators import teacher_required
 from school_structure.models import Quarter, ClassGroup, Subject, Lesson, AcademicYear
 from users.models import StudentProfile, TeacherProfile
 from .models import (
     GradeType, LessonColumn, StudentGrade,
-    QuarterlyGrade, YearlyGrade, GradeColumn, LessonGradeColumn, StudentMark
+    QuarterlyGrade, YearlyGrade, GradeSyncLog
 )
+from .sync import apply_sync_batch, SyncError
+from .mark_import import MarkImport, COLUMN_ALIASES as MARK_COLUMN_ALIASES
+from .snapshots import journal_as_of
+from .archive import grade_queryset
+from .utils import recalculate_quarterly_grades
+from .events import get_broker, channel_name, live_events_enabled
 
 
 @login_required
 @teacher_required
 def teacher_journal(request):
-    """Журнал учителя с настраиваемыми столбцами"""
+    """Журнал учителя: предметы и классы текущей четверти"""
     teacher = request.user.teacher_profile
 
     # Получаем текущую четверть
@@ -33,34 +42,40 @@ def teacher_journal(request):
         current_quarter = None
         messages.warning(request, 'Текущая четверть не установлена')
 
-    # Получаем предметы и классы учителя
-    teacher_lessons = Lesson.objects.filter(
+    # Пары (предмет, класс) с числом уроков и учеников - одним сгруппированным запросом
+    rows = Lesson.objects.filter(
         teacher=teacher,
         quarter=current_quarter
-    ).select_related('subject', 'class_group', 'quarter')
+    ).values(
+        'subject_id', 'subject__title', 'class_group_id', 'class_group__name', 'class_group__students_count'
+    ).annotate(
+        lessons_count=Count('id')
+    ).order_by('subject__title', 'class_group__name')
 
-    # Группируем по предметам и классам
+    # Группируем по предметам
     subjects_data = {}
-    for lesson in teacher_lessons:
-        key = (lesson.subject_id, lesson.class_group_id)
-        if key not in subjects_data:
-            subjects_data[key] = {
-                'subject': lesson.subject,
-                'class_group': lesson.class_group,
-                'lessons_count': 0,
-                'lessons': []
-            }
-        subjects_data[key]['lessons_count'] += 1
-        subjects_data[key]['lessons'].append(lesson)
-
-    # Получаем все типы оценок
-    grade_types = GradeType.objects.filter(is_default=True).first()
+    for row in rows:
+        data = subjects_data.setdefault(row['subject_id'], {
+            'subject': {'id': row['subject_id'], 'title': row['subject__title']},
+            'classes': [],
+            'lessons_count': 0,
+        })
+        data['classes'].append({
+            'id': row['class_group_id'],
+            'name': row['class_group__name'],
+            'student_count': row['class_group__students_count'],
+            'lessons_count': row['lessons_count'],
+        })
+        data['lessons_count'] += row['lessons_count']
+
+    for data in subjects_data.values():
+        data['classes_count'] = len(data['classes'])
 
     context = {
         'teacher': teacher,
         'current_quarter': current_quarter,
+        'subjects_with_classes': list(subjects_data.values()),
         'subjects_data': list(subjects_data.values()),
-        'default_grade_type': grade_types,
     }
     return render(request, 'journal/teacher_journal.html', context)
 
@@ -142,8 +157,8 @@ def class_subject_journal(request, class_id, subject_id, quarter_id=None):
     # Получаем все ID столбцов
     column_ids = [col.id for col in all_columns]
 
-    # Получаем все оценки для этих столбцов и учеников
-    grades = StudentGrade.objects.filter(
+    # Получаем все оценки для этих столбцов и учеников (для архивного года - из архива)
+    grades = grade_queryset(quarter.id).filter(
         lesson_column_id__in=column_ids,
         student__in=students
     ).select_related('lesson_column', 'teacher__user')
@@ -226,6 +241,7 @@ def class_subject_journal(request, class_id, subject_id, quarter_id=None):
         'other_quarters': other_quarters,
         'default_grade_type': default_grade_type,
         'total_columns': sum(len(lc['columns']) for lc in lessons_with_columns),
+        'live_events': live_events_enabled(request),
     }
 
     return render(request, 'journal/class_subject_journal.html', context)
@@ -262,88 +278,244 @@ def update_student_grade(request):
                 'error': 'Четверть завершена, редактирование невозможно'
             })
 
-        response_data = {'success': True}
-
-        # Обработка оценки
-        if value is None or value == '' or value == 'null':
-            # Удаляем оценку
-            deleted_count, _ = StudentGrade.objects.filter(
-                student=student,
-                lesson_column=lesson_column
-            ).delete()
-            response_data['grade'] = {
-                'deleted': True,
-                'deleted_count': deleted_count
-            }
-        else:
-            # Проверяем значение
-            try:
-                value_int = int(value)
-                if not (1 <= value_int <= 5):
+        # Все изменения одной ячейки - одна транзакция (BEGIN IMMEDIATE на SQLite)
+        with transaction.atomic():
+            response_data = {'success': True}
+
+            # Обработка оценки
+            if value is None or value == '' or value == 'null':
+                # Удаляем оценку
+                deleted_count, _ = StudentGrade.objects.filter(
+                    student=student,
+                    lesson_column=lesson_column
+                ).delete()
+                response_data['grade'] = {
+                    'deleted': True,
+                    'deleted_count': deleted_count
+                }
+                # Фиксируем изменение для офлайн-клиентов
+                GradeSyncLog.objects.create(
+                    teacher=teacher, student=student, lesson_column=lesson_column, value=None
+                )
+            else:
+                # Проверяем значение
+                try:
+                    value_int = int(value)
+                    if not (1 <= value_int <= 5):
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'Оценка должна быть от 1 до 5'
+                        })
+
+                    # Создаем или обновляем оценку
+                    grade, created = StudentGrade.objects.update_or_create(
+                        student=student,
+                        lesson_column=lesson_column,
+                        defaults={
+                            'value': value_int,
+                            'comment': comment,
+                            'teacher': teacher
+                        }
+                    )
+
+                    GradeSyncLog.objects.create(
+                        teacher=teacher, student=student, lesson_column=lesson_column, value=value_int
+                    )
+
+                    response_data['grade'] = {
+                        'id': grade.id,
+                        'value': grade.value,
+                        'created': created,
+                        'weight': grade.weight
+                    }
+                except ValueError:
                     return JsonResponse({
                         'success': False,
-                        'error': 'Оценка должна быть от 1 до 5'
+                        'error': 'Некорректное значение оценки'
                     })
 
-                # Создаем или обновляем оценку
-                grade, created = StudentGrade.objects.update_or_create(
-                    student=student,
-                    lesson_column=lesson_column,
-                    defaults={
-                        'value': value_int,
-                        'comment': comment,
-                        'teacher': teacher
-                    }
-                )
+            # Пересчитываем четвертную оценку; ее расчетный балл - новый средневзвешенный балл
+            quarterly_grade, = recalculate_quarterly_grades([
+                (student.id, lesson_column.lesson.subject_id, lesson_column.lesson.quarter_id)
+            ])
+            avg_grade = quarterly_grade.calculated_grade
+
+            response_data.update({
+                'quarterly_grade': {
+                    'id': quarterly_grade.id,
+                    'grade': quarterly_grade.grade,
+                    'calculated_grade': quarterly_grade.calculated_grade,
+                },
+                'average_grade': round(avg_grade, 2) if avg_grade else None
+            })
 
-                response_data['grade'] = {
-                    'id': grade.id,
-                    'value': grade.value,
-                    'created': created,
-                    'weight': grade.weight
-                }
-            except ValueError:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Некорректное значение оценки'
-                })
+        return JsonResponse(response_data)
 
-        # Пересчитываем четвертную оценку
-        quarterly_grade, _ = QuarterlyGrade.objects.get_or_create(
-            student=student,
-            subject=lesson_column.lesson.subject,
-            quarter=lesson_column.lesson.quarter
-        )
-        quarterly_grade.save()
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
 
-        # Рассчитываем новый средний балл
-        all_grades = StudentGrade.objects.filter(
-            student=student,
-            lesson_column__lesson__subject=lesson_column.lesson.subject,
-            lesson_column__lesson__quarter=lesson_column.lesson.quarter
+
+@csrf_exempt
+@require_POST
+@login_required
+@teacher_required
+def sync_journal(request):
+    """
+    Синхронизация с офлайн-клиентом учителя.
+    Принимает {"last_version": N, "mutations": [...]} и возвращает результат применения
+    пакета и ячейки, изменившиеся после last_version.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Некорректный JSON'}, status=400)
+
+    mutations = data.get('mutations') or []
+    if not isinstance(mutations, list) or not all(isinstance(m, dict) for m in mutations):
+        return JsonResponse({'success': False, 'error': 'mutations должен быть списком объектов'}, status=400)
+
+    try:
+        result = apply_sync_batch(
+            request.user.teacher_profile,
+            mutations,
+            last_version=data.get('last_version', 0)
         )
+    except SyncError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
-        total_weighted = 0
-        total_weight = 0
-        for grade in all_grades:
-            total_weighted += grade.value * grade.weight
-            total_weight += grade.weight
+    return JsonResponse({'success': True, **result})
 
-        avg_grade = total_weighted / total_weight if total_weight > 0 else None
 
-        response_data.update({
-            'quarterly_grade': {
-                'id': quarterly_grade.id,
-                'grade': quarterly_grade.grade,
-                'calculated_grade': quarterly_grade.calculated_grade,
-            },
-            'average_grade': round(avg_grade, 2) if avg_grade else None
-        })
+@csrf_exempt
+@require_POST
+@login_required
+@teacher_required
+def import_marks(request, class_id, subject_id):
+    """
+    Импорт оценок журнала из CSV/XLSX (поле file).
+    Необязательные поля: quarter_id - ограничить столбцы четвертью, dry_run - только проверить файл.
+    При ошибках в файле ничего не записывается, ошибки возвращаются с номерами строк.
+    """
+    teacher = request.user.teacher_profile
+    class_group = get_object_or_404(ClassGroup, id=class_id)
+    subject = get_object_or_404(Subject, id=subject_id)
+    quarter = None
+    if request.POST.get('quarter_id'):
+        quarter = get_object_or_404(Quarter, id=request.POST['quarter_id'])
 
-        return JsonResponse(response_data)
+    if not Lesson.objects.filter(teacher=teacher, class_group=class_group, subject=subject).exists():
+        raise PermissionDenied("У вас нет доступа к этому журналу")
 
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'success': False, 'error': 'Файл не передан'}, status=400)
+
+    mark_import = MarkImport(
+        teacher, class_group, subject, quarter,
+        dry_run=request.POST.get('dry_run') in ('1', 'true', 'on')
+    )
+    try:
+        result = mark_import.run(iter_table_rows(upload, upload.name, MARK_COLUMN_ALIASES))
+    except TableError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    result['errors'] = [{'line': line, 'error': message} for line, message in result['errors']]
+    return JsonResponse({'success': not result['errors'], **result})
+
+
+@login_required
+@teacher_required
+def journal_history(request, class_id, subject_id, quarter_id):
+    """
+    Оценки сетки журнала на прошлый момент (?at=<ISO datetime>) - для разбора спорных ситуаций.
+    Доступно учителю-предметнику и классному руководителю.
+    """
+    teacher = request.user.teacher_profile
+    class_group = get_object_or_404(ClassGroup, id=class_id)
+    get_object_or_404(Subject, id=subject_id)
+    get_object_or_404(Quarter, id=quarter_id)
+
+    has_access = class_group.classroom_teacher_id == teacher.id or Lesson.objects.filter(
+        class_group_id=class_id, subject_id=subject_id, quarter_id=quarter_id, teacher=teacher
+    ).exists()
+    if not has_access:
+        raise PermissionDenied("У вас нет доступа к этому журналу")
+
+    moment = parse_datetime(request.GET.get('at', ''))
+    if moment is None:
+        return JsonResponse({'success': False, 'error': 'Ожидается at - дата и время в формате ISO 8601'}, status=400)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+
+    state = journal_as_of(class_id, subject_id, quarter_id, moment)
+    return JsonResponse({
+        'success': True,
+        'at': moment.isoformat(),
+        'base': state['base'],
+        'base_at': state['base_at'].isoformat(),
+        'events': state['events'],
+        'grades': [
+            {'student_id': student_id, 'lesson_column_id': column_id, 'value': value}
+            for (student_id, column_id), value in sorted(state['cells'].items())
+        ],
+    })
+
+
+# Интервал комментариев-пингов, чтобы прокси не закрывали простаивающее соединение
+SSE_KEEPALIVE_SECONDS = 15
+
+
+async def journal_events(request, class_id, subject_id, quarter_id):
+    """
+    SSE-поток изменений оценок для сетки (класс, предмет, четверть).
+    Открытые журналы получают события и обновляют ячейки без перезагрузки страницы.
+    Работает при запуске через ASGI (main.asgi): соединение не занимает поток воркера.
+    Под WSGI или при выключенном JOURNAL_LIVE_EVENTS отвечает 204 - EventSource
+    по спецификации не переподключается.
+    """
+    if not live_events_enabled(request):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    if not user.is_authenticated or user.role != 'TEACHER':
+        raise PermissionDenied
+
+    teacher = await TeacherProfile.objects.filter(user=user).afirst()
+    if teacher is None:
+        raise PermissionDenied
+
+    # Доступ есть у учителя-предметника и у классного руководителя
+    has_access = await Lesson.objects.filter(
+        class_group_id=class_id,
+        subject_id=subject_id,
+        quarter_id=quarter_id,
+        teacher=teacher
+    ).aexists() or await ClassGroup.objects.filter(
+        id=class_id,
+        classroom_teacher=teacher
+    ).aexists()
+    if not has_access:
+        raise PermissionDenied
+
+    async def event_stream():
+        broker = get_broker()
+        subscription = broker.subscribe(channel_name(class_id, subject_id, quarter_id))
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event = await subscription.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: {event["type"]}\ndata: {json.dumps(event)}\n\n'
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @csrf_exempt
@@ -358,15 +530,10 @@ def manage_lesson_column(request):
         lesson_id = data.get('lesson_id')
         column_id = data.get('column_id')
         grade_type_id = data.get('grade_type_id')
-        lesson_grade_column = LessonGradeColumn.objects.filter('', column_id).first()
-        # lesson_grade_column = get_object_or_404(LessonGradeColumn, 'column_id', column_id)
-        print(action, lesson_id, column_id, grade_type_id)
-        pass
 
         lesson = get_object_or_404(Lesson, id=lesson_id)
         teacher = request.user.teacher_profile
 
-
         # Проверяем права
         if lesson.teacher != teacher:
             return JsonResponse({
@@ -518,407 +685,6 @@ def get_column_stats(request, column_id):
     return JsonResponse(stats)
 
 
-@login_required
-@teacher_required
-def teacher_journal(request):
-    """Новая версия журнала учителя"""
-    teacher = request.user.teacher_profile
-
-    # Получаем текущую четверть
-    try:
-        current_quarter = Quarter.objects.get(is_current=True)
-    except Quarter.DoesNotExist:
-        current_quarter = None
-        messages.warning(request, 'Текущая четверть не установлена')
-
-    # Получаем предметы и классы учителя
-    teacher_lessons = Lesson.objects.filter(
-        teacher=teacher,
-        quarter=current_quarter
-    ).select_related('subject', 'class_group')
-
-    # Получаем предметы учителя в текущей четверти
-    teacher_subjects = Subject.objects.filter(
-        lessons__teacher=teacher,
-        lessons__quarter=current_quarter
-    ).distinct()
-
-    # Получаем классы по каждому предмету
-    subjects_with_classes = []
-    for subject in teacher_subjects:
-        classes = ClassGroup.objects.filter(
-            lessons__teacher=teacher,
-            lessons__subject=subject,
-            lessons__quarter=current_quarter
-        ).distinct().annotate(
-            student_count=Count('students')
-        )
-
-        if classes.exists():
-            subjects_with_classes.append({
-                'subject': subject,
-                'classes': classes
-            })
-
-
-    # Группируем по предметам
-    subjects_data = {}
-    for lesson in teacher_lessons:
-        subject = lesson.subject
-        if subject.id not in subjects_data:
-            subjects_data[subject.id] = {
-                'subject': subject,
-                'classes': set(),
-                'lessons_count': 0
-            }
-        subjects_data[subject.id]['classes'].add(lesson.class_group)
-        subjects_data[subject.id]['lessons_count'] += 1
-
-    # Преобразуем set в list для шаблона
-    for data in subjects_data.values():
-        data['classes'] = list(data['classes'])
-        data['classes_count'] = len(data['classes'])
-
-    context = {
-        'teacher': teacher,
-        'current_quarter': current_quarter,
-        'subjects_with_classes': subjects_with_classes,
-        'subjects_data': list(subjects_data.values()),
-    }
-    return render(request, 'journal/teacher_journal.html', context)
-
-
-@login_required
-@teacher_required
-def _class_subject_journal(request, class_id, subject_id, quarter_id=None):
-    """Новая версия журнала по классу и предмету с поддержкой нескольких столбцов"""
-    teacher = request.user.teacher_profile
-    class_group = get_object_or_404(ClassGroup, id=class_id)
-    subject = get_object_or_404(Subject, id=subject_id)
-
-    # Определяем четверть
-    if quarter_id:
-        quarter = get_object_or_404(Quarter, id=quarter_id)
-    else:
-        try:
-            quarter = Quarter.objects.get(is_current=True)
-        except Quarter.DoesNotExist:
-            messages.error(request, 'Текущая четверть не установлена')
-            return redirect('journal:teacher_journal')
-
-    # Проверяем права
-    has_access = Lesson.objects.filter(
-        teacher=teacher,
-        class_group=class_group,
-        subject=subject,
-        quarter=quarter
-    ).exists()
-
-    if not has_access:
-        raise PermissionDenied("У вас нет доступа к этому журналу")
-
-    # Получаем учеников
-    students = class_group.students.all().select_related('user').order_by(
-        'user__last_name', 'user__first_name'
-    )
-
-    # Получаем уроки
-    lessons = Lesson.objects.filter(
-        class_group=class_group,
-        subject=subject,
-        quarter=quarter
-    ).order_by('date', 'lesson_number')
-
-    # Получаем стандартные типы оценок
-    default_columns = GradeColumn.objects.filter(is_active=True).order_by('order')
-
-    # Для каждого урока получаем его столбцы
-    lessons_with_columns = []
-    for lesson in lessons:
-        # Получаем столбцы для этого урока
-        lesson_columns = LessonGradeColumn.objects.filter(
-            lesson=lesson
-        ).select_related('grade_column').order_by('order')
-
-        # Если столбцов нет, создаем стандартные
-        if not lesson_columns.exists():
-            for idx, col in enumerate(default_columns):
-                lesson_col, created = LessonGradeColumn.objects.get_or_create(
-                    lesson=lesson,
-                    grade_column=col,
-                    defaults={'order': idx * 10}
-                )
-                lesson_columns = LessonGradeColumn.objects.filter(
-                    lesson=lesson
-                ).select_related('grade_column').order_by('order')
-
-        lessons_with_columns.append({
-            'lesson': lesson,
-            'columns': list(lesson_columns),
-            'has_columns': lesson_columns.exists()
-        })
-
-    # Получаем все оценки для этих уроков
-    lesson_column_ids = []
-    for lesson_data in lessons_with_columns:
-        for col in lesson_data['columns']:
-            lesson_column_ids.append(col.id)
-
-    # Получаем оценки учеников
-    marks = StudentMark.objects.filter(
-        lesson_grade_column_id__in=lesson_column_ids,
-        student__in=students
-    ).select_related('lesson_grade_column', 'teacher__user')
-
-    # Организуем оценки для быстрого доступа
-    marks_dict = {}
-    for mark in marks:
-        key = (mark.student_id, mark.lesson_grade_column_id)
-        marks_dict[key] = mark
-
-    # Получаем четвертные оценки
-    quarterly_grades = QuarterlyGrade.objects.filter(
-        student__in=students,
-        subject=subject,
-        quarter=quarter
-    )
-    quarterly_dict = {q.student_id: q for q in quarterly_grades}
-
-    # Рассчитываем статистику для каждого ученика
-    student_stats = []
-    for student in students:
-        # Получаем все оценки ученика за эту четверть
-        student_marks = [m for m in marks if m.student_id == student.id]
-
-        # Рассчитываем средневзвешенный балл
-        total_weighted = 0
-        total_weight = 0
-
-        for mark in student_marks:
-            total_weighted += mark.value * mark.weight
-            total_weight += mark.weight
-
-        avg_grade = total_weighted / total_weight if total_weight > 0 else None
-
-        student_stats.append({
-            'student': student,
-            'avg_grade': round(avg_grade, 2) if avg_grade else None,
-            'marks_count': len(student_marks),
-            'quarterly_grade': quarterly_dict.get(student.id)
-        })
-
-    # Получаем другие четверти для переключения
-    other_quarters = Quarter.objects.filter(
-        academic_year=quarter.academic_year
-    ).exclude(id=quarter.id).order_by('number')
-
-    context = {
-        'class_group': class_group,
-        'subject': subject,
-        'quarter': quarter,
-        'students': students,
-        'lessons_with_columns': lessons_with_columns,
-        'marks_dict': marks_dict,
-        'student_stats': student_stats,
-        'other_quarters': other_quarters,
-        'default_columns': default_columns,
-    }
-
-    return render(request, 'journal/class_subject_journal.html', context)
-
-
-@csrf_exempt
-@require_POST
-@login_required
-@teacher_required
-def update_mark_attendance(request):
-    """Обновление оценки ученика в столбце урока"""
-    try:
-        data = json.loads(request.body)
-        student_id = data.get('student_id')
-        lesson_column_id = data.get('lesson_column_id')
-        value = data.get('value')
-        comment = data.get('comment', '')
-
-        student = get_object_or_404(StudentProfile, id=student_id)
-        lesson_column = get_object_or_404(LessonGradeColumn, id=lesson_column_id)
-        teacher = request.user.teacher_profile
-
-        # Проверяем права
-        if lesson_column.lesson.teacher != teacher:
-            return JsonResponse({
-                'success': False,
-                'error': 'У вас нет прав для редактирования этого урока'
-            })
-
-        # Проверяем, что четверть не завершена
-        if lesson_column.lesson.quarter.end_date < timezone.now().date():
-            return JsonResponse({
-                'success': False,
-                'error': 'Четверть завершена, редактирование невозможно'
-            })
-
-        response_data = {'success': True}
-
-        # Обработка оценки
-        if value is None or value == '' or value == 'null':
-            # Удаляем оценку
-            deleted_count, _ = StudentMark.objects.filter(
-                student=student,
-                lesson_grade_column=lesson_column
-            ).delete()
-            response_data['mark'] = {
-                'deleted': True,
-                'deleted_count': deleted_count
-            }
-        else:
-            # Проверяем значение
-            try:
-                value_int = int(value)
-                if not (1 <= value_int <= 5):
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'Оценка должна быть от 1 до 5'
-                    })
-
-                # Создаем или обновляем оценку
-                mark, created = StudentMark.objects.update_or_create(
-                    student=student,
-                    lesson_grade_column=lesson_column,
-                    defaults={
-                        'value': value_int,
-                        'comment': comment,
-                        'teacher': teacher
-                    }
-                )
-
-                response_data['mark'] = {
-                    'id': mark.id,
-                    'value': mark.value,
-                    'created': created,
-                    'weight': mark.weight
-                }
-            except ValueError:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Некорректное значение оценки'
-                })
-
-        # Пересчитываем четвертную оценку
-        quarterly_grade, _ = QuarterlyGrade.objects.get_or_create(
-            student=student,
-            subject=lesson_column.lesson.subject,
-            quarter=lesson_column.lesson.quarter
-        )
-        quarterly_grade.save(force_recalculate=True)
-
-        response_data['quarterly_grade'] = {
-            'id': quarterly_grade.id,
-            'grade': quarterly_grade.grade,
-            'calculated_grade': quarterly_grade.calculated_grade,
-            'suggested_grade': quarterly_grade.calculation_details.get('suggested_grade')
-        }
-
-        return JsonResponse(response_data)
-
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
-
-
-@csrf_exempt
-@require_POST
-@login_required
-@teacher_required
-def manage_lesson_columns(request):
-    """Управление столбцами урока"""
-    try:
-        data = json.loads(request.body)
-        action = data.get('action')
-        lesson_id = data.get('lesson_id')
-        column_id = data.get('column_id', None)
-
-        lesson = get_object_or_404(Lesson, id=lesson_id)
-        teacher = request.user.teacher_profile
-
-        # Проверяем права
-        if lesson.teacher != teacher:
-            return JsonResponse({
-                'success': False,
-                'error': 'У вас нет прав для редактирования этого урока'
-            })
-
-        if action == 'add_column':
-            # Добавляем столбец к уроку
-            column = get_object_or_404(GradeColumn, id=column_id)
-
-            # Проверяем, нет ли уже такого столбца
-            if LessonGradeColumn.objects.filter(lesson=lesson, grade_column=column).exists():
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Этот столбец уже добавлен к уроку'
-                })
-
-            # Определяем порядок
-            max_order = LessonGradeColumn.objects.filter(
-                lesson=lesson
-            ).aggregate(models.Max('order'))['order__max'] or 0
-
-            lesson_column = LessonGradeColumn.objects.create(
-                lesson=lesson,
-                grade_column=column,
-                order=max_order + 10
-            )
-
-            return JsonResponse({
-                'success': True,
-                'lesson_column': {
-                    'id': lesson_column.id,
-                    'title': column.title,
-                    'short_title': column.short_title,
-                    'order': lesson_column.order
-                }
-            })
-
-        elif action == 'remove_column':
-            # Удаляем столбец из урока
-            lesson_column = get_object_or_404(LessonGradeColumn, id=column_id)
-
-            # Удаляем все оценки в этом столбце
-            StudentMark.objects.filter(lesson_grade_column=lesson_column).delete()
-            lesson_column.delete()
-
-            return JsonResponse({'success': True})
-
-        elif action == 'reorder_columns':
-            # Изменяем порядок столбцов
-            order_data = data.get('order', [])
-
-            for item in order_data:
-                lesson_column_id = item.get('id')
-                new_order = item.get('order')
-
-                try:
-                    lesson_column = LessonGradeColumn.objects.get(
-                        id=lesson_column_id,
-                        lesson=lesson
-                    )
-                    lesson_column.order = new_order
-                    lesson_column.save()
-                except LessonGradeColumn.DoesNotExist:
-                    continue
-
-            return JsonResponse({'success': True})
-
-        else:
-            return JsonResponse({
-                'success': False,
-                'error': 'Неизвестное действие'
-            })
-
-    except Exception as e:
-        return JsonResponse({'success': False, 'error': str(e)})
-
-
 def quarterly_grades():
     pass
 
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.shortcuts import redirect
 from django.urls import reverse
 
+from journal.audit import audit_request, mark_change_buffer
+from .routers import pin_to_primary
+
 
 class RoleRedirectMiddleware:
     """Middleware для автоматического перенаправления по ролям"""
@@ -26,4 +30,45 @@ class RoleRedirectMiddleware:
                 if role in redirect_urls:
                     return redirect(redirect_urls[role])
 
-        return response
\ No newline at end of file
+        return response
+
+class PrimaryPinMiddleware:
+    """
+    Чтение собственных записей при маршрутизации отчетов на реплику:
+    после изменяющего запроса (POST/PUT/PATCH/DELETE) браузер получает cookie,
+    и пока она жива, чтения пользователя идут в основную базу.
+    """
+    cookie_name = 'pin_primary'
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with pin_to_primary(self.cookie_name in request.COOKIES):
+            response = self.get_response(request)
+
+        if request.method not in self.safe_methods and response.status_code < 400:
+            response.set_cookie(
+                self.cookie_name, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class MarkChangeAuditMiddleware:
+    """
+    Журнал изменений оценок: изменения в запросе подписываются именем маршрута и пользователем.
+    После ответа накопленные записи пишутся в БД, если набралась пачка или истек интервал.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with audit_request(request):
+            response = self.get_response(request)
+        mark_change_buffer.flush_if_due()
+        return response
@@ -0,0 +1,85 @@
+# main/routers.py
+"""
+Маршрутизация чтения отчетов на реплику.
+
+Отчетные пути (статистика, отчеты по нагрузке, выгрузки, проверки) оборачиваются
+в use_replica(): их чтения уходят на базу 'replica', если она настроена.
+Запись всегда идет в 'default'. После записи чтения закрепляются за основной базой:
+до конца текущего запроса - сразу, а на следующие запросы пользователя -
+на REPLICA_PIN_SECONDS через cookie (см. main.middleware.PrimaryPinMiddleware),
+чтобы пользователь видел свои изменения, даже если реплика отстает.
+Закрепление действует только внутри контекста: запроса (PrimaryPinMiddleware) или,
+вне запроса, блока use_replica(); после выхода из него чтения снова идут на реплику.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA_DB_ALIAS = 'replica'
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+# None - контекста закрепления нет (запись ничего не закрепляет)
+_pinned_to_primary = ContextVar('pinned_to_primary', default=None)
+
+
+@contextmanager
+def use_replica():
+    """Контекстный менеджер и декоратор: чтения внутри блока идут на реплику"""
+    token = _read_from_replica.set(True)
+    # Вне запроса запись внутри блока закрепляет чтения за основной базой до конца блока
+    pin_token = _pinned_to_primary.set(False) if _pinned_to_primary.get() is None else None
+    try:
+        yield
+    finally:
+        if pin_token is not None:
+            _pinned_to_primary.reset(pin_token)
+        _read_from_replica.reset(token)
+
+
+@contextmanager
+def pin_to_primary(pinned=True):
+    """Закрепить чтения за основной базой (например, сразу после записи пользователя)"""
+    token = _pinned_to_primary.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned_to_primary.reset(token)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in settings.DATABASES
+
+
+class ReplicaReadMixin:
+    """
+    Для TemplateView: шаблон отрисовывается внутри use_replica(),
+    потому что ленивые QuerySet контекста выполняются при отрисовке
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_replica():
+            response = super().dispatch(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+        return response
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and not _pinned_to_primary.get() and replica_configured():
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Последующие чтения этого запроса (контекста) должны видеть запись
+        if _pinned_to_primary.get() is not None:
+            _pinned_to_primary.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
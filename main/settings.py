@@ -10,22 +10,48 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+from dotenv import load_dotenv
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Настройки окружения читаются из переменных среды и файла .env (см. .env.example)
+load_dotenv(BASE_DIR / '.env')
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_list(name, default=''):
+    return [item.strip() for item in os.environ.get(name, default).split(',') if item.strip()]
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-3z(roy4@a6+odv!$o*dj*x*br6wbt^80mzvi95fu0=+h(8tv&u'
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-3z(roy4@a6+odv!$o*dj*x*br6wbt^80mzvi95fu0=+h(8tv&u'
+)
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_bool('DJANGO_DEBUG', True)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS')
 
 # Application definition
 
@@ -36,7 +62,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    # 'rest_framework',
+    'rest_framework',
     'django_filters',
     'django_bootstrap5',
     'django_bootstrap_icons',
@@ -54,6 +80,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'main.middleware.RoleRedirectMiddleware',
+    'main.middleware.PrimaryPinMiddleware',
+    'main.middleware.MarkChangeAuditMiddleware',
 ]
 
 ROOT_URLCONF = 'main.urls'
@@ -79,12 +107,83 @@ WSGI_APPLICATION = 'main.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'promaks.sqlite3',
-    },
-}
+# Профиль SQLite для продакшена: WAL не блокирует читателей во время записи,
+# PRAGMA применяются к каждому новому соединению (init_command),
+# а транзакции открываются через BEGIN IMMEDIATE - запись сериализуется
+# в начале транзакции и ждет busy_timeout вместо ошибки "database is locked"
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA mmap_size=134217728',
+    'PRAGMA cache_size=-20000',
+]
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite').lower()
+
+if DB_ENGINE in ('postgres', 'postgresql'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'promaks'),
+            'USER': os.environ.get('DB_USER', 'promaks'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # Постоянные соединения: рукопожатие и аутентификация не повторяются на каждый запрос
+            'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        },
+    }
+
+    # Встроенный пул соединений Django 5.1+ (только драйвер psycopg 3 с пакетом psycopg_pool);
+    # с пулом соединения не держатся в потоке, поэтому CONN_MAX_AGE должен быть 0
+    if env_bool('DB_POOL'):
+        if find_spec('psycopg_pool') is None:
+            raise ImproperlyConfigured('DB_POOL требует установленного пакета "psycopg[pool]"')
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+            'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+            'timeout': env_int('DB_POOL_TIMEOUT', 10),
+        }
+elif DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'promaks.sqlite3'),
+            'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 0),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': ';'.join(SQLITE_PRAGMAS),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        },
+    }
+else:
+    raise ImproperlyConfigured(f'Неизвестный DB_ENGINE: {DB_ENGINE} (ожидается sqlite или postgresql)')
+
+# Реплика для чтения отчетов (main.routers.ReplicaRouter). Настройки наследуются от default,
+# переопределяются только имя базы и хост. В тестах реплика зеркалирует default
+if os.environ.get('DB_REPLICA_NAME') or os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['main.routers.ReplicaRouter']
+
+# Сколько секунд после записи чтения пользователя идут в основную базу
+REPLICA_PIN_SECONDS = env_int('DB_REPLICA_PIN_SECONDS', 10)
+
+# Журнал изменений оценок (journal.audit): записи копятся в памяти процесса
+# и пишутся одним bulk_create, когда наберется пачка или пройдет интервал
+MARK_AUDIT_FLUSH_SIZE = env_int('MARK_AUDIT_FLUSH_SIZE', 200)
+MARK_AUDIT_FLUSH_SECONDS = env_int('MARK_AUDIT_FLUSH_SECONDS', 5)
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -134,17 +233,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'users.CustomUser'
 
 # Настройки REST Framework
-# REST_FRAMEWORK = {
-#     'DEFAULT_AUTHENTICATION_CLASSES': [
-#         'rest_framework_simplejwt.authentication.JWTAuthentication',
-#     ],
-#     'DEFAULT_PERMISSION_CLASSES': [
-#         'rest_framework.permissions.IsAuthenticated',
-#     ],
-#     'DEFAULT_FILTER_BACKENDS': [
-#         'django_filters.rest_framework.DjangoFilterBackend',
-#     ],
-# }
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': [
+        'rest_framework.permissions.IsAuthenticated',
+    ],
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'PAGE_SIZE': 50,
+}
 
 # Настройки JWT
 SIMPLE_JWT = {
@@ -152,6 +254,13 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Асинхронные дашборды учителя и ученика (включать при запуске через main.asgi)
+ASYNC_DASHBOARDS = env_bool('ASYNC_DASHBOARDS')
+
+# Обновление открытых журналов через SSE (journal.events). Только при запуске через main.asgi:
+# под WSGI бесконечный поток событий навсегда занимает воркер
+JOURNAL_LIVE_EVENTS = env_bool('JOURNAL_LIVE_EVENTS')
+
 AUTHENTICATION_BACKENDS = [
     'users.authentication.EmailOrUsernameBackend',
 ]
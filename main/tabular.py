@@ -0,0 +1,124 @@
+# main/tabular.py
+"""
+Потоковое чтение табличных файлов импорта (CSV и XLSX).
+
+Строки отдаются по одной словарями {колонка: строковое значение}, файл целиком
+в память не загружается. CSV читается в UTF-8 или, если файл в ней не декодируется,
+в cp1251 (так сохраняет CSV Excel в русской Windows). Для XLSX нужен необязательный
+пакет openpyxl.
+"""
+import codecs
+import csv
+import datetime
+import io
+import os
+import zipfile
+
+# Кодировки CSV в порядке проверки
+CSV_ENCODINGS = ('utf-8-sig', 'cp1251')
+CHUNK_SIZE = 64 * 1024
+
+
+class TableError(ValueError):
+    """Файл не удалось прочитать как таблицу"""
+
+
+def _normalize_header(name, aliases):
+    key = str(name or '').strip().lower()
+    return aliases.get(key, key)
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime.datetime):
+        return value.date().isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return str(value).strip()
+
+
+def _detect_encoding(file):
+    """Первая из CSV_ENCODINGS, в которой декодируется весь файл (проход блоками)"""
+    for encoding in CSV_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        file.seek(0)
+        try:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            continue
+        finally:
+            file.seek(0)
+        return encoding
+    raise TableError('Не удалось прочитать CSV: сохраните файл в кодировке UTF-8')
+
+
+def _iter_csv(file):
+    text = io.TextIOWrapper(file, encoding=_detect_encoding(file), newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        yield from csv.reader(text, dialect)
+    finally:
+        # Не закрываем исходный файл вместе с оберткой
+        text.detach()
+
+
+def _iter_xlsx(file):
+    try:
+        import openpyxl
+    except ImportError:
+        raise TableError('Для чтения XLSX установите пакет openpyxl или сохраните файл в CSV')
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # Поврежденный файл: не zip, нет частей книги, битый XML листа (ParseError - SyntaxError)
+    broken = (zipfile.BadZipFile, InvalidFileException, KeyError, ValueError, SyntaxError)
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except broken:
+        raise TableError('Файл XLSX поврежден или не является книгой Excel')
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    except broken:
+        raise TableError('Файл XLSX поврежден: не удалось прочитать лист')
+    finally:
+        workbook.close()
+
+
+def iter_table_rows(file, filename, aliases=None):
+    """
+    Строки таблицы как словари; заголовок - первая строка файла.
+    aliases - {заголовок в нижнем регистре: имя колонки} для русских и альтернативных названий.
+    Номер строки файла передается в ключе '_line'; пустые строки пропускаются.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        rows = _iter_csv(file)
+    elif extension == '.xlsx':
+        rows = _iter_xlsx(file)
+    else:
+        raise TableError(f'Неподдерживаемый формат файла: {extension or filename} (нужен CSV или XLSX)')
+
+    aliases = aliases or {}
+    header = None
+    for line, values in enumerate(rows, start=1):
+        values = [_cell_text(value) for value in values]
+        if not any(values):
+            continue
+        if header is None:
+            header = [_normalize_header(name, aliases) for name in values]
+            continue
+        row = dict(zip(header, values))
+        row['_line'] = line
+        yield row
+
+    if header is None:
+        raise TableError('Файл пуст или не содержит заголовка')
@@ -0,0 +1,51 @@
+from contextvars import copy_context
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase
+
+from users.models import CustomUser
+from .routers import REPLICA_DB_ALIAS, ReplicaRouter, pin_to_primary, use_replica
+
+
+@mock.patch('main.routers.replica_configured', return_value=True)
+class ReplicaRouterTests(SimpleTestCase):
+    """Закрепление чтений за основной базой после записи действует только внутри контекста"""
+
+    router = ReplicaRouter()
+
+    def read_db(self):
+        with use_replica():
+            return self.router.db_for_read(CustomUser)
+
+    def in_new_context(self, function):
+        return copy_context().run(function)
+
+    def test_write_outside_context_does_not_pin(self, _):
+        def scenario():
+            self.router.db_for_write(CustomUser)
+            return self.read_db()
+        self.assertEqual(self.in_new_context(scenario), REPLICA_DB_ALIAS)
+
+    def test_write_pins_until_end_of_request(self, _):
+        def scenario():
+            with pin_to_primary(False):
+                before = self.read_db()
+                self.router.db_for_write(CustomUser)
+                during = self.read_db()
+            return before, during, self.read_db()
+        self.assertEqual(self.in_new_context(scenario), (REPLICA_DB_ALIAS, DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS))
+
+    def test_write_pins_until_end_of_replica_block(self, _):
+        def scenario():
+            with use_replica():
+                self.router.db_for_write(CustomUser)
+                during = self.router.db_for_read(CustomUser)
+            return during, self.read_db()
+        self.assertEqual(self.in_new_context(scenario), (DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS))
+
+    def test_pin_cookie(self, _):
+        def scenario():
+            with pin_to_primary(True):
+                return self.read_db()
+        self.assertEqual(self.in_new_context(scenario), DEFAULT_DB_ALIAS)
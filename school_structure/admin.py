@@ -1,23 +1,39 @@
 from django.contrib import admin
 from .models import (
-    AcademicYear, Quarter, ClassGroup, Subject,
+    AcademicYear, Quarter, CalendarException, ClassGroup, Subject,
     SubjectHours, TeacherWorkload, Lesson
 )
 
 
+class CalendarExceptionInline(admin.TabularInline):
+    model = CalendarException
+    extra = 0
+
+
 @admin.register(AcademicYear)
 class AcademicYearAdmin(admin.ModelAdmin):
-    list_display = ('year', 'start_date', 'end_date', 'is_current')
+    list_display = ('year', 'start_date', 'end_date', 'is_current', 'study_days_per_week', 'archived_at')
     list_filter = ('is_current',)
     search_fields = ('year',)
+    readonly_fields = ('archived_at',)
+    inlines = [CalendarExceptionInline]
 
 
 @admin.register(Quarter)
 class QuarterAdmin(admin.ModelAdmin):
-    list_display = ('name', 'academic_year', 'start_date', 'end_date', 'is_current', 'week_count')
+    list_display = ('name', 'academic_year', 'start_date', 'end_date', 'is_current', 'week_count', 'school_days')
     list_filter = ('academic_year', 'is_current')
     search_fields = ('name', 'academic_year__year')
-    readonly_fields = ('week_count',)
+    readonly_fields = ('week_count', 'school_days')
+    list_select_related = ('academic_year',)
+
+
+@admin.register(CalendarException)
+class CalendarExceptionAdmin(admin.ModelAdmin):
+    list_display = ('date', 'kind', 'title', 'academic_year')
+    list_filter = ('academic_year', 'kind')
+    search_fields = ('title',)
+    date_hierarchy = 'date'
 
 
 @admin.register(ClassGroup)
@@ -54,6 +70,8 @@ class TeacherWorkloadAdmin(admin.ModelAdmin):
                      'subject_hours__subject__title')
     raw_id_fields = ('teacher', 'subject_hours', 'substitute_for')
     readonly_fields = ('total_hours_in_quarter',)
+    list_select_related = ('teacher__user', 'subject_hours__class_group__academic_year', 'subject_hours__subject',
+                           'quarter__academic_year')
 
     fieldsets = (
         ('Основная информация', {
@@ -0,0 +1,9 @@
+from rest_framework.routers import DefaultRouter
+from .view import TeacherWorkloadViewSet, QuarterViewSet, AcademicYearViewSet
+
+router = DefaultRouter()
+router.register('workloads', TeacherWorkloadViewSet, basename='workload')
+router.register('quarters', QuarterViewSet, basename='quarter')
+router.register('academic-years', AcademicYearViewSet, basename='academic-year')
+
+urlpatterns = router.urls
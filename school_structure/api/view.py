@@ -1,8 +1,15 @@
+import json
+
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated, SAFE_METHODS
 from django_filters.rest_framework import DjangoFilterBackend
+
+from main.routers import use_replica
+from users.permissions import IsAdmin, IsTeacher
 from ..models import TeacherWorkload, Quarter, AcademicYear
 from ..serializers import (
     TeacherWorkloadSerializer,
@@ -10,20 +17,73 @@ from ..serializers import (
     QuarterSerializer,
     AcademicYearSerializer
 )
-from ..utils import calculate_teacher_workload, generate_workload_report
+from ..utils import (
+    calculate_teacher_workload,
+    generate_workload_report,
+    iter_workload_report,
+    report_summary,
+    report_teachers,
+)
+
+
+class AdminWriteMixin:
+    """Чтение - любому вошедшему пользователю, изменения - только администратору"""
+
+    def get_permissions(self):
+        if self.request.method in SAFE_METHODS:
+            return [IsAuthenticated()]
+        return [IsAuthenticated(), IsAdmin()]
 
 
 class TeacherWorkloadViewSet(viewsets.ModelViewSet):
+    """
+    Нагрузка учителей: администратор видит и меняет всю нагрузку, учитель только читает свою,
+    ученикам и родителям доступ закрыт. Отчеты по всем учителям - только администратору.
+    """
     serializer_class = TeacherWorkloadSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['teacher', 'quarter', 'subject_hours']
 
+    # Поля, которые читает TeacherWorkloadSerializer
+    read_fields = (
+        'id', 'teacher', 'subject_hours', 'quarter', 'hours_per_week',
+        'is_substitute', 'substitute_for', 'notes',
+        'teacher__user__first_name', 'teacher__user__last_name',
+        'subject_hours__subject__title',
+        'subject_hours__class_group__name', 'subject_hours__class_group__year_of_study',
+        'quarter__name', 'quarter__start_date', 'quarter__end_date',
+        # Quarter.week_count (total_hours_in_quarter) берет календарь по academic_year_id
+        'quarter__academic_year',
+    )
+
+    def get_permissions(self):
+        if self.action in ('list', 'retrieve', 'teacher_summary'):
+            return [IsAuthenticated(), (IsAdmin | IsTeacher)()]
+        return [IsAuthenticated(), IsAdmin()]
+
     def get_queryset(self):
         user = self.request.user
+        queryset = TeacherWorkload.objects.all()
         if user.role == 'TEACHER':
-            return TeacherWorkload.objects.filter(teacher__user=user)
-        return TeacherWorkload.objects.all()
+            queryset = queryset.filter(teacher__user=user)
+        elif user.role != 'ADMIN':
+            queryset = queryset.none()
+
+        if self.action in ['list', 'retrieve']:
+            queryset = queryset.select_related(
+                'teacher__user',
+                'subject_hours__subject',
+                'subject_hours__class_group',
+                'quarter'
+            ).only(*self.read_fields)
+        elif self.action in ['update', 'partial_update']:
+            # TeacherWorkload.clean() обращается к классу и четверти
+            queryset = queryset.select_related(
+                'subject_hours__class_group',
+                'quarter'
+            )
+        return queryset.order_by('quarter__start_date', 'teacher_id', 'id')
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -44,6 +104,11 @@ class TeacherWorkloadViewSet(viewsets.ModelViewSet):
             )
 
         from ..models import TeacherProfile
+        if request.user.role == 'TEACHER':
+            own_id = TeacherProfile.objects.filter(user=request.user).values_list('id', flat=True).first()
+            if str(own_id) != str(teacher_id):
+                raise PermissionDenied('Учитель может смотреть только свою нагрузку')
+
         try:
             teacher = TeacherProfile.objects.get(id=teacher_id)
         except TeacherProfile.DoesNotExist:
@@ -69,14 +134,13 @@ class TeacherWorkloadViewSet(viewsets.ModelViewSet):
         workload_data = calculate_teacher_workload(teacher, academic_year, quarter)
         return Response(workload_data)
 
-    @action(detail=False, methods=['get'])
-    def generate_report(self, request):
-        """Сгенерировать отчет по нагрузке"""
+    def get_report_params(self, request):
+        """Учебный год и четверть отчета из параметров запроса"""
         academic_year_id = request.query_params.get('academic_year_id')
         quarter_id = request.query_params.get('quarter_id')
 
         if not academic_year_id:
-            return Response(
+            return None, None, Response(
                 {'error': 'Не указан academic_year_id'},
                 status=status.HTTP_400_BAD_REQUEST
             )
@@ -84,7 +148,7 @@ class TeacherWorkloadViewSet(viewsets.ModelViewSet):
         try:
             academic_year = AcademicYear.objects.get(id=academic_year_id)
         except AcademicYear.DoesNotExist:
-            return Response(
+            return None, None, Response(
                 {'error': 'Учебный год не найден'},
                 status=status.HTTP_404_NOT_FOUND
             )
@@ -96,12 +160,51 @@ class TeacherWorkloadViewSet(viewsets.ModelViewSet):
             except Quarter.DoesNotExist:
                 pass
 
-        report = generate_workload_report(academic_year, quarter)
-        return Response(report)
+        return academic_year, quarter, None
 
+    @action(detail=False, methods=['get'])
+    def generate_report(self, request):
+        """Сгенерировать отчет по нагрузке (постранично, по учителям)"""
+        academic_year, quarter, error = self.get_report_params(request)
+        if error:
+            return error
+
+        with use_replica():
+            teachers = report_teachers(academic_year, quarter).values_list('id', flat=True)
+            page = self.paginate_queryset(teachers)
+            if page is None:
+                return Response(generate_workload_report(academic_year, quarter))
+
+            return self.get_paginated_response(
+                list(iter_workload_report(academic_year, quarter, teacher_ids=list(page)))
+            )
 
-class QuarterViewSet(viewsets.ModelViewSet):
-    queryset = Quarter.objects.all()
+    @action(detail=False, methods=['get'])
+    def stream_report(self, request):
+        """Отчет по нагрузке в формате NDJSON: строка на учителя и итоговая строка"""
+        academic_year, quarter, error = self.get_report_params(request)
+        if error:
+            return error
+
+        def rows():
+            # Генератор выполняется уже после выхода из представления
+            with use_replica():
+                teachers_count = 0
+                total_hours_per_week = 0
+                for entry in iter_workload_report(academic_year, quarter):
+                    teachers_count += 1
+                    total_hours_per_week += entry['hours_per_week']
+                    yield json.dumps(entry, ensure_ascii=False) + '\n'
+            yield json.dumps(
+                {'summary': report_summary(teachers_count, total_hours_per_week)},
+                ensure_ascii=False
+            ) + '\n'
+
+        return StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+
+
+class QuarterViewSet(AdminWriteMixin, viewsets.ModelViewSet):
+    queryset = Quarter.objects.select_related('academic_year')
     serializer_class = QuarterSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
@@ -110,7 +213,7 @@ class QuarterViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Получить текущую четверть"""
-        current_quarter = Quarter.objects.filter(is_current=True).first()
+        current_quarter = self.get_queryset().filter(is_current=True).first()
         if not current_quarter:
             return Response(
                 {'error': 'Текущая четверть не установлена'},
@@ -120,7 +223,7 @@ class QuarterViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class AcademicYearViewSet(viewsets.ModelViewSet):
+class AcademicYearViewSet(AdminWriteMixin, viewsets.ModelViewSet):
     queryset = AcademicYear.objects.all()
     serializer_class = AcademicYearSerializer
     permission_classes = [IsAuthenticated]
@@ -0,0 +1,237 @@
+# school_structure/benchmark.py
+"""
+Синтетическая школа для бенчмарков (management-команды bench_*).
+Данные создаются массовыми вставками; команды запускают построение
+внутри транзакции и откатывают ее после замеров.
+"""
+import datetime
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from django.utils import timezone
+
+from journal.models import GradeType, LessonColumn, StudentGrade, Homework, Attendance
+from users.models import CustomUser, TeacherProfile, StudentProfile
+from .models import (
+    AcademicYear, Quarter, ClassGroup, Subject, SubjectHours, TeacherWorkload, Lesson
+)
+
+SUBJECT_TITLES = [
+    'Математика', 'Русский язык', 'Литература', 'Физика', 'Химия', 'Биология',
+    'История', 'Обществознание', 'География', 'Английский язык', 'Информатика',
+    'Физкультура',
+]
+LESSON_TIMES = [
+    (datetime.time(8, 0), datetime.time(8, 45)),
+    (datetime.time(8, 55), datetime.time(9, 40)),
+    (datetime.time(9, 55), datetime.time(10, 40)),
+    (datetime.time(10, 55), datetime.time(11, 40)),
+    (datetime.time(11, 50), datetime.time(12, 35)),
+    (datetime.time(12, 45), datetime.time(13, 30)),
+]
+
+
+class BenchmarkRollback(Exception):
+    """Исключение для отката транзакции после замеров"""
+
+
+@contextmanager
+def measure(label, results):
+    """Замер времени и количества запросов блока кода"""
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - started
+    results.append({
+        'label': label,
+        'seconds': round(elapsed, 4),
+        'queries': len(queries.captured_queries),
+    })
+
+
+def build_demo_school(teachers=100, classes_per_year=3, students_per_class=25,
+                      with_lessons=False, lesson_weeks=2):
+    """
+    Построить учебный год с четвертями, классами, предметами, учителями и нагрузкой.
+    Возвращает словарь с созданными объектами для использования в бенчмарках.
+    """
+    year = AcademicYear.objects.create(
+        year='2000-2001',
+        start_date=datetime.date(2000, 9, 1),
+        end_date=datetime.date(2001, 5, 31),
+    )
+    quarter_dates = [
+        (datetime.date(2000, 9, 1), datetime.date(2000, 10, 27)),
+        (datetime.date(2000, 11, 6), datetime.date(2000, 12, 29)),
+        (datetime.date(2001, 1, 9), datetime.date(2001, 3, 22)),
+        (datetime.date(2001, 4, 1), datetime.date(2001, 5, 31)),
+    ]
+    quarters = Quarter.objects.bulk_create([
+        Quarter(academic_year=year, number=number, name=f'{number}-я четверть',
+                start_date=start, end_date=end)
+        for number, (start, end) in enumerate(quarter_dates, start=1)
+    ])
+
+    subjects = Subject.objects.bulk_create([Subject(title=title) for title in SUBJECT_TITLES])
+    class_groups = ClassGroup.objects.bulk_create([
+        ClassGroup(name=f'{grade}{letter}', year_of_study=grade, academic_year=year,
+                   students_count=students_per_class)
+        for grade in range(1, 12)
+        for letter in 'АБВГД'[:classes_per_year]
+    ])
+
+    password = make_password(None)
+    users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'bench_teacher_{n}', email=f'bench_teacher_{n}@example.com',
+                   first_name='Учитель', last_name=f'Тестовый {n:03d}',
+                   role=CustomUser.Role.TEACHER, password=password)
+        for n in range(teachers)
+    ])
+    teacher_profiles = TeacherProfile.objects.bulk_create([TeacherProfile(user=user) for user in users])
+
+    student_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f'bench_student_{group.id}_{n}',
+                   email=f'bench_student_{group.id}_{n}@example.com',
+                   first_name='Ученик', last_name=f'Тестовый {n:02d}',
+                   role=CustomUser.Role.STUDENT, password=password)
+        for group in class_groups
+        for n in range(students_per_class)
+    ])
+    students = StudentProfile.objects.bulk_create([
+        StudentProfile(user=user, class_group=class_groups[index // students_per_class])
+        for index, user in enumerate(student_users)
+    ])
+
+    subject_hours = SubjectHours.objects.bulk_create([
+        SubjectHours(class_group=group, subject=subject, hours_per_week=2 + (group.year_of_study % 3))
+        for group in class_groups
+        for subject in subjects
+    ])
+
+    # Распределяем предметы по учителям по кругу
+    workloads = TeacherWorkload.objects.bulk_create([
+        TeacherWorkload(
+            teacher=teacher_profiles[index % len(teacher_profiles)],
+            subject_hours=hours,
+            quarter=quarter,
+            hours_per_week=hours.hours_per_week,
+        )
+        for index, hours in enumerate(subject_hours)
+        for quarter in quarters
+    ])
+
+    lessons = []
+    if with_lessons:
+        quarter = quarters[0]
+        monday = quarter.start_date - datetime.timedelta(days=quarter.start_date.weekday())
+        teacher_by_hours = {
+            hours.id: teacher_profiles[index % len(teacher_profiles)]
+            for index, hours in enumerate(subject_hours)
+        }
+        by_class = {}
+        for hours in subject_hours:
+            by_class.setdefault(hours.class_group_id, []).append(hours)
+
+        for group in class_groups:
+            day_slots = [
+                (week, day, number)
+                for week in range(lesson_weeks)
+                for day in range(5)
+                for number in range(len(LESSON_TIMES))
+            ]
+            plan = [hours for hours in by_class[group.id] for _ in range(hours.hours_per_week)]
+            for (week, day, number), hours in zip(day_slots, plan * lesson_weeks):
+                date = monday + datetime.timedelta(weeks=week + 1, days=day)
+                start_time, end_time = LESSON_TIMES[number]
+                lessons.append(Lesson(
+                    subject_id=hours.subject_id,
+                    teacher=teacher_by_hours[hours.id],
+                    class_group=group,
+                    quarter=quarter,
+                    classroom=str(100 + group.id % 50),
+                    date=date,
+                    lesson_number=number + 1,
+                    start_time=start_time,
+                    end_time=end_time,
+                ))
+        lessons = Lesson.objects.bulk_create(lessons)
+
+    return {
+        'academic_year': year,
+        'quarters': quarters,
+        'subjects': subjects,
+        'class_groups': class_groups,
+        'teachers': teacher_profiles,
+        'students': students,
+        'subject_hours': subject_hours,
+        'workloads': workloads,
+        'lessons': lessons,
+    }
+
+
+def add_demo_journal(school, homework=False, attendance=False):
+    """
+    Заполнить журнал синтетической школы: оценка каждому ученику за каждый урок,
+    при необходимости - домашнее задание к уроку и посещаемость.
+    Требует школы, построенной с with_lessons=True.
+    """
+    grade_type = GradeType.objects.create(title='Бенчмарк', short_title='Б')
+    school['grade_type'] = grade_type
+
+    columns = LessonColumn.objects.bulk_create([
+        LessonColumn(lesson=lesson, grade_type=grade_type, title=grade_type.title)
+        for lesson in school['lessons']
+    ])
+    students_by_class = {}
+    for student in school['students']:
+        students_by_class.setdefault(student.class_group_id, []).append(student)
+
+    StudentGrade.objects.bulk_create([
+        StudentGrade(student=student, lesson_column=column,
+                     value=2 + (student.id + column.id) % 4,
+                     teacher=column.lesson.teacher).fill_denormalized(column)
+        for column in columns
+        for student in students_by_class.get(column.lesson.class_group_id, [])
+    ], batch_size=2000)
+
+    if homework:
+        now = timezone.now()
+        Homework.objects.bulk_create([
+            Homework(lesson=lesson, content=f'Задание к уроку {lesson.id}',
+                     deadline=now + datetime.timedelta(days=index % 30 - 15))
+            for index, lesson in enumerate(school['lessons'])
+        ], batch_size=2000)
+
+    if attendance:
+        statuses = ['PRESENT'] * 8 + ['ABSENT', 'LATE']
+        Attendance.objects.bulk_create([
+            Attendance(student=student, lesson=lesson, status=statuses[(student.id + lesson.id) % 10])
+            for lesson in school['lessons']
+            for student in students_by_class.get(lesson.class_group_id, [])
+        ], batch_size=2000)
+    return school
+
+
+def drop_demo_school(school):
+    """Удалить синтетическую школу, созданную вне откатываемой транзакции"""
+    year = school['academic_year']
+    user_ids = [teacher.user_id for teacher in school['teachers']]
+    user_ids += [student.user_id for student in school['students']]
+
+    # Связи учебного года защищены от удаления (PROTECT), поэтому удаляем снизу вверх
+    Attendance.objects.filter(lesson__quarter__academic_year=year).delete()
+    Homework.objects.filter(lesson__quarter__academic_year=year).delete()
+    TeacherWorkload.objects.filter(quarter__academic_year=year).delete()
+    Lesson.objects.filter(quarter__academic_year=year).delete()
+    SubjectHours.objects.filter(class_group__academic_year=year).delete()
+    CustomUser.objects.filter(id__in=user_ids).delete()
+    ClassGroup.objects.filter(academic_year=year).delete()
+    Quarter.objects.filter(academic_year=year).delete()
+    year.delete()
+    Subject.objects.filter(id__in=[subject.id for subject in school['subjects']]).delete()
+    if 'grade_type' in school:
+        school['grade_type'].delete()
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_started, request_finished
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from school_structure.models import Quarter
+
+
+class Command(BaseCommand):
+    help = (
+        'Стоимость установки соединения с БД на запрос: новое соединение на каждый запрос '
+        '(CONN_MAX_AGE=0) против постоянного соединения или пула из настроек'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Запросов на режим')
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        configured = settings_dict['CONN_MAX_AGE']
+        pooled = bool(settings_dict['OPTIONS'].get('pool'))
+
+        self.stdout.write(f"{connection.vendor}, CONN_MAX_AGE={configured}, пул: {'да' if pooled else 'нет'}")
+
+        modes = [('Новое соединение на запрос', 0)]
+        if pooled:
+            modes.append(('Пул соединений', 0))
+        else:
+            modes.append(('Постоянное соединение', configured or 600))
+
+        try:
+            for label, max_age in modes:
+                settings_dict['CONN_MAX_AGE'] = max_age
+                connection.close()
+                self.report(label, *self.simulate(options['requests']))
+        finally:
+            settings_dict['CONN_MAX_AGE'] = configured
+            connection.close()
+
+    def simulate(self, requests):
+        """Цикл запроса как в обработчике Django: сигналы начала и конца запроса и один запрос к БД"""
+        opened = []
+
+        def count_connection(sender, **kwargs):
+            opened.append(kwargs['connection'].alias)
+
+        connection_created.connect(count_connection)
+        try:
+            started = time.perf_counter()
+            for _ in range(requests):
+                request_started.send(sender=self.__class__)
+                Quarter.objects.filter(is_current=True).exists()
+                request_finished.send(sender=self.__class__)
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count_connection)
+        return requests, elapsed, len(opened)
+
+    def report(self, label, requests, elapsed, opened):
+        self.stdout.write(
+            f'{label:<28} {elapsed / requests * 1000:>8.3f} мс/запрос, '
+            f'открыто соединений: {opened}'
+        )
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from school_structure.benchmark import build_demo_school, measure, BenchmarkRollback
+from school_structure.utils import calculate_teacher_workload
+
+
+class Command(BaseCommand):
+    help = 'Бенчмарк расчета нагрузки учителей на синтетической школе (данные откатываются)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teachers', type=int, default=100, help='Количество учителей')
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                with measure('Построение школы', results):
+                    school = build_demo_school(teachers=options['teachers'], students_per_class=0)
+
+                teachers = school['teachers']
+                year = school['academic_year']
+                quarter = school['quarters'][0]
+
+                with measure(f'Нагрузка за год, {len(teachers)} учителей', results):
+                    for teacher in teachers:
+                        calculate_teacher_workload(teacher, academic_year=year)
+
+                with measure(f'Нагрузка за четверть, {len(teachers)} учителей', results):
+                    for teacher in teachers:
+                        calculate_teacher_workload(teacher, quarter=quarter)
+
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+
+        for row in results:
+            self.stdout.write(f"{row['label']:<45} {row['seconds']:>9.4f} с {row['queries']:>7} запросов")
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from school_structure.models import Quarter
+from school_structure.timetable import load_period_lessons, find_conflicts
+
+
+class Command(BaseCommand):
+    help = 'Поиск пересечений в расписании (учитель, кабинет, класс)'
+
+    DIMENSION_TITLES = {
+        'teacher': 'Учитель',
+        'classroom': 'Кабинет',
+        'class_group': 'Класс',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quarter', type=int, help='ID четверти (по умолчанию текущая)')
+        parser.add_argument('--date-from', help='Начало периода (ГГГГ-ММ-ДД)')
+        parser.add_argument('--date-to', help='Конец периода (ГГГГ-ММ-ДД)')
+
+    def handle(self, *args, **options):
+        quarter_id = options.get('quarter')
+        date_from = options.get('date_from')
+        date_to = options.get('date_to')
+
+        quarter = None
+        if quarter_id:
+            try:
+                quarter = Quarter.objects.get(id=quarter_id)
+            except Quarter.DoesNotExist:
+                raise CommandError(f'Четверть с ID={quarter_id} не найдена')
+        elif not (date_from or date_to):
+            quarter = Quarter.objects.filter(is_current=True).first()
+            if not quarter:
+                raise CommandError('Текущая четверть не установлена, укажите --quarter или период')
+
+        lessons = load_period_lessons(quarter=quarter, date_from=date_from, date_to=date_to)
+        self.stdout.write(f'Загружено уроков: {len(lessons)}')
+
+        conflicts = find_conflicts(lessons)
+        if not conflicts:
+            self.stdout.write(self.style.SUCCESS('Пересечений в расписании не найдено'))
+            return
+
+        self.stdout.write(self.style.ERROR(f'Найдено пересечений: {len(conflicts)}'))
+        for conflict in conflicts:
+            first_id, second_id = conflict['lessons']
+            first_number, second_number = conflict['lesson_numbers']
+            self.stdout.write(
+                f"  {conflict['date']} {self.DIMENSION_TITLES[conflict['dimension']]} {conflict['key']}: "
+                f"урок ID={first_id} (№{first_number}) и урок ID={second_id} (№{second_number})"
+            )
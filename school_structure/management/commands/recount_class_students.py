@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from school_structure.models import ClassGroup
+from school_structure.utils import recount_class_students
+
+
+class Command(BaseCommand):
+    help = 'Сверка счетчика учеников класса (ClassGroup.students_count) с фактическими данными'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, help='ID учебного года (по умолчанию все классы)')
+
+    def handle(self, *args, **options):
+        class_groups = None
+        if options.get('year'):
+            class_groups = ClassGroup.objects.filter(academic_year_id=options['year']).values('pk')
+
+        fixed = recount_class_students(class_groups)
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'Исправлено счетчиков: {fixed}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Счетчики учеников актуальны'))
@@ -0,0 +1,61 @@
+import csv
+import datetime
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.routers import use_replica
+from school_structure.models import Quarter
+from school_structure.utils import workload_compliance_report
+
+FIELDS = [
+    'teacher_id', 'teacher', 'quarter_id', 'quarter', 'hours_per_week', 'weeks',
+    'planned_hours', 'actual_hours', 'difference', 'compliance',
+]
+
+
+class Command(BaseCommand):
+    help = 'Отчет о выполнении плановой нагрузки учителями (CSV/JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Начало периода (ГГГГ-ММ-ДД), по умолчанию начало текущей четверти')
+        parser.add_argument('--end', help='Конец периода (ГГГГ-ММ-ДД), по умолчанию конец текущей четверти')
+        parser.add_argument('--format', choices=['csv', 'json'], default='csv', help='Формат выгрузки')
+        parser.add_argument('--output', help='Файл для сохранения (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        # Выгрузка только читает данные - выполняем ее на реплике
+        with use_replica():
+            start, end = self.get_period(options.get('start'), options.get('end'))
+            rows = workload_compliance_report(start, end)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                self.write_report(rows, options['format'], output)
+            self.stdout.write(self.style.SUCCESS(f'Сохранено строк: {len(rows)} в {options["output"]}'))
+        else:
+            self.write_report(rows, options['format'], self.stdout)
+
+    def get_period(self, start, end):
+        try:
+            start = datetime.date.fromisoformat(start) if start else None
+            end = datetime.date.fromisoformat(end) if end else None
+        except ValueError as e:
+            raise CommandError(f'Некорректная дата: {e}')
+
+        if not (start and end):
+            quarter = Quarter.objects.filter(is_current=True).first()
+            if not quarter:
+                raise CommandError('Текущая четверть не установлена, укажите --start и --end')
+            start = start or quarter.start_date
+            end = end or quarter.end_date
+        return start, end
+
+    def write_report(self, rows, report_format, output):
+        if report_format == 'json':
+            output.write(json.dumps(rows, ensure_ascii=False, indent=2))
+            output.write('\n')
+        else:
+            writer = csv.DictWriter(output, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
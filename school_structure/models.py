@@ -3,7 +3,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from users.models import TeacherProfile
-import datetime
 
 
 class AcademicYear(models.Model):
@@ -13,6 +12,13 @@ class AcademicYear(models.Model):
     start_date = models.DateField(verbose_name='Начало учебного года')
     end_date = models.DateField(verbose_name='Окончание учебного года')
     is_current = models.BooleanField(default=False, verbose_name='Текущий учебный год')
+    study_days_per_week = models.PositiveSmallIntegerField(
+        choices=[(5, 'Пятидневная неделя'), (6, 'Шестидневная неделя')],
+        default=5,
+        verbose_name='Учебных дней в неделе'
+    )
+    # Оценки и посещаемость года перенесены в архивные таблицы (команда archive_year)
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Перенесен в архив')
 
     class Meta:
         verbose_name = 'Учебный год'
@@ -22,6 +28,10 @@ class AcademicYear(models.Model):
     def __str__(self):
         return self.year
 
+    @property
+    def is_archived(self):
+        return self.archived_at is not None
+
     def save(self, *args, **kwargs):
         # Если отмечаем текущий год, снимаем флаг с других
         if self.is_current:
@@ -62,33 +72,15 @@ class Quarter(models.Model):
 
     @property
     def week_count(self):
-        # """Количество учебных недель в четверти"""
-        # # from dateutil.relativedelta import relativedelta
-        # weeks = 0
-        #
-        # current_date = self.start_date
-        # while self.start_date and current_date <= self.end_date:
-        #     # Считаем только понедельники как начало учебных недель
-        #     if current_date.weekday() == 0:
-        #         weeks += 1
-        #     current_date += datetime.timedelta(days=1)
-        # return weeks or 1  # минимум 1 неделя
-
-        """Количество учебных недель в четверти (понедельников)"""
-        if not (self.start_date and self.end_date):
-            return 0
-        # Находим первый понедельник на или после start_date
-        days_ahead = 0 - self.start_date.weekday()  # weekday() для понедельника = 0
-        if days_ahead < 0:
-            days_ahead += 7
-        first_monday = self.start_date + datetime.timedelta(days=days_ahead)
-
-        # Если первый понедельник уже после конца четверти, недель 0
-        if first_monday > self.end_date:
-            return 0
-
-        # Считаем количество понедельников от first_monday до end_date
-        return ((self.end_date - first_monday).days // 7) + 1
+        """Количество учебных недель в четверти с учетом праздников и переносов (см. SchoolCalendar)"""
+        from .school_calendar import get_school_calendar
+        return get_school_calendar(self.academic_year_id).school_weeks(self.start_date, self.end_date)
+
+    @property
+    def school_days(self):
+        """Количество учебных дней в четверти"""
+        from .school_calendar import get_school_calendar
+        return get_school_calendar(self.academic_year_id).school_days(self.start_date, self.end_date)
 
     def save(self, *args, **kwargs):
         # Проверяем пересечение дат с другими четвертями
@@ -107,6 +99,37 @@ class Quarter(models.Model):
         super().save(*args, **kwargs)
 
 
+class CalendarException(models.Model):
+    """
+    Исключение учебного календаря: праздник, сокращенный день или перенесенный рабочий день.
+    Учебные дни года - дни четвертей по режиму недели года с учетом этих исключений.
+    """
+    class Kind(models.TextChoices):
+        HOLIDAY = 'HOLIDAY', 'Выходной (праздник)'
+        SHORTENED = 'SHORTENED', 'Сокращенный день'
+        WORKDAY = 'WORKDAY', 'Рабочий день (перенос)'
+
+    academic_year = models.ForeignKey(
+        AcademicYear,
+        on_delete=models.CASCADE,
+        related_name='calendar_exceptions',
+        verbose_name='Учебный год'
+    )
+    date = models.DateField(verbose_name='Дата')
+    kind = models.CharField(max_length=20, choices=Kind.choices, verbose_name='Тип дня')
+    title = models.CharField(max_length=100, blank=True, verbose_name='Название',
+                             help_text='Например: "День народного единства"')
+
+    class Meta:
+        verbose_name = 'Исключение календаря'
+        verbose_name_plural = 'Исключения календаря'
+        ordering = ['date']
+        unique_together = ['academic_year', 'date']
+
+    def __str__(self):
+        return f'{self.date}: {self.get_kind_display()}'
+
+
 class ClassGroup(models.Model):
     """Класс (учебная группа)"""
     name = models.CharField(max_length=20, verbose_name='Название класса')
@@ -128,6 +151,8 @@ class ClassGroup(models.Model):
         related_name='class_groups',
         verbose_name='Учебный год'
     )
+    # Счетчик поддерживается сигналами StudentProfile (users.signals),
+    # сверка после массовых операций - команда recount_class_students
     students_count = models.PositiveIntegerField(
         default=0,
         verbose_name='Количество учеников'
@@ -142,18 +167,14 @@ class ClassGroup(models.Model):
     def __str__(self):
         return f'{self.year_of_study}-{self.name} ({self.academic_year})'
 
-    """
-    ClassGroup.save(): Пересчет students_count при каждом сохранении класса неэффективен, если учеников много. 
-    Лучше использовать аннотацию Count в запросах там, где нужна эта цифра. Рассмотрите возможность удаления этого 
-    поля и вычисления "на лету" или по сигналу.
-    """
     def save(self, *args, **kwargs):
-        # Обновляем количество учеников при сохранении
-        if self.pk:
-            from users.models import StudentProfile
-            self.students_count = StudentProfile.objects.filter(
-                class_group=self
-            ).count()
+        # Счетчик учеников меняется только атомарными F()-обновлениями:
+        # сохранение существующего класса не перезаписывает его значением из памяти
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'students_count'
+            ]
         super().save(*args, **kwargs)
 
 
@@ -337,6 +358,8 @@ class Lesson(models.Model):
             models.Index(fields=['date', 'class_group']),
             models.Index(fields=['teacher', 'date']),
             models.Index(fields=['quarter', 'class_group']),
+            # Уроки журнала класса по предмету за четверть в порядке дат
+            models.Index(fields=['class_group', 'subject', 'quarter', 'date'], name='lesson_class_subject_quarter'),
         ]
 
     def __str__(self):
@@ -0,0 +1,16 @@
+# school_structure/periods.py
+"""Арифметика учебных периодов без обращения к БД"""
+
+
+def count_mondays(start_date, end_date):
+    """
+    Количество понедельников в отрезке [start_date, end_date] за O(1).
+    Понедельник считается началом учебной недели.
+    """
+    if not (start_date and end_date) or start_date > end_date:
+        return 0
+    # Первый понедельник на или после start_date (weekday() понедельника = 0)
+    first_monday = start_date.toordinal() + (-start_date.weekday()) % 7
+    if first_monday > end_date.toordinal():
+        return 0
+    return (end_date.toordinal() - first_monday) // 7 + 1
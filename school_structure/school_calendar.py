@@ -0,0 +1,123 @@
+# school_structure/school_calendar.py
+"""
+Индекс учебных дней учебного года.
+
+Учебный день - день одной из четвертей года, рабочий по режиму недели года
+(пятидневка или шестидневка), если он не объявлен праздником; перенесенные
+рабочие дни (CalendarException.WORKDAY) учебные в любой день недели.
+Индекс - отсортированный массив порядковых номеров дат (date.toordinal()), строится
+один раз на год и хранится в кеше; количество учебных дней и недель между датами
+считается двоичным поиском за O(log n).
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+
+CACHE_KEY = 'school_calendar:{}'
+# Страховка на случай изменений в обход сигналов (QuerySet.update, bulk_create)
+CACHE_SECONDS = 60 * 60
+
+
+class SchoolCalendar:
+    """Учебные и сокращенные дни года как отсортированные массивы номеров дат"""
+
+    def __init__(self, days=(), shortened=(), study_days_per_week=5):
+        self.days = array('l', sorted(days))
+        self.shortened = array('l', sorted(shortened))
+        self.study_days_per_week = study_days_per_week
+
+    @classmethod
+    def build(cls, study_days_per_week, periods, exceptions):
+        """
+        periods - пары (начало, конец) четвертей, exceptions - пары (дата, тип исключения).
+        Проходит дни четвертей один раз; используется при заполнении кеша.
+        """
+        from .models import CalendarException
+
+        kinds = dict(exceptions)
+        days = []
+        for start_date, end_date in periods:
+            day = start_date
+            while day <= end_date:
+                kind = kinds.get(day)
+                if kind == CalendarException.Kind.WORKDAY or (
+                    kind != CalendarException.Kind.HOLIDAY and day.weekday() < study_days_per_week
+                ):
+                    days.append(day.toordinal())
+                day += timedelta(days=1)
+
+        school_days = set(days)
+        shortened = [
+            day.toordinal() for day, kind in kinds.items()
+            if kind == CalendarException.Kind.SHORTENED and day.toordinal() in school_days
+        ]
+        return cls(school_days, shortened, study_days_per_week)
+
+    @staticmethod
+    def _count(values, start_date, end_date):
+        if start_date > end_date:
+            return 0
+        return bisect_right(values, end_date.toordinal()) - bisect_left(values, start_date.toordinal())
+
+    def is_school_day(self, day):
+        return self._count(self.days, day, day) == 1
+
+    def school_days(self, start_date, end_date):
+        """Количество учебных дней в отрезке [start_date, end_date]"""
+        return self._count(self.days, start_date, end_date)
+
+    def shortened_days(self, start_date, end_date):
+        """Количество сокращенных учебных дней в отрезке [start_date, end_date]"""
+        return self._count(self.shortened, start_date, end_date)
+
+    def school_weeks(self, start_date, end_date):
+        """
+        Учебные недели в отрезке: учебные дни в пересчете на полные недели режима года
+        (с округлением). Для четверти из полных недель без праздников - число понедельников.
+        """
+        days = self.school_days(start_date, end_date)
+        return (2 * days + self.study_days_per_week) // (2 * self.study_days_per_week)
+
+    def iter_school_days(self, start_date, end_date):
+        """Учебные дни отрезка по порядку"""
+        start = bisect_left(self.days, start_date.toordinal())
+        stop = bisect_right(self.days, end_date.toordinal())
+        for ordinal in self.days[start:stop]:
+            yield date.fromordinal(ordinal)
+
+
+def load_school_calendar(academic_year_id):
+    """Построить индекс года из БД (три запроса)"""
+    from .models import AcademicYear, CalendarException, Quarter
+
+    study_days_per_week = AcademicYear.objects.filter(
+        id=academic_year_id
+    ).values_list('study_days_per_week', flat=True).first() or 5
+    periods = Quarter.objects.filter(
+        academic_year_id=academic_year_id
+    ).order_by('start_date').values_list('start_date', 'end_date')
+    exceptions = CalendarException.objects.filter(
+        academic_year_id=academic_year_id
+    ).values_list('date', 'kind')
+    return SchoolCalendar.build(study_days_per_week, periods, exceptions)
+
+
+def get_school_calendar(academic_year):
+    """Индекс учебных дней года (объект AcademicYear или его id) из кеша"""
+    academic_year_id = getattr(academic_year, 'pk', academic_year)
+    key = CACHE_KEY.format(academic_year_id)
+    school_calendar = cache.get(key)
+    if school_calendar is None:
+        school_calendar = load_school_calendar(academic_year_id)
+        cache.set(key, school_calendar, CACHE_SECONDS)
+    return school_calendar
+
+
+def invalidate_school_calendar(academic_year_id):
+    """Сбросить индекс года сразу и после фиксации транзакции (чтобы не закешировать незафиксированное)"""
+    key = CACHE_KEY.format(academic_year_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,79 @@
+# school_structure/serializers.py
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import serializers
+from .models import TeacherWorkload, Quarter, AcademicYear
+
+
+class AcademicYearSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AcademicYear
+        fields = ['id', 'year', 'start_date', 'end_date', 'is_current']
+
+
+class QuarterSerializer(serializers.ModelSerializer):
+    academic_year_name = serializers.CharField(source='academic_year.year', read_only=True)
+    week_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Quarter
+        fields = ['id', 'academic_year', 'academic_year_name', 'number', 'name',
+                  'start_date', 'end_date', 'is_current', 'week_count']
+
+    def create(self, validated_data):
+        # Quarter.save() сообщает о пересечении четвертей через ValueError
+        try:
+            return super().create(validated_data)
+        except ValueError as e:
+            raise serializers.ValidationError({'non_field_errors': [str(e)]})
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except ValueError as e:
+            raise serializers.ValidationError({'non_field_errors': [str(e)]})
+
+
+class TeacherWorkloadSerializer(serializers.ModelSerializer):
+    """Нагрузка учителя для чтения (поля связанных моделей загружаются через select_related)"""
+    teacher_name = serializers.SerializerMethodField()
+    subject = serializers.CharField(source='subject_hours.subject.title', read_only=True)
+    class_group = serializers.SerializerMethodField()
+    quarter_name = serializers.CharField(source='quarter.name', read_only=True)
+    total_hours_in_quarter = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = TeacherWorkload
+        fields = ['id', 'teacher', 'teacher_name', 'subject_hours', 'subject', 'class_group',
+                  'quarter', 'quarter_name', 'hours_per_week', 'total_hours_in_quarter',
+                  'is_substitute', 'substitute_for', 'notes']
+        read_only_fields = fields
+
+    def get_teacher_name(self, obj):
+        user = obj.teacher.user
+        return f'{user.last_name} {user.first_name}'.strip()
+
+    def get_class_group(self, obj):
+        class_group = obj.subject_hours.class_group
+        return f'{class_group.year_of_study}-{class_group.name}'
+
+
+class TeacherWorkloadCreateSerializer(serializers.ModelSerializer):
+    """Создание и изменение нагрузки с проверками TeacherWorkload.clean()"""
+
+    class Meta:
+        model = TeacherWorkload
+        fields = ['id', 'teacher', 'subject_hours', 'quarter', 'hours_per_week',
+                  'is_substitute', 'substitute_for', 'notes']
+
+    def validate(self, attrs):
+        instance = TeacherWorkload(**{**self.get_instance_data(), **attrs})
+        try:
+            instance.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'non_field_errors': e.messages})
+        return attrs
+
+    def get_instance_data(self):
+        if not self.instance:
+            return {}
+        return {field: getattr(self.instance, field) for field in self.Meta.fields if field != 'id'}
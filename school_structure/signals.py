@@ -0,0 +1,18 @@
+# school_structure/signals.py
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import AcademicYear, Quarter, CalendarException
+from .school_calendar import invalidate_school_calendar
+
+
+@receiver([post_save, post_delete], sender=AcademicYear)
+def academic_year_changed(sender, instance, **kwargs):
+    invalidate_school_calendar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Quarter)
+@receiver([post_save, post_delete], sender=CalendarException)
+def calendar_changed(sender, instance, **kwargs):
+    """Изменились границы четверти или исключения календаря - индекс года строится заново"""
+    invalidate_school_calendar(instance.academic_year_id)
@@ -1,3 +1,223 @@
+import datetime
+
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from users.models import CustomUser
+from .benchmark import build_demo_school
+from .models import Lesson, TeacherWorkload
+from .school_calendar import get_school_calendar
+from .timetable import TimetableConflictError, check_new_lessons
+from .utils import generate_schedule
+
+
+class WorkloadApiQueriesTests(TestCase):
+    """Число запросов API нагрузки не зависит от числа строк на странице"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=3, classes_per_year=2, students_per_class=0)
+        cls.admin = CustomUser.objects.create(username='api_admin', email='api_admin@example.com',
+                                              role=CustomUser.Role.ADMIN)
+        cls.teacher = cls.school['teachers'][0]
+
+    def setUp(self):
+        # Календарь года берется из кеша: прогреваем его, чтобы считать только запросы представления
+        cache.clear()
+        get_school_calendar(self.school['academic_year'].id)
+        self.client = APIClient()
+
+    def test_list(self):
+        self.client.force_authenticate(self.admin)
+        # count, страница с select_related
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/school/workloads/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 50)
+        self.assertTrue(all(row['total_hours_in_quarter'] for row in response.data['results']))
+
+    def test_list_as_teacher(self):
+        self.client.force_authenticate(self.teacher.user)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/school/workloads/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'])
+        self.assertEqual({row['teacher'] for row in response.data['results']}, {self.teacher.id})
+
+    def test_retrieve(self):
+        self.client.force_authenticate(self.admin)
+        workload = self.school['workloads'][0]
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/school/workloads/{workload.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], workload.id)
+
+    def test_quarters(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/school/quarters/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 4)
+
+        quarter = self.school['quarters'][0]
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/school/quarters/{quarter.id}/')
+        self.assertEqual(response.data['week_count'], quarter.week_count)
+
+    def test_academic_years(self):
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/school/academic-years/')
+        self.assertEqual(response.status_code, 200)
+
+        year = self.school['academic_year']
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/school/academic-years/{year.id}/')
+        self.assertEqual(response.data['id'], year.id)
+
+
+class SchoolApiPermissionsTests(TestCase):
+    """Изменять учебные годы, четверти и нагрузку может только администратор"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=2, classes_per_year=1, students_per_class=1)
+        cls.admin = CustomUser.objects.create(username='api_admin', email='api_admin@example.com',
+                                              role=CustomUser.Role.ADMIN)
+        cls.parent = CustomUser.objects.create(username='api_parent', email='api_parent@example.com',
+                                               role=CustomUser.Role.PARENT)
+        cls.student = cls.school['students'][0].user
+        cls.teacher = cls.school['teachers'][0]
+
+    def setUp(self):
+        self.client = APIClient()
+        year = self.school['academic_year']
+        quarter = self.school['quarters'][0]
+        workload = self.school['workloads'][0]
+        # (адрес списка, адрес объекта, данные для создания и изменения)
+        self.endpoints = [
+            ('/api/school/academic-years/', f'/api/school/academic-years/{year.id}/',
+             {'year': '2099-2100', 'start_date': '2099-09-01', 'end_date': '2100-05-31', 'is_current': True}),
+            ('/api/school/quarters/', f'/api/school/quarters/{quarter.id}/',
+             {'academic_year': year.id, 'number': 9, 'name': 'x', 'start_date': '2001-06-01',
+              'end_date': '2001-06-02', 'is_current': True}),
+            ('/api/school/workloads/', f'/api/school/workloads/{workload.id}/',
+             {'teacher': self.teacher.id, 'subject_hours': workload.subject_hours_id,
+              'quarter': quarter.id, 'hours_per_week': 1}),
+        ]
+
+    def test_non_admin_cannot_write(self):
+        for user in (self.student, self.parent, self.teacher.user):
+            self.client.force_authenticate(user)
+            for list_url, detail_url, data in self.endpoints:
+                with self.subTest(user=user.role, url=list_url):
+                    self.assertEqual(self.client.post(list_url, data, format='json').status_code, 403)
+                    self.assertEqual(self.client.patch(detail_url, data, format='json').status_code, 403)
+                    self.assertEqual(self.client.delete(detail_url).status_code, 403)
+
+        year = self.school['academic_year']
+        year.refresh_from_db()
+        self.assertEqual(year.year, '2000-2001')
+        self.assertTrue(TeacherWorkload.objects.filter(id=self.school['workloads'][0].id).exists())
+
+    def test_admin_can_write(self):
+        self.client.force_authenticate(self.admin)
+        quarter = self.school['quarters'][0]
+        response = self.client.patch(f'/api/school/quarters/{quarter.id}/', {'name': 'Осень'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        quarter.refresh_from_db()
+        self.assertEqual(quarter.name, 'Осень')
+
+    def test_calendar_is_readable_by_everyone(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get('/api/school/quarters/').status_code, 200)
+        self.assertEqual(self.client.get('/api/school/academic-years/').status_code, 200)
+
+    def test_workloads_hidden_from_students_and_parents(self):
+        workload = self.school['workloads'][0]
+        for user in (self.student, self.parent):
+            self.client.force_authenticate(user)
+            with self.subTest(user=user.role):
+                self.assertEqual(self.client.get('/api/school/workloads/').status_code, 403)
+                self.assertEqual(self.client.get(f'/api/school/workloads/{workload.id}/').status_code, 403)
+                self.assertEqual(self.client.get('/api/school/workloads/teacher_summary/',
+                                                 {'teacher_id': self.teacher.id}).status_code, 403)
+                self.assertEqual(self.client.get('/api/school/workloads/generate_report/',
+                                                 {'academic_year_id': self.school['academic_year'].id}).status_code, 403)
+
+    def test_teacher_sees_only_own_workload(self):
+        other = self.school['teachers'][1]
+        self.client.force_authenticate(self.teacher.user)
+        summary = '/api/school/workloads/teacher_summary/'
+        self.assertEqual(self.client.get(summary, {'teacher_id': self.teacher.id}).status_code, 200)
+        self.assertEqual(self.client.get(summary, {'teacher_id': other.id}).status_code, 403)
+
+        other_workload = TeacherWorkload.objects.filter(teacher=other).first()
+        self.assertEqual(self.client.get(f'/api/school/workloads/{other_workload.id}/').status_code, 404)
+        self.assertEqual(self.client.get('/api/school/workloads/stream_report/',
+                                         {'academic_year_id': self.school['academic_year'].id}).status_code, 403)
+
+
+class TimetableConflictTests(TestCase):
+    """Проверка пересечений перед массовым созданием уроков"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.school = build_demo_school(teachers=2, classes_per_year=1, students_per_class=0,
+                                       with_lessons=True, lesson_weeks=1)
+        cls.lesson = Lesson.objects.order_by('id').first()
+        cls.other_class = next(group for group in cls.school['class_groups'] if group != cls.lesson.class_group)
+        cls.other_teacher = next(teacher for teacher in cls.school['teachers'] if teacher != cls.lesson.teacher)
+
+    def new_lesson(self, **fields):
+        lesson = self.lesson
+        values = {
+            'subject_id': lesson.subject_id, 'teacher': self.other_teacher, 'class_group': self.other_class,
+            'quarter_id': lesson.quarter_id, 'classroom': 'X-1', 'date': lesson.date,
+            'lesson_number': lesson.lesson_number, 'start_time': lesson.start_time, 'end_time': lesson.end_time,
+        }
+        values.update(fields)
+        return Lesson(**values)
+
+    def assert_conflict(self, new_lesson, dimension):
+        with self.assertRaises(TimetableConflictError) as raised:
+            check_new_lessons([new_lesson])
+        self.assertIn((dimension, self.lesson.id), {
+            (conflict['dimension'], conflict['lessons'][0]) for conflict in raised.exception.conflicts
+        })
+
+    def test_teacher_overlap(self):
+        self.assert_conflict(self.new_lesson(teacher=self.lesson.teacher), 'teacher')
+
+    def test_classroom_overlap(self):
+        self.assert_conflict(self.new_lesson(classroom=self.lesson.classroom), 'classroom')
+
+    def test_overlap_between_new_lessons(self):
+        free_day = self.lesson.date + datetime.timedelta(days=60)
+        first = self.new_lesson(date=free_day, classroom='X-2')
+        second = self.new_lesson(date=free_day, classroom='X-2', class_group=self.lesson.class_group,
+                                 teacher=self.lesson.teacher)
+        with self.assertRaises(TimetableConflictError):
+            check_new_lessons([first, second])
+
+    def test_free_slot(self):
+        self.assertEqual(check_new_lessons([self.new_lesson(lesson_number=99, start_time=datetime.time(20),
+                                                            end_time=datetime.time(21))]), [])
+
+    def test_generate_schedule(self):
+        lesson = self.lesson
+        slot = {'subject_id': lesson.subject_id, 'teacher': self.other_teacher, 'classroom': 'X-3',
+                'lesson_number': 99, 'start_time': datetime.time(20), 'end_time': datetime.time(21)}
+        monday = lesson.date - datetime.timedelta(days=lesson.date.weekday())
+        created = generate_schedule(self.other_class, monday, monday + datetime.timedelta(days=13),
+                                    [dict(slot, weekday=0), dict(slot, weekday=2, lesson_number=98)])
+        self.assertEqual(len(created), 4)
+        self.assertEqual({lesson.date.weekday() for lesson in created}, {0, 2})
 
-# Create your tests here.
+        # Тот же учитель в то же время у другого класса: пересечение, ничего не создается
+        count = Lesson.objects.count()
+        with self.assertRaises(TimetableConflictError):
+            generate_schedule(lesson.class_group, monday, monday + datetime.timedelta(days=6),
+                              [dict(slot, weekday=0, classroom='X-4')])
+        self.assertEqual(Lesson.objects.count(), count)
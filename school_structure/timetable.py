@@ -0,0 +1,139 @@
+# school_structure/timetable.py
+from collections import defaultdict
+
+from .models import Lesson
+
+# Измерения, по которым урок не может пересекаться с другим уроком
+CONFLICT_DIMENSIONS = {
+    'teacher': 'teacher_id',
+    'classroom': 'classroom',
+    'class_group': 'class_group_id',
+}
+
+LESSON_FIELDS = (
+    'id', 'teacher_id', 'classroom', 'class_group_id', 'subject_id',
+    'date', 'lesson_number', 'start_time', 'end_time',
+)
+
+
+class TimetableConflictError(ValueError):
+    """Пересечение уроков в расписании"""
+
+    def __init__(self, conflicts):
+        self.conflicts = conflicts
+        super().__init__(f"Найдено пересечений в расписании: {len(conflicts)}")
+
+
+def _lesson_row(lesson):
+    """Привести урок (модель или dict из values()) к словарю с нужными полями"""
+    if isinstance(lesson, dict):
+        return dict(lesson)
+    return {field: getattr(lesson, field) for field in LESSON_FIELDS}
+
+
+def load_period_lessons(quarter=None, date_from=None, date_to=None):
+    """Загрузить все уроки периода одним запросом"""
+    lessons = Lesson.objects.all()
+    if quarter:
+        lessons = lessons.filter(quarter=quarter)
+    if date_from:
+        lessons = lessons.filter(date__gte=date_from)
+    if date_to:
+        lessons = lessons.filter(date__lte=date_to)
+    return list(lessons.values(*LESSON_FIELDS))
+
+
+def build_interval_index(lessons):
+    """
+    Построить индексы интервалов по учителю, кабинету и классу.
+    Каждый список отсортирован по (date, start_time).
+    """
+    index = {dimension: defaultdict(list) for dimension in CONFLICT_DIMENSIONS}
+    for lesson in map(_lesson_row, lessons):
+        for dimension, field in CONFLICT_DIMENSIONS.items():
+            key = lesson[field]
+            if key in (None, ''):
+                continue
+            index[dimension][key].append(lesson)
+
+    for buckets in index.values():
+        for intervals in buckets.values():
+            intervals.sort(key=lambda l: (l['date'], l['start_time'], l['end_time']))
+    return index
+
+
+def _conflict(dimension, key, first, second):
+    return {
+        'dimension': dimension,
+        'key': key,
+        'date': second['date'],
+        'lessons': (first['id'], second['id']),
+        'lesson_numbers': (first['lesson_number'], second['lesson_number']),
+    }
+
+
+def find_conflicts(lessons):
+    """
+    Найти пересечения уроков за O(n log n + k), где k - число конфликтов.
+
+    Для каждого ключа индекса проходим интервалы по порядку и держим
+    список «активных» уроков, которые еще не закончились к началу текущего.
+    Уроки с одинаковым номером в один день тоже считаются конфликтом,
+    даже если время указано без пересечения.
+    """
+    conflicts = []
+    index = build_interval_index(lessons)
+
+    for dimension, buckets in index.items():
+        for key, intervals in buckets.items():
+            seen = set()
+            active = []
+            slots = {}
+            for lesson in intervals:
+                active = [
+                    other for other in active
+                    if other['date'] == lesson['date'] and other['end_time'] > lesson['start_time']
+                ]
+                slot = (lesson['date'], lesson['lesson_number'])
+                same_slot = slots.setdefault(slot, [])
+
+                for other in active + same_slot:
+                    pair = (other['id'], lesson['id'])
+                    if pair not in seen:
+                        seen.add(pair)
+                        conflicts.append(_conflict(dimension, key, other, lesson))
+
+                active.append(lesson)
+                same_slot.append(lesson)
+
+    return conflicts
+
+
+def check_new_lessons(new_lessons, quarter=None):
+    """
+    Проверка перед массовым созданием уроков (bulk_create при генерации расписания).
+
+    Новые уроки проверяются друг с другом и с уже существующими уроками периода.
+    Конфликты между двумя существующими уроками не мешают генерации.
+    """
+    new_rows = [_lesson_row(lesson) for lesson in new_lessons]
+    if not new_rows:
+        return []
+
+    dates = [row['date'] for row in new_rows]
+    existing = load_period_lessons(quarter=quarter, date_from=min(dates), date_to=max(dates))
+
+    # У несохраненных уроков нет id - выдаем временные отрицательные
+    for number, row in enumerate(new_rows, start=1):
+        if row.get('id') is None:
+            row['id'] = -number
+    new_ids = {row['id'] for row in new_rows}
+    existing = [row for row in existing if row['id'] not in new_ids]
+
+    conflicts = [
+        conflict for conflict in find_conflicts(existing + new_rows)
+        if new_ids.intersection(conflict['lessons'])
+    ]
+    if conflicts:
+        raise TimetableConflictError(conflicts)
+    return conflicts
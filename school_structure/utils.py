@@ -1,20 +1,59 @@
+from collections import defaultdict
 from datetime import date, timedelta
-from django.db.models import Sum, Q
-from .models import TeacherWorkload, Lesson, Quarter
+from itertools import groupby
+from operator import attrgetter
 
+from django.db.models import Sum, Count, Q, F, Case, When, Value, IntegerField, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from main.routers import use_replica
+from users.models import TeacherProfile, StudentProfile
+from .models import TeacherWorkload, Lesson, Quarter, ClassGroup
+from .periods import count_mondays
+from .school_calendar import get_school_calendar
 
-def generate_schedule(class_group, start_date, end_date):
-    """Генерация расписания на период"""
-    current_date = start_date
-    while current_date <= end_date:
-        # Логика генерации уроков по дням недели
-        # Можно использовать шаблоны расписания
-        pass
+
+def generate_schedule(class_group, start_date, end_date, weekly_template=()):
+    """
+    Генерация расписания на период: уроки ставятся только в учебные дни календаря года.
+
+    weekly_template - уроки недели: словари с weekday (0 - понедельник) и полями урока
+    (subject, teacher, classroom, lesson_number, start_time, end_time). Уроки создаются
+    через bulk_create_lessons: при пересечении с другими уроками - TimetableConflictError,
+    и ни один урок не создается.
+    """
+    school_calendar = get_school_calendar(class_group.academic_year_id)
+    quarters = list(Quarter.objects.filter(academic_year_id=class_group.academic_year_id))
+    slots_by_weekday = defaultdict(list)
+    for slot in weekly_template:
+        slot = dict(slot)
+        slots_by_weekday[slot.pop('weekday')].append(slot)
+
+    lessons = []
+    for current_date in school_calendar.iter_school_days(start_date, end_date):
+        quarter = next((q for q in quarters if q.start_date <= current_date <= q.end_date), None)
+        if quarter is None:
+            continue
+        for slot in slots_by_weekday[current_date.weekday()]:
+            lessons.append(Lesson(class_group=class_group, quarter=quarter, date=current_date, **slot))
+    return bulk_create_lessons(lessons)
+
+
+def weeks_in_quarter_expression(quarters, field='quarter_id'):
+    """
+    SQL-выражение «количество учебных недель четверти» для аннотаций.
+    Количество недель считается в Python по четвертям (их единицы),
+    а в запрос попадает как CASE по quarter_id.
+    """
+    whens = [When(**{field: quarter.id}, then=Value(quarter.week_count)) for quarter in quarters]
+    if not whens:
+        return Value(0, output_field=IntegerField())
+    return Case(*whens, default=Value(0), output_field=IntegerField())
 
 
 def calculate_teacher_workload(teacher, academic_year=None, quarter=None):
     """
-    Рассчитать фактическую нагрузку учителя
+    Рассчитать фактическую нагрузку учителя.
+    Итоги считаются в БД, детализация - одной выборкой с select_related.
     """
     filters = {'teacher': teacher}
 
@@ -26,104 +65,177 @@ def calculate_teacher_workload(teacher, academic_year=None, quarter=None):
 
     workloads = TeacherWorkload.objects.filter(**filters)
 
+    quarters = Quarter.objects.filter(
+        teacher_workloads__in=workloads
+    ).distinct().only('id', 'academic_year_id', 'start_date', 'end_date')
+    workloads = workloads.annotate(
+        total_in_quarter=ExpressionWrapper(
+            F('hours_per_week') * weeks_in_quarter_expression(quarters),
+            output_field=IntegerField()
+        )
+    )
+
+    totals = workloads.aggregate(
+        total_hours_per_week=Sum('hours_per_week'),
+        total_hours_in_period=Sum('total_in_quarter'),
+    )
+
     result = {
-        'total_hours_per_week': workloads.aggregate(
-            total=Sum('hours_per_week')
-        )['total'] or 0,
-        'total_hours_in_period': workloads.aggregate(
-            total=Sum('total_hours_in_quarter')
-        )['total'] or 0,
+        'total_hours_per_week': totals['total_hours_per_week'] or 0,
+        'total_hours_in_period': totals['total_hours_in_period'] or 0,
         'workloads': [],
         'by_subject': {},
         'by_class': {},
     }
 
+    workloads = workloads.select_related(
+        'subject_hours__subject',
+        'subject_hours__class_group__academic_year',
+        'quarter__academic_year',
+    )
+
     for workload in workloads:
+        subject = workload.subject_hours.subject
+        class_name = str(workload.subject_hours.class_group)
+
         # Подсчет по предметам
-        subject_title = workload.subject_hours.subject.title
-        if subject_title not in result['by_subject']:
-            result['by_subject'][subject_title] = 0
-        result['by_subject'][subject_title] += workload.hours_per_week
+        result['by_subject'][subject.title] = (
+            result['by_subject'].get(subject.title, 0) + workload.hours_per_week
+        )
 
         # Подсчет по классам
-        class_name = str(workload.subject_hours.class_group)
-        if class_name not in result['by_class']:
-            result['by_class'][class_name] = 0
-        result['by_class'][class_name] += workload.hours_per_week
+        result['by_class'][class_name] = (
+            result['by_class'].get(class_name, 0) + workload.hours_per_week
+        )
 
         result['workloads'].append({
-            'subject': str(workload.subject_hours.subject),
-            'class': str(workload.subject_hours.class_group),
+            'subject': str(subject),
+            'class': class_name,
             'hours_per_week': workload.hours_per_week,
             'quarter': str(workload.quarter),
-            'total_in_quarter': workload.total_hours_in_quarter,
+            'total_in_quarter': workload.total_in_quarter,
         })
 
     return result
 
 
-def check_workload_compliance(teacher, date_range_start, date_range_end):
+def _compliance_rows(date_range_start, date_range_end, teacher=None):
     """
-    Проверить соответствие фактического количества уроков плановой нагрузке
+    Плановая и фактическая нагрузка по парам (учитель, четверть).
+    Одна выборка четвертей, одна сгруппированная выборка TeacherWorkload
+    и один сгруппированный подсчет уроков - независимо от числа учителей.
     """
-    # Получаем все четверти в диапазоне дат
-    quarters = Quarter.objects.filter(
+    quarters = list(Quarter.objects.filter(
         start_date__lte=date_range_end,
         end_date__gte=date_range_start
+    ).select_related('academic_year').order_by('start_date'))
+
+    workloads = TeacherWorkload.objects.filter(quarter__in=quarters)
+    lessons = Lesson.objects.filter(
+        quarter__in=quarters,
+        date__range=[date_range_start, date_range_end]
     )
+    if teacher:
+        workloads = workloads.filter(teacher=teacher)
+        lessons = lessons.filter(teacher=teacher)
+
+    planned = {
+        (row['teacher_id'], row['quarter_id']): row
+        for row in workloads.values(
+            'teacher_id', 'quarter_id', 'teacher__user__last_name', 'teacher__user__first_name'
+        ).annotate(hours_per_week=Sum('hours_per_week'))
+    }
+    actual = {
+        (row['teacher_id'], row['quarter_id']): row
+        for row in lessons.values(
+            'teacher_id', 'quarter_id', 'teacher__user__last_name', 'teacher__user__first_name'
+        ).annotate(lessons=Count('id'))
+    }
 
-    results = []
-    for quarter in quarters:
-        # Плановая нагрузка в четверти
-        planned_workloads = TeacherWorkload.objects.filter(
-            teacher=teacher,
-            quarter=quarter
+    # Недели считаем один раз на четверть, а не на каждую нагрузку
+    weeks = {
+        quarter.id: calculate_weeks_in_period(
+            max(date_range_start, quarter.start_date),
+            min(date_range_end, quarter.end_date),
+            academic_year=quarter.academic_year_id
         )
+        for quarter in quarters
+    }
+
+    return quarters, weeks, planned, actual
 
-        total_planned_hours = 0
-        for workload in planned_workloads:
-            # Количество недель в проверяемом периоде
-            start_date = max(date_range_start, quarter.start_date)
-            end_date = min(date_range_end, quarter.end_date)
-            weeks_in_period = calculate_weeks_in_period(start_date, end_date)
-            total_planned_hours += workload.hours_per_week * weeks_in_period
-
-        # Фактическое количество уроков
-        actual_lessons = Lesson.objects.filter(
-            teacher=teacher,
-            date__range=[date_range_start, date_range_end],
-            quarter=quarter
-        ).count()
 
+def _compliance_entry(planned_hours, actual_hours):
+    return {
+        'planned_hours': planned_hours,
+        'actual_hours': actual_hours,
+        'difference': actual_hours - planned_hours,
+        'compliance': round((actual_hours / planned_hours * 100) if planned_hours > 0 else 0, 2)
+    }
+
+
+def check_workload_compliance(teacher, date_range_start, date_range_end):
+    """
+    Проверить соответствие фактического количества уроков плановой нагрузке
+    """
+    quarters, weeks, planned, actual = _compliance_rows(date_range_start, date_range_end, teacher)
+
+    results = []
+    for quarter in quarters:
+        key = (teacher.id, quarter.id)
+        hours_per_week = planned[key]['hours_per_week'] if key in planned else 0
         # Считаем, что каждый урок - 1 академический час
-        actual_hours = actual_lessons
+        actual_hours = actual[key]['lessons'] if key in actual else 0
 
         results.append({
             'quarter': quarter,
-            'planned_hours': total_planned_hours,
-            'actual_hours': actual_hours,
-            'difference': actual_hours - total_planned_hours,
-            'compliance': round((actual_hours / total_planned_hours * 100) if total_planned_hours > 0 else 0, 2)
+            **_compliance_entry(hours_per_week * weeks[quarter.id], actual_hours),
         })
 
     return results
 
 
-def calculate_weeks_in_period(start_date, end_date):
-    """Рассчитать количество понедельников в периоде"""
-    weeks = 0
-    current_date = start_date
-    while current_date <= end_date:
-        if current_date.weekday() == 0:  # Понедельник
-            weeks += 1
-        current_date += timedelta(days=1)
-    return weeks or 1
+def workload_compliance_report(date_range_start, date_range_end):
+    """
+    Отчет о выполнении нагрузки по всей школе: строка на каждую пару (учитель, четверть).
+    Значения простые (строки и числа), чтобы отчет можно было выгрузить в CSV/JSON.
+    """
+    quarters, weeks, planned, actual = _compliance_rows(date_range_start, date_range_end)
+    quarters_by_id = {quarter.id: quarter for quarter in quarters}
+
+    rows = []
+    for key in planned.keys() | actual.keys():
+        teacher_id, quarter_id = key
+        source = planned.get(key) or actual[key]
+        hours_per_week = planned[key]['hours_per_week'] if key in planned else 0
+        actual_hours = actual[key]['lessons'] if key in actual else 0
+
+        rows.append({
+            'teacher_id': teacher_id,
+            'teacher': f"{source['teacher__user__last_name']} {source['teacher__user__first_name']}".strip(),
+            'quarter_id': quarter_id,
+            'quarter': str(quarters_by_id[quarter_id]),
+            'hours_per_week': hours_per_week,
+            'weeks': weeks[quarter_id],
+            **_compliance_entry(hours_per_week * weeks[quarter_id], actual_hours),
+        })
 
+    rows.sort(key=lambda row: (row['teacher'], row['teacher_id'], quarters_by_id[row['quarter_id']].start_date))
+    return rows
 
-def generate_workload_report(academic_year, quarter=None):
+
+def calculate_weeks_in_period(start_date, end_date, academic_year=None):
     """
-    Сгенерировать отчет по нагрузке учителей
+    Рассчитать количество учебных недель в периоде (минимум 1 неделя).
+    С учебным годом - по календарю года с праздниками, без него - по понедельникам.
     """
+    if academic_year is not None:
+        return get_school_calendar(academic_year).school_weeks(start_date, end_date) or 1
+    return count_mondays(start_date, end_date) or 1
+
+
+def _report_workloads(academic_year, quarter=None, teacher_ids=None):
+    """Нагрузки для отчета, упорядоченные по учителю"""
     filters = {
         'subject_hours__class_group__academic_year': academic_year
     }
@@ -131,54 +243,132 @@ def generate_workload_report(academic_year, quarter=None):
     if quarter:
         filters['quarter'] = quarter
 
-    workloads = TeacherWorkload.objects.filter(**filters).select_related(
+    if teacher_ids is not None:
+        filters['teacher_id__in'] = teacher_ids
+
+    return TeacherWorkload.objects.filter(**filters).select_related(
         'teacher__user',
         'subject_hours__subject',
-        'subject_hours__class_group',
-        'quarter'
+        'subject_hours__class_group__academic_year',
+        'quarter__academic_year'
+    ).order_by(
+        'teacher__user__last_name', 'teacher__user__first_name', 'teacher_id',
+        'quarter__number', 'subject_hours__subject__title'
+    )
+
+
+def report_teachers(academic_year, quarter=None):
+    """Учителя, попадающие в отчет, в порядке отчета (для постраничного вывода)"""
+    filters = {
+        'workloads__subject_hours__class_group__academic_year': academic_year
+    }
+
+    if quarter:
+        filters['workloads__quarter'] = quarter
+
+    return TeacherProfile.objects.filter(**filters).distinct().order_by(
+        'user__last_name', 'user__first_name', 'id'
     )
 
+
+def iter_workload_report(academic_year, quarter=None, teacher_ids=None, chunk_size=2000):
+    """
+    Потоковый отчет по нагрузке: по одной записи на учителя.
+
+    Нагрузки читаются курсором (на PostgreSQL - серверным) в порядке учителей
+    и группируются на лету через itertools.groupby, поэтому в памяти
+    одновременно находится только один учитель.
+    """
+    workloads = _report_workloads(academic_year, quarter, teacher_ids)
+
+    for teacher_id, teacher_workloads in groupby(
+            workloads.iterator(chunk_size=chunk_size), key=attrgetter('teacher_id')):
+        entry = None
+        subjects = set()
+        classes = set()
+
+        for workload in teacher_workloads:
+            if entry is None:
+                user = workload.teacher.user
+                entry = {
+                    'teacher_id': teacher_id,
+                    'teacher': f"{user.last_name} {user.first_name}",
+                    'hours_per_week': 0,
+                    'workloads': [],
+                }
+
+            subject = str(workload.subject_hours.subject)
+            class_name = str(workload.subject_hours.class_group)
+            entry['hours_per_week'] += workload.hours_per_week
+            entry['workloads'].append({
+                'subject': subject,
+                'class': class_name,
+                'hours': workload.hours_per_week,
+                'quarter': str(workload.quarter),
+            })
+            subjects.add(subject)
+            classes.add(class_name)
+
+        entry['subjects'] = sorted(subjects)
+        entry['classes'] = sorted(classes)
+        yield entry
+
+
+def report_summary(teachers_count, total_hours_per_week):
+    """Сводная статистика отчета по нагрузке"""
+    return {
+        'total_teachers': teachers_count,
+        'total_hours_per_week': total_hours_per_week,
+        'average_hours_per_teacher': round(
+            total_hours_per_week / teachers_count, 2
+        ) if teachers_count > 0 else 0,
+    }
+
+
+@use_replica()
+def generate_workload_report(academic_year, quarter=None):
+    """
+    Сгенерировать отчет по нагрузке учителей.
+    Для больших школ используйте iter_workload_report - он не держит отчет в памяти.
+    """
     report = {
-        'academic_year': academic_year,
-        'quarter': quarter,
+        'academic_year': str(academic_year),
+        'quarter': str(quarter) if quarter else None,
         'teachers': {},
-        'summary': {
-            'total_teachers': 0,
-            'total_hours_per_week': 0,
-            'average_hours_per_teacher': 0,
-        }
     }
 
-    for workload in workloads:
-        teacher_name = f"{workload.teacher.user.last_name} {workload.teacher.user.first_name}"
-
-        if teacher_name not in report['teachers']:
-            report['teachers'][teacher_name] = {
-                'hours_per_week': 0,
-                'workloads': [],
-                'subjects': set(),
-                'classes': set(),
-            }
-
-        report['teachers'][teacher_name]['hours_per_week'] += workload.hours_per_week
-        report['teachers'][teacher_name]['workloads'].append({
-            'subject': str(workload.subject_hours.subject),
-            'class': str(workload.subject_hours.class_group),
-            'hours': workload.hours_per_week,
-            'quarter': str(workload.quarter),
-        })
-        report['teachers'][teacher_name]['subjects'].add(str(workload.subject_hours.subject))
-        report['teachers'][teacher_name]['classes'].add(str(workload.subject_hours.class_group))
+    total_hours_per_week = 0
+    for entry in iter_workload_report(academic_year, quarter):
+        report['teachers'][entry['teacher']] = entry
+        total_hours_per_week += entry['hours_per_week']
 
     # Сводная статистика
-    report['summary']['total_teachers'] = len(report['teachers'])
-    report['summary']['total_hours_per_week'] = sum(
-        t['hours_per_week'] for t in report['teachers'].values()
-    )
+    report['summary'] = report_summary(len(report['teachers']), total_hours_per_week)
+    return report
 
-    if report['summary']['total_teachers'] > 0:
-        report['summary']['average_hours_per_teacher'] = round(
-            report['summary']['total_hours_per_week'] / report['summary']['total_teachers'], 2
-        )
 
-    return report
+def bulk_create_lessons(lessons, quarter=None):
+    """
+    Массовое создание уроков при генерации расписания.
+    Перед вставкой проверяем пересечения по учителю, кабинету и классу.
+    """
+    from .timetable import check_new_lessons
+
+    check_new_lessons(lessons, quarter=quarter)
+    return Lesson.objects.bulk_create(lessons)
+
+
+def recount_class_students(class_groups=None):
+    """
+    Сверка ClassGroup.students_count с фактическим числом учеников.
+    Нужна после массовых операций, которые обходят сигналы (QuerySet.update, bulk_create).
+    Обновляются одним UPDATE только расходящиеся счетчики; возвращает их количество.
+    """
+    actual = Coalesce(Subquery(
+        StudentProfile.objects.filter(
+            class_group=OuterRef('pk')
+        ).order_by().values('class_group').annotate(count=Count('id')).values('count')
+    ), 0)
+    queryset = ClassGroup.objects.all() if class_groups is None else ClassGroup.objects.filter(pk__in=class_groups)
+    stale = queryset.annotate(actual=actual).exclude(students_count=F('actual')).values('pk')
+    return ClassGroup.objects.filter(pk__in=stale).update(students_count=actual)
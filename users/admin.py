@@ -1,13 +1,70 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
 from django.utils import timezone
 from django.contrib.auth.admin import UserAdmin
+from main.tabular import iter_table_rows, TableError
+from .forms import RosterImportForm
 from .models import CustomUser, StudentProfile, TeacherProfile, ParentProfile
+from .roles import change_role
+from .roster import RosterImport, COLUMN_ALIASES
+
+
+def role_action(role):
+    """Действие админки: массовая смена роли выбранных пользователей (см. users.roles.change_role)"""
+    def action(modeladmin, request, queryset):
+        changed = change_role(queryset, role)
+        modeladmin.message_user(request, f'Роль «{role.label}» назначена пользователям: {changed}')
+
+    action.__name__ = f'set_role_{role.value.lower()}'
+    action.short_description = f'Назначить роль «{role.label}»'
+    return action
 
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'username', 'first_name', 'last_name', 'role', 'is_active')
     list_filter = ('role', 'is_staff', 'is_active')
+    actions = [role_action(role) for role in CustomUser.Role]
+    change_list_template = 'admin/users/customuser/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('import-roster/', self.admin_site.admin_view(self.import_roster_view), name='users_customuser_import'),
+        ] + super().get_urls()
+
+    def import_roster_view(self, request):
+        """Загрузка списка учеников, родителей и учителей из CSV/XLSX"""
+        if not self.has_add_permission(request):
+            return redirect('admin:users_customuser_changelist')
+
+        form = RosterImportForm(request.POST or None, request.FILES or None)
+        result = None
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            roster = RosterImport(form.cleaned_data['academic_year'], dry_run=form.cleaned_data['dry_run'])
+            try:
+                result = roster.run(iter_table_rows(upload, upload.name, COLUMN_ALIASES))
+            except TableError as e:
+                form.add_error('file', str(e))
+            else:
+                created = sum(result['created'].values())
+                level = messages.WARNING if result['errors'] else messages.SUCCESS
+                verb = 'Будет создано' if form.cleaned_data['dry_run'] else 'Создано'
+                self.message_user(
+                    request,
+                    f"{verb} пользователей: {created}, связей родитель-ребенок: {result['links']}, "
+                    f"ошибок: {len(result['errors'])}",
+                    level
+                )
+
+        return render(request, 'admin/users/customuser/import_roster.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Импорт пользователей',
+            'form': form,
+            'result': result,
+        })
     fieldsets = (
         (None, {'fields': ('username', 'password',)}),
         ('Персональная информация', {'fields': ('first_name', 'last_name', 'email', 'role')}),
@@ -1,5 +1,6 @@
 # authentication.py
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from django.db.models import Q
 from django.contrib.auth.forms import AuthenticationForm
@@ -42,3 +43,7 @@ class EmailOrUsernameBackend(AuthenticationForm):
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
             return None
+
+    async def aget_user(self, user_id):
+        # Используется request.auser() в асинхронных представлениях
+        return await sync_to_async(self.get_user)(user_id)
@@ -0,0 +1,239 @@
+# users/dashboards.py
+"""
+Данные дашбордов, разбитые на независимые группы запросов.
+
+Каждая группа - функция без аргументов, возвращающая словарь готовых (материализованных)
+данных для контекста. Синхронные представления выполняют группы по очереди,
+асинхронные (под ASGI) - одновременно, каждую в своем потоке со своим соединением с БД:
+асинхронный ORM Django сам по себе выполняет запросы последовательно в одном потоке.
+
+Оценки и посещаемость за все время читаются вместе с архивом прошлых лет (journal.archive),
+счетчики за текущий месяц - только из рабочих таблиц.
+"""
+import asyncio
+import calendar
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from school_structure.models import Lesson, ClassGroup, Subject, Quarter
+from journal.archive import grade_querysets, merged_grades, grade_totals, grade_totals_by_subject
+from journal.models import StudentGrade, Attendance, Homework, QuarterlyGrade
+
+
+def _current_quarter():
+    try:
+        return Quarter.objects.get(is_current=True)
+    except Quarter.DoesNotExist:
+        return None
+
+
+def run_groups(groups):
+    """Выполнить группы запросов последовательно (WSGI)"""
+    data = {}
+    for group in groups:
+        data.update(group())
+    return data
+
+
+def _run_with_own_connection(group):
+    try:
+        return group()
+    finally:
+        # Потоки пула живут вне цикла запроса, поэтому соединения
+        # закрываются по тем же правилам (CONN_MAX_AGE), что и в конце запроса
+        close_old_connections()
+
+
+async def arun_groups(groups):
+    """Выполнить группы запросов одновременно (ASGI)"""
+    results = await asyncio.gather(*(
+        sync_to_async(_run_with_own_connection, thread_sensitive=False)(group)
+        for group in groups
+    ))
+    data = {}
+    for result in results:
+        data.update(result)
+    return data
+
+
+# ==================== ДАШБОРД УЧИТЕЛЯ ====================
+
+def teacher_dashboard_groups(teacher, today):
+    def quarter():
+        return {'current_quarter': _current_quarter()}
+
+    def lessons():
+        # Ближайшие уроки (на 7 дней вперед) и уроки на сегодня
+        lessons = Lesson.objects.filter(teacher=teacher).select_related('subject', 'class_group')
+        return {
+            'upcoming_lessons': list(lessons.filter(
+                date__range=[today, today + timedelta(days=7)]
+            ).order_by('date', 'lesson_number')[:10]),
+            'today_lessons': list(lessons.filter(date=today).order_by('lesson_number')),
+        }
+
+    def classes():
+        # Классы, которые ведет учитель (число учеников - из счетчика students_count);
+        # Count после filter по lessons считает только уроки учителя
+        classes = list(ClassGroup.objects.filter(
+            lessons__teacher=teacher
+        ).annotate(lesson_count=Count('lessons')))
+
+        # Количество оценок и сумма баллов по всем классам - одним запросом на таблицу
+        marks = {}
+        for queryset in grade_querysets():
+            for row in queryset.filter(teacher=teacher).values('class_group').annotate(
+                marks_count=Count('id'), total=Sum('value')
+            ).order_by():
+                counts = marks.setdefault(row['class_group'], [0, 0])
+                counts[0] += row['marks_count']
+                counts[1] += row['total']
+
+        class_stats = []
+        for class_group in classes:
+            marks_count, total = marks.get(class_group.id, (0, 0))
+            class_stats.append({
+                'class': class_group,
+                'marks_count': marks_count,
+                'avg_grade': round(total / marks_count, 2) if marks_count else None
+            })
+        return {'classes': classes, 'class_stats': class_stats}
+
+    def recent_marks():
+        return {'recent_marks': list(merged_grades([
+            queryset.filter(teacher=teacher).select_related(
+                'student__user',
+                'lesson_column__lesson__subject',
+                'lesson_column__grade_type'
+            ).order_by('-created_at', '-id')
+            for queryset in grade_querysets()
+        ], limit=5))}
+
+    def homework():
+        # Домашние задания к проверке
+        return {'homework_to_check': list(Homework.objects.filter(
+            lesson__teacher=teacher,
+            deadline__lt=timezone.now()
+        ).select_related('lesson__subject', 'lesson__class_group').order_by('deadline')[:5])}
+
+    def marks_this_month():
+        return {'marks_this_month': StudentGrade.objects.filter(
+            teacher=teacher,
+            created_at__month=today.month,
+            created_at__year=today.year
+        ).count()}
+
+    return [quarter, lessons, classes, recent_marks, homework, marks_this_month]
+
+
+def teacher_dashboard_context(teacher, today, data):
+    marks_this_month = data.pop('marks_this_month')
+    data.update({
+        'teacher': teacher,
+        'stats': {
+            'total_classes': len(data['classes']),
+            'marks_this_month': marks_this_month,
+            'today_lessons_count': len(data['today_lessons']),
+        },
+        'today': today,
+    })
+    return data
+
+
+# ==================== ДАШБОРД УЧЕНИКА ====================
+
+def student_dashboard_groups(student, today):
+    tomorrow = today + timedelta(days=1)
+
+    def schedule():
+        lessons = Lesson.objects.filter(
+            class_group_id=student.class_group_id
+        ).select_related('subject', 'teacher__user').order_by('lesson_number')
+        return {
+            'schedule_today': list(lessons.filter(date=today)),
+            'schedule_tomorrow': list(lessons.filter(date=tomorrow)),
+        }
+
+    def recent_marks():
+        return {'recent_marks': list(merged_grades([
+            queryset.filter(student=student).select_related(
+                'lesson_column__lesson__subject',
+                'teacher__user',
+                'lesson_column__grade_type'
+            ).order_by('-created_at', '-id')
+            for queryset in grade_querysets()
+        ], limit=10))}
+
+    def marks_summary():
+        # Средние баллы по предметам и общая статистика успеваемости
+        marks = [queryset.filter(student=student) for queryset in grade_querysets()]
+        total_marks, total = grade_totals(marks)
+        by_subject = grade_totals_by_subject(marks)
+        subjects = Subject.objects.filter(id__in=by_subject).order_by('title')
+        return {
+            'subject_grades': [
+                {
+                    'subject__title': subject.title,
+                    'avg_grade': by_subject[subject.id]['total'] / by_subject[subject.id]['count'],
+                    'count': by_subject[subject.id]['count'],
+                }
+                for subject in subjects
+            ],
+            'total_marks': total_marks,
+            'avg_all': round(total / total_marks, 2) if total_marks else None,
+        }
+
+    def quarterly():
+        current_quarter = _current_quarter()
+        quarterly_grades = []
+        if current_quarter:
+            subjects = list(Subject.objects.filter(
+                lessons__class_group_id=student.class_group_id
+            ).distinct())
+            grades = {
+                grade.subject_id: grade
+                for grade in QuarterlyGrade.objects.filter(
+                    student=student,
+                    subject__in=subjects,
+                    quarter=current_quarter
+                )
+            }
+            for subject in subjects:
+                q_grade = grades.get(subject.id)
+                if q_grade and q_grade.grade:
+                    quarterly_grades.append({
+                        'subject': subject,
+                        'grade': q_grade.grade,
+                        'calculated': q_grade.calculated_grade
+                    })
+        return {'current_quarter': current_quarter, 'quarterly_grades': quarterly_grades}
+
+    def homework():
+        return {'upcoming_homework': list(Homework.objects.filter(
+            lesson__class_group_id=student.class_group_id,
+            deadline__gt=timezone.now()
+        ).select_related('lesson__subject').order_by('deadline')[:5])}
+
+    def attendance():
+        # Посещаемость за текущий месяц
+        month_start = today.replace(day=1)
+        month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+        return {'monthly_attendance': list(Attendance.objects.filter(
+            student=student,
+            lesson__date__range=[month_start, month_end]
+        ).values('status').annotate(count=Count('id')))}
+
+    return [schedule, recent_marks, marks_summary, quarterly, homework, attendance]
+
+
+def student_dashboard_context(student, today, data):
+    data.update({
+        'student': student,
+        'today': today,
+        'tomorrow': today + timedelta(days=1),
+    })
+    return data
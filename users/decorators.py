@@ -1,9 +1,12 @@
 # users/decorators.py
 
 from django.contrib.auth.decorators import user_passes_test
+from django.contrib.auth.views import redirect_to_login
 from django.shortcuts import redirect
 from functools import wraps
 
+LOGIN_URL = '/users/login/'
+
 
 def role_required(*roles):
     """Декоратор для проверки роли пользователя"""
@@ -13,7 +16,7 @@ def role_required(*roles):
             return user.role in roles
         return False
 
-    return user_passes_test(wrapper, login_url='/users/login/')
+    return user_passes_test(wrapper, login_url=LOGIN_URL)
 
 
 # Декораторы для конкретных ролей
@@ -21,7 +24,22 @@ teacher_required = role_required('TEACHER')
 student_required = role_required('STUDENT')
 parent_required = role_required('PARENT')
 admin_required = role_required('ADMIN')
-staff_required = user_passes_test(lambda u: u.is_staff, login_url='/users/login/')
+staff_required = user_passes_test(lambda u: u.is_staff, login_url=LOGIN_URL)
+
+
+class AsyncRoleRequiredMixin:
+    """
+    Вход и роль для асинхронных представлений (аналог login_required + role_required).
+    Синхронные декораторы читают ленивый request.user - запрос к БД в цикле событий
+    под ASGI; здесь пользователь загружается через request.auser().
+    """
+    required_role = None
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated or user.role != self.required_role:
+            return redirect_to_login(request.get_full_path(), LOGIN_URL)
+        return await super().dispatch(request, *args, **kwargs)
 
 
 def class_teacher_required(view_func):
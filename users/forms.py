@@ -4,7 +4,7 @@ from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
-from school_structure.models import ClassGroup
+from school_structure.models import ClassGroup, AcademicYear
 
 User = get_user_model()
 
@@ -154,3 +154,15 @@ class TeacherProfileForm(forms.ModelForm):
             'education': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
             'subject_areas': forms.SelectMultiple(attrs={'class': 'form-control'}),
         }
+
+
+class RosterImportForm(forms.Form):
+    """Загрузка списка пользователей (см. users.roster)"""
+    file = forms.FileField(label='Файл CSV или XLSX')
+    academic_year = forms.ModelChoiceField(
+        queryset=AcademicYear.objects.all(),
+        required=False,
+        label='Учебный год классов',
+        help_text='По умолчанию - текущий учебный год'
+    )
+    dry_run = forms.BooleanField(required=False, label='Только проверить файл')
@@ -0,0 +1,115 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, RequestFactory
+
+from school_structure.benchmark import build_demo_school, add_demo_journal, drop_demo_school
+from users.views import (
+    TeacherDashboardView, AsyncTeacherDashboardView,
+    StudentDashboardView, AsyncStudentDashboardView,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение задержки синхронных и асинхронных дашбордов под параллельной нагрузкой. '
+        'Данные создаются с фиксацией (их должны видеть разные соединения) и удаляются после замеров'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=20, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на режим')
+        parser.add_argument('--teachers', type=int, default=20, help='Количество учителей')
+
+    def handle(self, *args, **options):
+        school = build_demo_school(teachers=options['teachers'], students_per_class=10,
+                                   with_lessons=True, lesson_weeks=2)
+        try:
+            add_demo_journal(school)
+            targets = [
+                ('Учитель', TeacherDashboardView, AsyncTeacherDashboardView,
+                 [teacher.user for teacher in school['teachers']]),
+                ('Ученик', StudentDashboardView, AsyncStudentDashboardView,
+                 [student.user for student in school['students']]),
+            ]
+            for label, sync_view, async_view, users in targets:
+                sessions = self.login(users)
+                requests = [sessions[n % len(sessions)] for n in range(options['requests'])]
+                self.report(f'{label}, WSGI', self.run_sync(sync_view.as_view(), requests, options['concurrency']))
+                self.report(f'{label}, ASGI', asyncio.run(
+                    self.run_async(async_view.as_view(), requests, options['concurrency'])
+                ))
+        finally:
+            drop_demo_school(school)
+
+    def login(self, users):
+        """Ключи сессий пользователей: запросы проходят настоящую аутентификацию по сессии"""
+        sessions = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            sessions.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+        return sessions
+
+    def make_request(self, session_key):
+        # request.user и request.auser() - ленивые, как после AuthenticationMiddleware в проекте
+        request = RequestFactory().get('/')
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session_key
+        SessionMiddleware(lambda request: None).process_request(request)
+        AuthenticationMiddleware(lambda request: None).process_request(request)
+        return request
+
+    def run_sync(self, view, sessions, concurrency):
+        chunks = [sessions[n::concurrency] for n in range(concurrency)]
+
+        def worker(chunk):
+            latencies = []
+            try:
+                for session_key in chunk:
+                    started = time.perf_counter()
+                    view(self.make_request(session_key)).render()
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = [value for chunk in executor.map(worker, chunks) for value in chunk]
+        return latencies, time.perf_counter() - started
+
+    async def run_async(self, view, sessions, concurrency):
+        chunks = [sessions[n::concurrency] for n in range(concurrency)]
+
+        async def worker(chunk):
+            latencies = []
+            for session_key in chunk:
+                started = time.perf_counter()
+                response = await view(self.make_request(session_key))
+                await sync_to_async(response.render)()
+                latencies.append(time.perf_counter() - started)
+            return latencies
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(chunk) for chunk in chunks))
+        await sync_to_async(connections.close_all)()
+        return [value for chunk in results for value in chunk], time.perf_counter() - started
+
+    def report(self, label, result):
+        latencies, total = result
+        latencies.sort()
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(
+            f'{label:<16} {len(latencies):>5} запросов за {total:>7.2f} с | '
+            f'среднее {statistics.mean(latencies) * 1000:>8.1f} мс | '
+            f'медиана {statistics.median(latencies) * 1000:>8.1f} мс | '
+            f'p95 {p95 * 1000:>8.1f} мс'
+        )
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import update_last_login
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.signals import post_save
+
+from school_structure.benchmark import build_demo_school, measure, BenchmarkRollback
+from users.models import CustomUser
+from users.roles import sync_role_profiles
+
+
+def sync_on_every_save(sender, instance, created, **kwargs):
+    """Прежнее поведение сигнала: синхронизация профилей при каждом сохранении пользователя"""
+    sync_role_profiles([instance.pk], instance.role)
+
+
+class Command(BaseCommand):
+    help = (
+        'Запросы к БД на вход пользователя (обновление last_login): сигнал профиля, '
+        'реагирующий только на смену роли, против синхронизации на каждом сохранении. '
+        'Данные откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=500, help='Входов на режим')
+
+    def handle(self, *args, **options):
+        results = []
+        try:
+            with transaction.atomic():
+                school = build_demo_school(teachers=20, students_per_class=10)
+                user_ids = [t.user_id for t in school['teachers']] + [s.user_id for s in school['students']]
+                user_ids = [user_ids[n % len(user_ids)] for n in range(options['logins'])]
+
+                post_save.connect(sync_on_every_save, sender=CustomUser)
+                try:
+                    self.run('Синхронизация на каждом сохранении', user_ids, results)
+                finally:
+                    post_save.disconnect(sync_on_every_save, sender=CustomUser)
+                self.run('Только при смене роли', user_ids, results)
+                raise BenchmarkRollback
+        except BenchmarkRollback:
+            pass
+
+        for result in results:
+            self.stdout.write(
+                f"{result['label']:<36} {result['queries'] / options['logins']:>6.2f} запросов на вход, "
+                f"{result['seconds'] / options['logins'] * 1000:>7.3f} мс на вход"
+            )
+
+    def run(self, label, user_ids, results):
+        users = CustomUser.objects.in_bulk(user_ids)
+        with measure(label, results):
+            for user_id in user_ids:
+                # То же, что делает django.contrib.auth.login через сигнал user_logged_in
+                update_last_login(None, users[user_id])
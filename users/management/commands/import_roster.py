@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.tabular import iter_table_rows, TableError
+from school_structure.models import AcademicYear
+from users.roster import RosterImport, COLUMN_ALIASES
+
+
+class Command(BaseCommand):
+    help = (
+        'Импорт списка учеников, родителей и учителей из CSV/XLSX. Колонки: role, last_name, '
+        'first_name, patronymic, email, username, password, class, admission_year, children '
+        '(email детей через ";"); допускаются русские заголовки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу .csv или .xlsx')
+        parser.add_argument('--year', type=int, help='ID учебного года для классов (по умолчанию текущий)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Строк в пачке')
+        parser.add_argument('--workers', type=int, help='Процессов для хеширования паролей (по умолчанию по числу ядер)')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не создавать')
+
+    def handle(self, *args, **options):
+        academic_year = None
+        if options.get('year'):
+            try:
+                academic_year = AcademicYear.objects.get(id=options['year'])
+            except AcademicYear.DoesNotExist:
+                raise CommandError(f"Учебный год с ID={options['year']} не найден")
+
+        roster = RosterImport(
+            academic_year,
+            chunk_size=options['chunk_size'],
+            workers=options.get('workers'),
+            dry_run=options['dry_run'],
+        )
+        started = time.perf_counter()
+
+        def progress(result):
+            self.stdout.write(
+                f"  обработано строк: {result['rows']}, создано: {sum(result['created'].values())}, "
+                f"ошибок: {len(result['errors'])} ({time.perf_counter() - started:.1f} с)"
+            )
+
+        try:
+            with open(options['path'], 'rb') as file:
+                result = roster.run(iter_table_rows(file, options['path'], COLUMN_ALIASES), progress=progress)
+        except (OSError, TableError) as e:
+            raise CommandError(str(e))
+
+        for line, message in result['errors']:
+            self.stderr.write(f'  строка {line}: {message}')
+        created = ', '.join(f'{role}: {count}' for role, count in result['created'].items())
+        verb = 'Будет создано' if options['dry_run'] else 'Создано'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} пользователей - {created}; связей родитель-ребенок: {result['links']}; "
+            f"ошибок: {len(result['errors'])}; {time.perf_counter() - started:.1f} с"
+        ))
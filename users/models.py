@@ -1,5 +1,6 @@
 # users/models.py
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 
@@ -37,10 +38,22 @@ class CustomUser(AbstractUser):
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
+        indexes = [
+            # Поиск без учета регистра при импорте списков (users.roster)
+            models.Index(Lower('email'), name='user_email_lower'),
+        ]
 
     def __str__(self):
         return f'{self.get_full_name()} ({self.get_role_display()})'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Роль на момент загрузки: профили пересоздаются, только если она изменилась
+        if 'role' in field_names:
+            instance._loaded_role = instance.role
+        return instance
+
 
 class StudentProfile(models.Model):
     user = models.OneToOneField(
@@ -63,6 +76,14 @@ class StudentProfile(models.Model):
         default=get_current_admission_year
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Класс на момент загрузки: по нему сигналы обновляют ClassGroup.students_count
+        if 'class_group_id' in field_names:
+            instance._loaded_class_group_id = instance.class_group_id
+        return instance
+
 
 class Meta:
     verbose_name = 'Профиль ученика'
@@ -0,0 +1,40 @@
+# users/roles.py
+"""
+Профили пользователей по ролям.
+
+У пользователя есть только профиль его текущей роли. Сигнал post_save CustomUser
+синхронизирует профили только при смене роли; массовая смена роли - change_role(),
+фиксированное число запросов на всю выборку.
+"""
+from django.db import transaction
+
+from .models import CustomUser, StudentProfile, TeacherProfile, ParentProfile
+
+PROFILE_MODELS = {
+    CustomUser.Role.STUDENT: StudentProfile,
+    CustomUser.Role.TEACHER: TeacherProfile,
+    CustomUser.Role.PARENT: ParentProfile,
+}
+
+
+def sync_role_profiles(user_ids, role):
+    """Создать профиль роли тем, у кого его нет, и удалить профили других ролей"""
+    profile_model = PROFILE_MODELS.get(role)
+    for model in PROFILE_MODELS.values():
+        if model is not profile_model:
+            model.objects.filter(user_id__in=user_ids).delete()
+    if profile_model is not None:
+        profile_model.objects.bulk_create(
+            [profile_model(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True
+        )
+
+
+def change_role(users, role):
+    """Массовая смена роли: один UPDATE пользователей и синхронизация профилей всей выборки"""
+    with transaction.atomic():
+        user_ids = list(users.exclude(role=role).values_list('pk', flat=True))
+        if user_ids:
+            CustomUser.objects.filter(pk__in=user_ids).update(role=role)
+            sync_role_profiles(user_ids, role)
+    return len(user_ids)
@@ -0,0 +1,256 @@
+# users/roster.py
+"""
+Массовый импорт списков пользователей (ученики, родители, учителя) из CSV/XLSX.
+
+Строки читаются потоком и обрабатываются пачками. Пароли хешируются в пуле процессов,
+пользователи, профили и связи родитель-ребенок создаются через bulk_create - сигналы
+post_save не вызываются: профили создаются здесь же, а счетчики учеников классов
+сверяются одним запросом в конце импорта.
+"""
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from school_structure.models import AcademicYear, ClassGroup
+from school_structure.utils import recount_class_students
+from .models import CustomUser, StudentProfile, TeacherProfile, ParentProfile, get_current_admission_year
+
+# Русские заголовки колонок файла
+COLUMN_ALIASES = {
+    'роль': 'role',
+    'фамилия': 'last_name',
+    'имя': 'first_name',
+    'отчество': 'patronymic',
+    'почта': 'email',
+    'логин': 'username',
+    'пароль': 'password',
+    'класс': 'class',
+    'год поступления': 'admission_year',
+    'дети': 'children',
+}
+
+IMPORT_ROLES = (CustomUser.Role.STUDENT, CustomUser.Role.PARENT, CustomUser.Role.TEACHER)
+ROLE_VALUES = {
+    **{role.value.lower(): role.value for role in IMPORT_ROLES},
+    **{role.label.lower(): role.value for role in IMPORT_ROLES},
+}
+
+
+def _hash_passwords(passwords, executor):
+    """Хеши паролей; пустой пароль - неиспользуемый (вход после сброса пароля)"""
+    to_hash = [password for password in passwords if password]
+    if executor is not None and len(to_hash) > 1:
+        hashed = iter(executor.map(make_password, to_hash, chunksize=max(1, len(to_hash) // 32)))
+    else:
+        hashed = iter(map(make_password, to_hash))
+    return [next(hashed) if password else make_password(None) for password in passwords]
+
+
+class RosterImport:
+    """
+    Импорт одного файла. Использование:
+        result = RosterImport(academic_year).run(rows, progress=callback)
+    rows - словари строк (main.tabular.iter_table_rows с COLUMN_ALIASES).
+    """
+
+    def __init__(self, academic_year=None, chunk_size=500, workers=None, dry_run=False):
+        self.academic_year = academic_year or AcademicYear.objects.filter(is_current=True).first()
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.dry_run = dry_run
+
+        self.classes = {}
+        if self.academic_year:
+            self.classes = {
+                name.lower(): class_id
+                for class_id, name in ClassGroup.objects.filter(
+                    academic_year=self.academic_year
+                ).values_list('id', 'name')
+            }
+        self.seen_emails = set()
+        self.seen_usernames = set()
+        # (строка файла, id профиля родителя, email детей) - связываются после загрузки всех учеников
+        self.pending_children = []
+        self.touched_classes = set()
+        self.result = {
+            'rows': 0,
+            'created': {role.value: 0 for role in IMPORT_ROLES},
+            'links': 0,
+            'errors': [],
+        }
+
+    def run(self, rows, progress=None):
+        executor = None
+        if not self.dry_run and self.workers != 1:
+            # Дочерние процессы настраивают Django сами (важно для способа запуска spawn)
+            executor = ProcessPoolExecutor(max_workers=self.workers, initializer=django.setup)
+        try:
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self.process_chunk(chunk, executor)
+                    chunk = []
+                    if progress:
+                        progress(self.result)
+            if chunk:
+                self.process_chunk(chunk, executor)
+                if progress:
+                    progress(self.result)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if not self.dry_run:
+            self.link_children()
+            if self.touched_classes:
+                recount_class_students(self.touched_classes)
+        return self.result
+
+    def error(self, row, message):
+        self.result['errors'].append((row.get('_line'), message))
+
+    def validate(self, row):
+        """Проверенная строка или None (ошибка записана в результат)"""
+        role = ROLE_VALUES.get(row.get('role', '').lower())
+        if role is None:
+            self.error(row, f"Неизвестная роль: {row.get('role') or '(пусто)'}")
+            return None
+
+        email = row.get('email', '').lower()
+        try:
+            validate_email(email)
+        except ValidationError:
+            self.error(row, f'Некорректный email: {email or "(пусто)"}')
+            return None
+        if email in self.seen_emails:
+            self.error(row, f'Email повторяется в файле: {email}')
+            return None
+
+        username = row.get('username') or email
+        if username in self.seen_usernames:
+            self.error(row, f'Логин повторяется в файле: {username}')
+            return None
+
+        if not row.get('last_name') or not row.get('first_name'):
+            self.error(row, 'Не указаны фамилия или имя')
+            return None
+
+        class_id = None
+        if role == CustomUser.Role.STUDENT and row.get('class'):
+            class_id = self.classes.get(row['class'].lower())
+            if class_id is None:
+                self.error(row, f"Класс {row['class']} не найден в учебном году {self.academic_year or '(не задан)'}")
+                return None
+
+        admission_year = row.get('admission_year') or get_current_admission_year()
+        try:
+            admission_year = int(admission_year)
+        except ValueError:
+            self.error(row, f'Некорректный год поступления: {admission_year}')
+            return None
+
+        self.seen_emails.add(email)
+        self.seen_usernames.add(username)
+        return {
+            'line': row.get('_line'),
+            'role': role,
+            'email': email,
+            'username': username,
+            'last_name': row['last_name'],
+            'first_name': row['first_name'],
+            'patronymic': row.get('patronymic') or None,
+            'password': row.get('password', ''),
+            'class_id': class_id,
+            'admission_year': admission_year,
+            'children': [
+                child.lower() for child in re.split(r'[;,\s]+', row.get('children', '')) if child
+            ],
+        }
+
+    def process_chunk(self, chunk, executor):
+        self.result['rows'] += len(chunk)
+        entries = [entry for entry in map(self.validate, chunk) if entry]
+
+        # Пользователи, которые уже есть в БД - одним запросом на пачку
+        # (email файла приведен к нижнему регистру, в БД он может быть записан иначе)
+        taken = set(CustomUser.objects.annotate(email_lower=Lower('email')).filter(
+            email_lower__in=[entry['email'] for entry in entries]
+        ).values_list('email_lower', flat=True))
+        taken_usernames = set(CustomUser.objects.filter(
+            username__in=[entry['username'] for entry in entries]
+        ).values_list('username', flat=True))
+        valid = []
+        for entry in entries:
+            if entry['email'] in taken:
+                self.result['errors'].append((entry['line'], f"Пользователь с email {entry['email']} уже существует"))
+            elif entry['username'] in taken_usernames:
+                self.result['errors'].append((entry['line'], f"Логин {entry['username']} уже занят"))
+            else:
+                valid.append(entry)
+
+        if self.dry_run or not valid:
+            for entry in valid:
+                self.result['created'][entry['role']] += 1
+            return
+
+        passwords = _hash_passwords([entry['password'] for entry in valid], executor)
+        with transaction.atomic():
+            users = CustomUser.objects.bulk_create([
+                CustomUser(
+                    username=entry['username'],
+                    email=entry['email'],
+                    first_name=entry['first_name'],
+                    last_name=entry['last_name'],
+                    patronymic=entry['patronymic'],
+                    role=entry['role'],
+                    password=password,
+                )
+                for entry, password in zip(valid, passwords)
+            ])
+            pairs = list(zip(valid, users))
+
+            StudentProfile.objects.bulk_create([
+                StudentProfile(user=user, class_group_id=entry['class_id'], admission_year=entry['admission_year'])
+                for entry, user in pairs if entry['role'] == CustomUser.Role.STUDENT
+            ])
+            TeacherProfile.objects.bulk_create([
+                TeacherProfile(user=user) for entry, user in pairs if entry['role'] == CustomUser.Role.TEACHER
+            ])
+            parents = ParentProfile.objects.bulk_create([
+                ParentProfile(user=user) for entry, user in pairs if entry['role'] == CustomUser.Role.PARENT
+            ])
+
+        parent_entries = [entry for entry in valid if entry['role'] == CustomUser.Role.PARENT]
+        for entry, parent in zip(parent_entries, parents):
+            if entry['children']:
+                self.pending_children.append((entry['line'], parent.id, entry['children']))
+        for entry in valid:
+            self.result['created'][entry['role']] += 1
+            if entry['class_id']:
+                self.touched_classes.add(entry['class_id'])
+
+    def link_children(self):
+        """Связи родитель-ребенок: дети ищутся по email среди всех учеников (в т.ч. из этого файла)"""
+        through = ParentProfile.children.through
+        for start in range(0, len(self.pending_children), self.chunk_size):
+            pending = self.pending_children[start:start + self.chunk_size]
+            students = dict(StudentProfile.objects.annotate(email_lower=Lower('user__email')).filter(
+                email_lower__in={email for _, _, emails in pending for email in emails}
+            ).values_list('email_lower', 'id'))
+
+            links = []
+            for line, parent_id, emails in pending:
+                for email in emails:
+                    if email in students:
+                        links.append(through(parentprofile_id=parent_id, studentprofile_id=students[email]))
+                    else:
+                        self.result['errors'].append((line, f'Ребенок с email {email} не найден среди учеников'))
+            through.objects.bulk_create(links, ignore_conflicts=True)
+            self.result['links'] += len(links)
@@ -1,35 +1,58 @@
-from django.db.models.signals import post_save
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import CustomUser, StudentProfile, TeacherProfile, ParentProfile
+from school_structure.models import ClassGroup
+from .models import CustomUser, StudentProfile
+from .roles import PROFILE_MODELS, sync_role_profiles
 
 
 @receiver(post_save, sender=CustomUser)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
+def create_or_update_user_profile(sender, instance, created, update_fields=None, **kwargs):
     """
-    Создает или обновляет профиль пользователя при сохранении.
-    Теперь admission_year устанавливается автоматически.
+    Создает профиль роли для нового пользователя и пересоздает профили при смене роли.
+    Сохранения без смены роли (например, last_login при входе) запросов не выполняют.
     """
-    if instance.role == 'STUDENT':
-        StudentProfile.objects.get_or_create(user=instance)
-        # Удаляем другие профили
-        TeacherProfile.objects.filter(user=instance).delete()
-        ParentProfile.objects.filter(user=instance).delete()
+    if created:
+        profile_model = PROFILE_MODELS.get(instance.role)
+        if profile_model is not None:
+            profile_model.objects.create(user=instance)
+    elif update_fields is not None and 'role' not in update_fields:
+        return
+    elif getattr(instance, '_loaded_role', None) != instance.role:
+        # Роль изменилась (или экземпляр не загружен из БД и прежняя роль неизвестна)
+        sync_role_profiles([instance.pk], instance.role)
+    instance._loaded_role = instance.role
 
-    elif instance.role == 'TEACHER':
-        TeacherProfile.objects.get_or_create(user=instance)
-        StudentProfile.objects.filter(user=instance).delete()
-        ParentProfile.objects.filter(user=instance).delete()
 
-    elif instance.role == 'PARENT':
-        ParentProfile.objects.get_or_create(user=instance)
-        StudentProfile.objects.filter(user=instance).delete()
-        TeacherProfile.objects.filter(user=instance).delete()
 
-    else:
-        # Для ADMIN, EMPTY - удаляем все профили
-        StudentProfile.objects.filter(user=instance).delete()
-        TeacherProfile.objects.filter(user=instance).delete()
-        ParentProfile.objects.filter(user=instance).delete()
+# ==================== СЧЕТЧИК УЧЕНИКОВ КЛАССА ====================
+
+def _shift_students_count(class_group_id, delta):
+    """Атомарно изменить ClassGroup.students_count (F()-выражение, без чтения значения)"""
+    if class_group_id is None:
+        return
+    class_groups = ClassGroup.objects.filter(pk=class_group_id)
+    if delta < 0:
+        # Устаревший счетчик не уходит в минус; его исправит recount_class_students
+        class_groups = class_groups.filter(students_count__gte=-delta)
+    class_groups.update(students_count=F('students_count') + delta)
+
+
+@receiver(post_save, sender=StudentProfile)
+def update_students_count_on_save(sender, instance, created, **kwargs):
+    if created:
+        _shift_students_count(instance.class_group_id, 1)
+    elif hasattr(instance, '_loaded_class_group_id'):
+        previous = instance._loaded_class_group_id
+        if previous != instance.class_group_id:
+            _shift_students_count(previous, -1)
+            _shift_students_count(instance.class_group_id, 1)
+    instance._loaded_class_group_id = instance.class_group_id
+
+
+@receiver(post_delete, sender=StudentProfile)
+def update_students_count_on_delete(sender, instance, **kwargs):
+    _shift_students_count(getattr(instance, '_loaded_class_group_id', instance.class_group_id), -1)
 
 
 # from django.db.models.signals import post_save
@@ -1,3 +1,117 @@
 from django.test import TestCase
 
-# Create your tests here.
+from school_structure.benchmark import build_demo_school
+from school_structure.models import ClassGroup
+from school_structure.utils import recount_class_students
+from .models import CustomUser, StudentProfile, TeacherProfile, ParentProfile
+from .roles import change_role
+
+
+class RoleProfileTests(TestCase):
+    """У пользователя есть только профиль его текущей роли"""
+
+    def create_user(self, username, role):
+        return CustomUser.objects.create(username=username, email=f'{username}@example.com', role=role)
+
+    def profiles(self, user):
+        return {
+            model.__name__ for model in (StudentProfile, TeacherProfile, ParentProfile)
+            if model.objects.filter(user=user).exists()
+        }
+
+    def test_profile_created_with_user(self):
+        user = self.create_user('student', CustomUser.Role.STUDENT)
+        self.assertEqual(self.profiles(user), {'StudentProfile'})
+        self.assertEqual(self.profiles(self.create_user('empty', CustomUser.Role.EMPTY)), set())
+
+    def test_role_change_on_save(self):
+        user = self.create_user('user', CustomUser.Role.STUDENT)
+        student_profile_id = user.student_profile.id
+
+        user = CustomUser.objects.get(pk=user.pk)
+        user.role = CustomUser.Role.TEACHER
+        user.save()
+        self.assertEqual(self.profiles(user), {'TeacherProfile'})
+
+        # Возврат роли: профиль создается заново, прежний удален
+        user = CustomUser.objects.get(pk=user.pk)
+        user.role = CustomUser.Role.STUDENT
+        user.save()
+        self.assertEqual(self.profiles(user), {'StudentProfile'})
+        self.assertNotEqual(StudentProfile.objects.get(user=user).id, student_profile_id)
+
+    def test_save_without_role_change_keeps_profiles(self):
+        user = CustomUser.objects.get(pk=self.create_user('user', CustomUser.Role.PARENT).pk)
+        profile_id = user.parent_profile.id
+        user.first_name = 'Имя'
+        # Только UPDATE пользователя, профили не трогаются
+        with self.assertNumQueries(1):
+            user.save()
+        with self.assertNumQueries(1):
+            user.save(update_fields=['last_login'])
+        self.assertEqual(ParentProfile.objects.get(user=user).id, profile_id)
+
+    def test_change_role(self):
+        users = [self.create_user(f'user{number}', CustomUser.Role.STUDENT) for number in range(3)]
+        users.append(self.create_user('parent', CustomUser.Role.PARENT))
+
+        changed = change_role(CustomUser.objects.filter(pk__in=[user.pk for user in users]), CustomUser.Role.PARENT)
+        self.assertEqual(changed, 3)
+        for user in users:
+            self.assertEqual(CustomUser.objects.get(pk=user.pk).role, CustomUser.Role.PARENT)
+            self.assertEqual(self.profiles(user), {'ParentProfile'})
+
+    def test_admin_action(self):
+        admin = CustomUser.objects.create_superuser(username='root', email='root@example.com', password='x')
+        users = [self.create_user(f'user{number}', CustomUser.Role.STUDENT) for number in range(2)]
+        self.client.force_login(admin)
+        response = self.client.post('/admin/users/customuser/', {
+            'action': 'set_role_teacher',
+            '_selected_action': [user.pk for user in users],
+        })
+        self.assertEqual(response.status_code, 302)
+        for user in users:
+            self.assertEqual(CustomUser.objects.get(pk=user.pk).role, CustomUser.Role.TEACHER)
+            self.assertEqual(self.profiles(user), {'TeacherProfile'})
+
+
+class StudentsCountTests(TestCase):
+    """ClassGroup.students_count следует за переводами и удалением учеников"""
+
+    @classmethod
+    def setUpTestData(cls):
+        school = build_demo_school(teachers=1, classes_per_year=1, students_per_class=2)
+        cls.first, cls.second = school['class_groups'][:2]
+
+    def counts(self):
+        return dict(ClassGroup.objects.filter(
+            pk__in=[self.first.pk, self.second.pk]
+        ).values_list('pk', 'students_count'))
+
+    def test_counter_follows_students(self):
+        self.assertEqual(self.counts(), {self.first.pk: 2, self.second.pk: 2})
+        user = CustomUser.objects.create(username='new', email='new@example.com', role=CustomUser.Role.STUDENT)
+
+        profile = user.student_profile
+        profile.class_group = self.first
+        profile.save()
+        self.assertEqual(self.counts(), {self.first.pk: 3, self.second.pk: 2})
+
+        # Перевод в другой класс профилем, загруженным из БД
+        profile = StudentProfile.objects.get(pk=profile.pk)
+        profile.class_group = self.second
+        profile.save()
+        self.assertEqual(self.counts(), {self.first.pk: 2, self.second.pk: 3})
+
+        # Повторное сохранение без перевода счетчик не меняет
+        profile.save()
+        self.assertEqual(self.counts(), {self.first.pk: 2, self.second.pk: 3})
+
+        profile.delete()
+        self.assertEqual(self.counts(), {self.first.pk: 2, self.second.pk: 2})
+
+        # Смена роли удаляет профиль ученика - он выбывает из класса
+        student = StudentProfile.objects.filter(class_group=self.first).first()
+        change_role(CustomUser.objects.filter(pk=student.user_id), CustomUser.Role.PARENT)
+        self.assertEqual(self.counts(), {self.first.pk: 1, self.second.pk: 2})
+        self.assertEqual(recount_class_students(), 0)
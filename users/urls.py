@@ -1,9 +1,18 @@
 # users/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'users'
 
+# Под ASGI дашборды учителя и ученика обслуживаются асинхронными представлениями
+if getattr(settings, 'ASYNC_DASHBOARDS', False):
+    TeacherDashboardView = views.AsyncTeacherDashboardView
+    StudentDashboardView = views.AsyncStudentDashboardView
+else:
+    TeacherDashboardView = views.TeacherDashboardView
+    StudentDashboardView = views.StudentDashboardView
+
 urlpatterns = [
     # Аутентификация
     path('login/', views.LoginView.as_view(), name='login'),
@@ -16,8 +25,8 @@ urlpatterns = [
     path('profile/complete/', views.ProfileCompleteView.as_view(), name='profile_complete'),
 
     # Дашборды
-    path('dashboard/teacher/', views.TeacherDashboardView.as_view(), name='teacher_dashboard'),
-    path('dashboard/student/', views.StudentDashboardView.as_view(), name='student_dashboard'),
+    path('dashboard/teacher/', TeacherDashboardView.as_view(), name='teacher_dashboard'),
+    path('dashboard/student/', StudentDashboardView.as_view(), name='student_dashboard'),
     path('dashboard/parent/', views.ParentDashboardView.as_view(), name='parent_dashboard'),
     path('dashboard/admin/', views.AdminDashboardView.as_view(), name='admin_dashboard'),
 
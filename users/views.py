@@ -6,16 +6,30 @@ from django.contrib import messages
 from django.views.generic import View, TemplateView, UpdateView
 from django.utils.decorators import method_decorator
 from django.urls import reverse_lazy
-from django.db.models import Count, Avg, Q, Sum, Max, Min
+from django.db.models import Count, Avg, Q, Sum, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from datetime import datetime, timedelta
+from functools import reduce
 import calendar
 import math
+import operator
 
-from .decorators import role_required, teacher_required, student_required, parent_required, admin_required
+from .decorators import AsyncRoleRequiredMixin, role_required, teacher_required, student_required, parent_required, admin_required
 from .forms import EmailOrUsernameAuthenticationForm, UserRegistrationForm, StudentProfileForm, TeacherProfileForm
 from .models import CustomUser, StudentProfile, TeacherProfile, ParentProfile
+from .dashboards import (
+    run_groups, arun_groups,
+    teacher_dashboard_groups, teacher_dashboard_context,
+    student_dashboard_groups, student_dashboard_context,
+)
+from main.routers import ReplicaReadMixin
 from school_structure.models import Lesson, ClassGroup, Subject, Quarter, AcademicYear
-from journal.models import StudentMark, Attendance, Homework, QuarterlyGrade, YearlyGrade, GradeColumn
+from school_structure.school_calendar import get_school_calendar
+from journal.models import StudentGrade, Attendance, Homework, QuarterlyGrade, YearlyGrade, GradeColumn
+from journal.archive import (
+    grade_querysets, attendance_querysets, merged_grades,
+    grade_totals, grade_totals_by_subject, sum_aggregates,
+)
 
 
 # ==================== VIEWS АУТЕНТИФИКАЦИИ ====================
@@ -142,96 +156,27 @@ class TeacherDashboardView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         teacher = self.request.user.teacher_profile
-
-        # Текущая дата и период
         today = datetime.now().date()
-        current_week = today.isocalendar()[1]
 
-        try:
-            current_quarter = Quarter.objects.get(is_current=True)
-        except Quarter.DoesNotExist:
-            current_quarter = None
+        data = run_groups(teacher_dashboard_groups(teacher, today))
+        context.update(teacher_dashboard_context(teacher, today, data))
+        return context
 
-        # Ближайшие уроки (на 7 дней вперед)
-        upcoming_lessons = Lesson.objects.filter(
-            teacher=teacher,
-            date__range=[today, today + timedelta(days=7)]
-        ).select_related('subject', 'class_group').order_by('date', 'lesson_number')[:10]
 
-        # Уроки на сегодня
-        today_lessons = Lesson.objects.filter(
-            teacher=teacher,
-            date=today
-        ).select_related('subject', 'class_group').order_by('lesson_number')
+class AsyncTeacherDashboardView(AsyncRoleRequiredMixin, TemplateView):
+    """Дашборд учителя для ASGI: независимые группы запросов выполняются одновременно"""
+    template_name = 'dashboard/teacher.html'
+    required_role = 'TEACHER'
 
-        # Классы, которые ведет учитель
-        classes = ClassGroup.objects.filter(
-            lessons__teacher=teacher
-        ).distinct().annotate(
-            student_count=Count('students'),
-            lesson_count=Count('lessons', filter=Q(lessons__teacher=teacher))
-        )
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        teacher = await TeacherProfile.objects.select_related('user').aget(user=user)
+        today = datetime.now().date()
 
-        # Последние выставленные оценки (новые)
-        recent_marks = StudentMark.objects.filter(
-            teacher=teacher
-        ).select_related(
-            'student__user',
-            'lesson_grade_column__lesson__subject',
-            'lesson_grade_column__grade_column'
-        ).order_by('-created_at')[:5]
-
-        # Домашние задания к проверке
-        homework_to_check = Homework.objects.filter(
-            lesson__teacher=teacher,
-            deadline__lt=datetime.now()
-        ).select_related('lesson__subject', 'lesson__class_group').order_by('deadline')[:5]
-
-        # Статистика (новые оценки)
-        marks_this_month = StudentMark.objects.filter(
-            teacher=teacher,
-            created_at__month=today.month,
-            created_at__year=today.year
-        ).count()
-
-        # Рассчитываем общую статистику по классам
-        class_stats = []
-        for class_group in classes:
-            # Количество оценок в классе
-            marks_count = StudentMark.objects.filter(
-                teacher=teacher,
-                student__class_group=class_group
-            ).count()
-
-            # Средний балл в классе
-            avg_grade = StudentMark.objects.filter(
-                teacher=teacher,
-                student__class_group=class_group
-            ).aggregate(avg=Avg('value'))['avg']
-
-            class_stats.append({
-                'class': class_group,
-                'marks_count': marks_count,
-                'avg_grade': round(avg_grade, 2) if avg_grade else None
-            })
-
-        context.update({
-            'teacher': teacher,
-            'upcoming_lessons': upcoming_lessons,
-            'today_lessons': today_lessons,
-            'classes': classes,
-            'recent_marks': recent_marks,
-            'homework_to_check': homework_to_check,
-            'class_stats': class_stats,
-            'stats': {
-                'total_classes': classes.count(),
-                'marks_this_month': marks_this_month,
-                'today_lessons_count': today_lessons.count(),
-            },
-            'today': today,
-            'current_quarter': current_quarter,
-        })
-        return context
+        data = await arun_groups(teacher_dashboard_groups(teacher, today))
+        context = self.get_context_data(**kwargs)
+        context.update(teacher_dashboard_context(teacher, today, data))
+        return self.render_to_response(context)
 
 
 @method_decorator([login_required, student_required], name='dispatch')
@@ -241,101 +186,27 @@ class StudentDashboardView(TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         student = self.request.user.student_profile
-
-        # Текущая дата
         today = datetime.now().date()
 
-        # Получаем текущую четверть
-        try:
-            current_quarter = Quarter.objects.get(is_current=True)
-        except Quarter.DoesNotExist:
-            current_quarter = None
-
-        # Расписание на сегодня
-        schedule_today = Lesson.objects.filter(
-            class_group=student.class_group,
-            date=today
-        ).select_related('subject', 'teacher__user').order_by('lesson_number')
-
-        # Расписание на завтра
-        tomorrow = today + timedelta(days=1)
-        schedule_tomorrow = Lesson.objects.filter(
-            class_group=student.class_group,
-            date=tomorrow
-        ).select_related('subject', 'teacher__user').order_by('lesson_number')
-
-        # Последние оценки (новые)
-        recent_marks = StudentMark.objects.filter(
-            student=student
-        ).select_related(
-            'lesson_grade_column__lesson__subject',
-            'teacher__user',
-            'lesson_grade_column__grade_column'
-        ).order_by('-created_at')[:10]
-
-        # Средние баллы по предметам (новые)
-        subject_grades = StudentMark.objects.filter(
-            student=student
-        ).values(
-            'lesson_grade_column__lesson__subject__title'
-        ).annotate(
-            avg_grade=Avg('value'),
-            count=Count('id')
-        ).order_by('lesson_grade_column__lesson__subject__title')
-
-        # Рассчитываем четвертные оценки
-        quarterly_grades = []
-        if current_quarter:
-            for subject in Subject.objects.filter(
-                    lessons__class_group=student.class_group
-            ).distinct():
-                q_grade = QuarterlyGrade.objects.filter(
-                    student=student,
-                    subject=subject,
-                    quarter=current_quarter
-                ).first()
-
-                if q_grade and q_grade.grade:
-                    quarterly_grades.append({
-                        'subject': subject,
-                        'grade': q_grade.grade,
-                        'calculated': q_grade.calculated_grade
-                    })
+        data = run_groups(student_dashboard_groups(student, today))
+        context.update(student_dashboard_context(student, today, data))
+        return context
 
-        # Ближайшие домашние задания
-        upcoming_homework = Homework.objects.filter(
-            lesson__class_group=student.class_group,
-            deadline__gt=datetime.now()
-        ).select_related('lesson__subject').order_by('deadline')[:5]
 
-        # Посещаемость за текущий месяц
-        month_start = today.replace(day=1)
-        month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
-        monthly_attendance = Attendance.objects.filter(
-            student=student,
-            lesson__date__range=[month_start, month_end]
-        ).values('status').annotate(count=Count('id'))
+class AsyncStudentDashboardView(AsyncRoleRequiredMixin, TemplateView):
+    """Дашборд ученика для ASGI: независимые группы запросов выполняются одновременно"""
+    template_name = 'dashboard/student.html'
+    required_role = 'STUDENT'
 
-        # Общая статистика успеваемости
-        total_marks = StudentMark.objects.filter(student=student).count()
-        avg_all = StudentMark.objects.filter(student=student).aggregate(avg=Avg('value'))['avg']
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        student = await StudentProfile.objects.select_related('user', 'class_group').aget(user=user)
+        today = datetime.now().date()
 
-        context.update({
-            'student': student,
-            'schedule_today': schedule_today,
-            'schedule_tomorrow': schedule_tomorrow,
-            'recent_marks': recent_marks,
-            'subject_grades': subject_grades,
-            'quarterly_grades': quarterly_grades,
-            'upcoming_homework': upcoming_homework,
-            'monthly_attendance': monthly_attendance,
-            'total_marks': total_marks,
-            'avg_all': round(avg_all, 2) if avg_all else None,
-            'today': today,
-            'tomorrow': tomorrow,
-            'current_quarter': current_quarter,
-        })
-        return context
+        data = await arun_groups(student_dashboard_groups(student, today))
+        context = self.get_context_data(**kwargs)
+        context.update(student_dashboard_context(student, today, data))
+        return self.render_to_response(context)
 
 
 @method_decorator([login_required, parent_required], name='dispatch')
@@ -351,25 +222,29 @@ class ParentDashboardView(TemplateView):
 
         children_data = []
         for child in children:
-            # Последние оценки ребенка (новые)
-            recent_marks = StudentMark.objects.filter(
-                student=child
-            ).select_related(
-                'lesson_grade_column__lesson__subject',
-                'lesson_grade_column__grade_column'
-            ).order_by('-created_at')[:5]
+            # Последние оценки ребенка (новые), включая архив прошлых лет
+            recent_marks = list(merged_grades([
+                queryset.filter(student=child).select_related(
+                    'lesson_column__lesson__subject',
+                    'lesson_column__grade_type'
+                ).order_by('-created_at', '-id')
+                for queryset in grade_querysets()
+            ], limit=5))
 
             # Посещаемость за последнюю неделю
             week_ago = datetime.now().date() - timedelta(days=7)
-            attendance_stats = Attendance.objects.filter(
-                student=child,
-                lesson__date__gte=week_ago
-            ).aggregate(
+            attendance_stats = sum_aggregates(
+                [queryset.filter(student=child, lesson__date__gte=week_ago)
+                 for queryset in attendance_querysets()],
                 present=Count('id', filter=Q(status='PRESENT')),
                 absent=Count('id', filter=Q(status='ABSENT')),
                 ill=Count('id', filter=Q(status='ILL')),
                 late=Count('id', filter=Q(status='LATE'))
             )
+            if child.class_group_id:
+                attendance_stats['school_days'] = get_school_calendar(
+                    child.class_group.academic_year_id
+                ).school_days(week_ago, datetime.now().date())
 
             # Ближайшие уроки на сегодня
             today_lessons = Lesson.objects.filter(
@@ -382,10 +257,11 @@ class ParentDashboardView(TemplateView):
                 student=child
             ).select_related('subject', 'quarter').order_by('quarter__number')[:4]
 
-            # Общая успеваемость
-            avg_grade = StudentMark.objects.filter(
-                student=child
-            ).aggregate(avg=Avg('value'))['avg']
+            # Общая успеваемость за все годы
+            mark_count, mark_total = grade_totals(
+                [queryset.filter(student=child) for queryset in grade_querysets()]
+            )
+            avg_grade = mark_total / mark_count if mark_count else None
 
             children_data.append({
                 'child': child,
@@ -405,7 +281,7 @@ class ParentDashboardView(TemplateView):
 
 
 @method_decorator([login_required, admin_required], name='dispatch')
-class AdminDashboardView(TemplateView):
+class AdminDashboardView(ReplicaReadMixin, TemplateView):
     template_name = 'dashboard/admin.html'
 
     def get_context_data(self, **kwargs):
@@ -417,18 +293,21 @@ class AdminDashboardView(TemplateView):
         total_teachers = TeacherProfile.objects.count()
         total_parents = ParentProfile.objects.count()
 
-        # Активность сегодня
+        # Активность сегодня: только рабочая таблица, в архиве лишь закончившиеся годы
         today = datetime.now().date()
         new_users_today = CustomUser.objects.filter(date_joined__date=today).count()
-        new_marks_today = StudentMark.objects.filter(created_at__date=today).count()
+        new_marks_today = StudentGrade.objects.filter(created_at__date=today).count()
 
         # Последние действия
         recent_users = CustomUser.objects.all().order_by('-date_joined')[:5]
-        recent_marks = StudentMark.objects.all().select_related(
-            'student__user',
-            'teacher__user',
-            'lesson_grade_column__lesson__subject'
-        ).order_by('-created_at')[:5]
+        recent_marks = list(merged_grades([
+            queryset.select_related(
+                'student__user',
+                'teacher__user',
+                'lesson_column__lesson__subject'
+            ).order_by('-created_at', '-id')
+            for queryset in grade_querysets()
+        ], limit=5))
 
         # Учебный год и четверть
         try:
@@ -438,18 +317,20 @@ class AdminDashboardView(TemplateView):
             academic_year = None
             current_quarter = None
 
-        # Статистика по успеваемости
-        grade_stats = StudentMark.objects.aggregate(
-            total_marks=Count('id'),
-            avg_grade=Avg('value'),
-            max_grade=Max('value'),
-            min_grade=Min('value')
-        )
-
-        # Статистика по классам
+        # Статистика по успеваемости за все годы, включая архив
+        total_marks, marks_sum = grade_totals(grade_querysets())
+        avg_grade = marks_sum / total_marks if total_marks else None
+
+        # Статистика по классам: подзапрос числа оценок учеников класса в каждой таблице
+        class_marks = [
+            Coalesce(Subquery(
+                queryset.filter(student__class_group=OuterRef('pk')).order_by()
+                .values('student__class_group').annotate(count=Count('id')).values('count')
+            ), 0)
+            for queryset in grade_querysets()
+        ]
         class_stats = ClassGroup.objects.annotate(
-            student_count=Count('students'),
-            mark_count=Count('students__student_marks')
+            mark_count=reduce(operator.add, class_marks)
         ).order_by('-mark_count')[:5]
 
         context.update({
@@ -460,8 +341,8 @@ class AdminDashboardView(TemplateView):
                 'total_parents': total_parents,
                 'new_users_today': new_users_today,
                 'new_marks_today': new_marks_today,
-                'total_marks': grade_stats['total_marks'],
-                'avg_grade': round(grade_stats['avg_grade'], 2) if grade_stats['avg_grade'] else None,
+                'total_marks': total_marks,
+                'avg_grade': round(avg_grade, 2) if avg_grade else None,
             },
             'recent_users': recent_users,
             'recent_marks': recent_marks,
@@ -474,6 +355,28 @@ class AdminDashboardView(TemplateView):
 
 # ==================== ДОПОЛНИТЕЛЬНЫЕ VIEWS ====================
 
+# Оценок на странице списков оценок учителя и ученика
+MARKS_PAGE_SIZE = 100
+
+
+def marks_page(request, mark_querysets, total_marks, *related):
+    """
+    Страница ?page= списка оценок из нескольких таблиц (рабочей и архива), от новых к старым.
+    Возвращает (оценки страницы, номер страницы, число страниц).
+    """
+    page_count = max(math.ceil(total_marks / MARKS_PAGE_SIZE), 1)
+    try:
+        page = min(max(int(request.GET.get('page', 1)), 1), page_count)
+    except ValueError:
+        page = 1
+    marks = merged_grades(
+        [queryset.select_related(*related).order_by('-created_at', '-id') for queryset in mark_querysets],
+        offset=(page - 1) * MARKS_PAGE_SIZE,
+        limit=MARKS_PAGE_SIZE,
+    )
+    return marks, page, page_count
+
+
 @method_decorator([login_required, teacher_required], name='dispatch')
 class TeacherGradesView(TemplateView):
     """Просмотр всех оценок учителя"""
@@ -489,27 +392,34 @@ class TeacherGradesView(TemplateView):
         quarter_id = self.request.GET.get('quarter_id')
         student_id = self.request.GET.get('student_id')
 
-        # Базовый запрос
-        marks = StudentMark.objects.filter(teacher=teacher).select_related(
-            'student__user',
-            'lesson_grade_column__lesson__subject',
-            'lesson_grade_column__lesson__class_group',
-            'lesson_grade_column__lesson__quarter',
-            'lesson_grade_column__grade_column'
-        ).order_by('-created_at')
-
         # Применяем фильтры
+        mark_filters = {'teacher': teacher}
         if class_id:
-            marks = marks.filter(lesson_grade_column__lesson__class_group_id=class_id)
+            mark_filters['class_group_id'] = class_id
 
         if subject_id:
-            marks = marks.filter(lesson_grade_column__lesson__subject_id=subject_id)
+            mark_filters['subject_id'] = subject_id
 
         if quarter_id:
-            marks = marks.filter(lesson_grade_column__lesson__quarter_id=quarter_id)
+            mark_filters['quarter_id'] = quarter_id
 
         if student_id:
-            marks = marks.filter(student_id=student_id)
+            mark_filters['student_id'] = student_id
+
+        # Оценки четверти архивного года - из архива, без фильтра по четверти - из обеих таблиц
+        mark_querysets = [queryset.filter(**mark_filters) for queryset in grade_querysets(quarter_id)]
+
+        # Статистика - агрегатами в БД, в память загружается только страница
+        total_marks, total_value = grade_totals(mark_querysets)
+        avg_grade = total_value / total_marks if total_marks else None
+        marks, page, page_count = marks_page(
+            self.request, mark_querysets, total_marks,
+            'student__user',
+            'lesson_column__lesson__subject',
+            'lesson_column__lesson__class_group',
+            'lesson_column__lesson__quarter',
+            'lesson_column__grade_type'
+        )
 
         # Получаем доступные фильтры
         classes = ClassGroup.objects.filter(lessons__teacher=teacher).distinct()
@@ -518,12 +428,10 @@ class TeacherGradesView(TemplateView):
             lessons__teacher=teacher
         ).distinct().order_by('-start_date')
 
-        # Статистика
-        total_marks = marks.count()
-        avg_grade = marks.aggregate(avg=Avg('value'))['avg']
-
         context.update({
             'marks': marks,
+            'page_number': page,
+            'page_count': page_count,
             'classes': classes,
             'subjects': subjects,
             'quarters': quarters,
@@ -552,20 +460,24 @@ class StudentGradesView(TemplateView):
         subject_id = self.request.GET.get('subject_id')
         quarter_id = self.request.GET.get('quarter_id')
 
-        # Базовый запрос
-        marks = StudentMark.objects.filter(student=student).select_related(
-            'teacher__user',
-            'lesson_grade_column__lesson__subject',
-            'lesson_grade_column__lesson__quarter',
-            'lesson_grade_column__grade_column'
-        ).order_by('-created_at')
-
         # Применяем фильтры
+        mark_filters = {'student': student}
         if subject_id:
-            marks = marks.filter(lesson_grade_column__lesson__subject_id=subject_id)
+            mark_filters['subject_id'] = subject_id
 
         if quarter_id:
-            marks = marks.filter(lesson_grade_column__lesson__quarter_id=quarter_id)
+            mark_filters['quarter_id'] = quarter_id
+
+        # Оценки четверти архивного года - из архива, без фильтра по четверти - из обеих таблиц
+        mark_querysets = [queryset.filter(**mark_filters) for queryset in grade_querysets(quarter_id)]
+        total_marks, _ = grade_totals(mark_querysets)
+        marks, page, page_count = marks_page(
+            self.request, mark_querysets, total_marks,
+            'teacher__user',
+            'lesson_column__lesson__subject',
+            'lesson_column__lesson__quarter',
+            'lesson_column__grade_type'
+        )
 
         # Получаем предметы и четверти
         subjects = Subject.objects.filter(
@@ -576,20 +488,18 @@ class StudentGradesView(TemplateView):
             lessons__class_group=student.class_group
         ).distinct().order_by('-start_date')
 
-        # Рассчитываем статистику по предметам
-        subject_stats = []
-        for subject in subjects:
-            subject_marks = marks.filter(lesson_grade_column__lesson__subject=subject)
-            avg = subject_marks.aggregate(avg=Avg('value'))['avg']
-            count = subject_marks.count()
-
-            if count > 0:
-                subject_stats.append({
-                    'subject': subject,
-                    'avg_grade': round(avg, 2) if avg else None,
-                    'marks_count': count,
-                    'last_grade': subject_marks.first().value if subject_marks.exists() else None
-                })
+        # Рассчитываем статистику по предметам - сгруппированными запросами по оценкам всех лет
+        # (предметы прошлых лет могли не вестись в текущем классе)
+        totals = grade_totals_by_subject(mark_querysets)
+        subject_stats = [
+            {
+                'subject': subject,
+                'avg_grade': round(totals[subject.id]['total'] / totals[subject.id]['count'], 2),
+                'marks_count': totals[subject.id]['count'],
+                'last_grade': totals[subject.id]['last'],
+            }
+            for subject in Subject.objects.filter(id__in=totals).order_by('title')
+        ]
 
         # Четвертные оценки
         quarterly_grades = QuarterlyGrade.objects.filter(
@@ -603,6 +513,9 @@ class StudentGradesView(TemplateView):
 
         context.update({
             'marks': marks,
+            'total_marks': total_marks,
+            'page_number': page,
+            'page_count': page_count,
             'subjects': subjects,
             'quarters': quarters,
             'subject_stats': subject_stats,
@@ -617,7 +530,7 @@ class StudentGradesView(TemplateView):
 
 
 @method_decorator([login_required], name='dispatch')
-class GradeStatisticsView(TemplateView):
+class GradeStatisticsView(ReplicaReadMixin, TemplateView):
     """Статистика успеваемости"""
     template_name = 'users/grade_statistics.html'
 
@@ -634,7 +547,7 @@ class GradeStatisticsView(TemplateView):
             classes = ClassGroup.objects.filter(lessons__teacher=teacher).distinct()
 
             for class_group in classes:
-                marks = StudentMark.objects.filter(
+                marks = StudentGrade.objects.filter(
                     teacher=teacher,
                     student__class_group=class_group
                 )
@@ -670,9 +583,9 @@ class GradeStatisticsView(TemplateView):
 
             subject_progress = []
             for subject in subjects:
-                marks = StudentMark.objects.filter(
+                marks = StudentGrade.objects.filter(
                     student=student,
-                    lesson_grade_column__lesson__subject=subject
+                    subject=subject
                 ).order_by('created_at')
 
                 if marks.exists():